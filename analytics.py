@@ -0,0 +1,240 @@
+"""Portfolio analytics for the dashboard and reports.
+
+Aggregations (progress by project, overdue by assignee, budget rollups, report
+summaries) run as single SQL statements and return pyarrow Tables instead of
+being computed in pandas over per-project reads.
+
+When the optional `duckdb` package is installed the project tracker database is
+attached read-only through DuckDB's SQLite scanner and the aggregations run on
+DuckDB's vectorized engine, so heavy reads don't go through the app's SQLite
+connections. Without it (or if the sqlite extension can't be loaded) the same
+aggregations run on SQLite. Writes always stay on SQLite (database.py).
+
+    PROJECT_TRACKER_ANALYTICS=auto|duckdb|sqlite   engine choice (default auto)
+"""
+import logging
+import os
+import threading
+from datetime import timedelta
+
+import pandas as pd
+import pyarrow as pa
+
+import database
+
+ANALYTICS_ENGINE = os.environ.get('PROJECT_TRACKER_ANALYTICS', 'auto')
+OPEN_STATUS_FILTER = "status NOT IN ('Completed', 'Cancelled')"
+# assigned_to is free text: group on the trimmed name, blanks as 'Unassigned'
+ASSIGNEE_KEY = "COALESCE(NULLIF(TRIM(t.assigned_to), ''), 'Unassigned')"
+
+logger = logging.getLogger('project_tracker.analytics')
+
+# Engine-specific row sources. DuckDB reads the SQLite file as text
+# (sqlite_all_varchar) and casts here, so bad values become NULL instead of errors.
+_DUCKDB_SOURCES = {
+    'prefix': '''WITH p AS (
+            SELECT CAST(id AS BIGINT) AS id, CAST(user_id AS BIGINT) AS user_id, project_name,
+                   TRY_CAST(budget AS DOUBLE) AS budget
+            FROM tracker.projects
+            WHERE deleted_at IS NULL
+        ), t AS (
+            SELECT CAST(id AS BIGINT) AS id, CAST(project_id AS BIGINT) AS project_id, task_name, status,
+                   task_priority, TRY_CAST(progress_percentage AS INTEGER) AS progress_percentage,
+                   assigned_to, TRY_CAST(due_date AS DATE) AS due_date,
+                   TRY_CAST(duration_days AS INTEGER) AS duration_days, TRY_CAST(actual_cost AS DOUBLE) AS actual_cost
+            FROM tracker.tasks
+        ) ''',
+    'projects': 'p',
+    'week_of_due': "CAST(date_trunc('week', t.due_date) AS DATE)", # Monday of the ISO week
+    'tasks': 't',
+    'today': 'current_date',
+}
+_SQLITE_SOURCES = {
+    'prefix': '',
+    'projects': '(SELECT * FROM projects WHERE deleted_at IS NULL)', # Hide soft-deleted projects
+    'tasks': 'tasks',
+    'week_of_due': "date(t.due_date, '-6 days', 'weekday 1')", # Monday of the ISO week
+    'today': "date('now', 'localtime')",
+}
+
+QUERIES = {
+    # Average task progress per project (projects with at least one task), as on the dashboard
+    'project_progress': '''
+        SELECT p.id AS project_id, p.project_name,
+               COUNT(*) AS task_count,
+               AVG(t.progress_percentage) AS progress_percentage,
+               CAST(SUM(CASE WHEN t.status = 'Completed' THEN 1 ELSE 0 END) AS INTEGER) AS completed_tasks,
+               CAST(SUM(CASE WHEN t.due_date < {today} AND t.{open} THEN 1 ELSE 0 END) AS INTEGER) AS overdue_tasks
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ?
+        GROUP BY p.id, p.project_name
+        ORDER BY p.id''',
+    'overdue_by_assignee': '''
+        SELECT {assignee} AS assignee,
+               COUNT(*) AS overdue_tasks, MIN(t.due_date) AS oldest_due_date
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ? AND t.due_date < {today} AND t.{open}
+        GROUP BY 1
+        ORDER BY overdue_tasks DESC, assignee''',
+    'most_urgent_overdue': '''
+        SELECT p.project_name, t.task_name, t.due_date, t.assigned_to
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ? AND t.due_date < {today} AND t.{open}
+        ORDER BY t.due_date ASC, t.id ASC
+        LIMIT ?''',
+    # Budget, task counts and budget earned so far (budget x average progress) per project
+    'budget_rollup': '''
+        SELECT p.id AS project_id, p.project_name, p.budget,
+               COUNT(t.id) AS task_count,
+               COALESCE(AVG(t.progress_percentage), 0) AS progress_percentage,
+               COALESCE(p.budget * AVG(t.progress_percentage) / 100.0, 0) AS earned_budget
+        FROM {projects} p LEFT JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ?
+        GROUP BY p.id, p.project_name, p.budget
+        ORDER BY p.id''',
+    # Headline numbers for one project's report
+    'task_summary': '''
+        SELECT COUNT(*) AS total_tasks,
+               AVG(progress_percentage) AS progress_percentage,
+               CAST(SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END) AS INTEGER) AS completed_tasks,
+               CAST(SUM(CASE WHEN due_date < {today} AND {open} THEN 1 ELSE 0 END) AS INTEGER) AS overdue_tasks
+        FROM {tasks}
+        WHERE project_id = ?''',
+    # Per-task inputs for the earned value engine (evm.py)
+    'evm_inputs': '''
+        SELECT p.id AS project_id, p.project_name, p.budget, t.id AS task_id, t.task_name,
+               t.progress_percentage, t.due_date, t.duration_days, t.actual_cost
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ?''',
+    'evm_project_inputs': '''
+        SELECT p.id AS project_id, p.project_name, p.budget, t.id AS task_id, t.task_name,
+               t.progress_percentage, t.due_date, t.duration_days, t.actual_cost
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.id = ?''',
+    # Open tasks per (assignee, week due): one row per non-empty cell, never a dense grid
+    'workload_by_week': '''
+        SELECT {assignee} AS assignee, {week_of_due} AS week_start,
+               COUNT(*) AS open_tasks, SUM(COALESCE(t.duration_days, 1)) AS planned_days
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ? AND t.{open} AND t.due_date >= ? AND t.due_date < ?
+        GROUP BY 1, 2''',
+    # Drill-down: one heatmap cell's tasks
+    'workload_tasks': '''
+        SELECT p.project_name, t.task_name, t.status, t.task_priority, t.progress_percentage,
+               t.due_date, t.duration_days
+        FROM {projects} p JOIN {tasks} t ON t.project_id = p.id
+        WHERE p.user_id = ? AND t.{open} AND {assignee} = ? AND t.due_date >= ? AND t.due_date < ?
+        ORDER BY t.due_date, t.id''',
+    'status_counts': '''
+        SELECT status AS "Status", COUNT(*) AS "Count"
+        FROM {tasks} WHERE project_id = ?
+        GROUP BY status ORDER BY 2 DESC, 1''',
+    'priority_counts': '''
+        SELECT task_priority AS "Priority", COUNT(*) AS "Count"
+        FROM {tasks} WHERE project_id = ?
+        GROUP BY task_priority ORDER BY 2 DESC, 1''',
+}
+
+
+class _DuckDBEngine:
+    name = 'duckdb'
+
+    def __init__(self, db_path):
+        import duckdb # Optional dependency
+        self.db_path = db_path
+        self.conn = duckdb.connect()
+        self.conn.execute("INSTALL sqlite")
+        self.conn.execute("LOAD sqlite")
+        self.conn.execute("SET GLOBAL sqlite_all_varchar = true")
+        quoted_path = db_path.replace("'", "''")
+        self.conn.execute(f"ATTACH '{quoted_path}' AS tracker (TYPE sqlite, READ_ONLY)")
+
+    def query(self, sql, params):
+        # A cursor per call: DuckDB connections must not be shared between Streamlit session threads
+        result = self.conn.cursor().execute(sql, params).arrow()
+        return result.read_all() if hasattr(result, 'read_all') else result
+
+
+class _SQLiteEngine:
+    name = 'sqlite'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def query(self, sql, params):
+        conn = database.connect(self.db_path)
+        try:
+            df = pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+_engine_lock = threading.Lock()
+_engines = {} # db path (main database or shard) -> engine
+
+
+def get_engine(db_path=None):
+    db_path = db_path or database.resolve_db_path() # The current tenant's shard in sharded storage mode
+    engine = _engines.get(db_path)
+    if engine is not None:
+        return engine
+    with _engine_lock:
+        if db_path not in _engines:
+            engine = None
+            if ANALYTICS_ENGINE in ('auto', 'duckdb'):
+                try:
+                    engine = _DuckDBEngine(db_path)
+                except Exception as e: # ImportError, or the sqlite extension could not be installed/loaded
+                    log = logger.warning if ANALYTICS_ENGINE == 'duckdb' else logger.info
+                    log("DuckDB analytics unavailable (%s); aggregating on SQLite instead", e)
+            _engines[db_path] = engine or _SQLiteEngine(db_path)
+        return _engines[db_path]
+
+
+def run_query(name, *params, db_path=None):
+    engine = get_engine(db_path)
+    sources = _DUCKDB_SOURCES if engine.name == 'duckdb' else _SQLITE_SOURCES
+    sql = sources['prefix'] + QUERIES[name].format(open=OPEN_STATUS_FILTER, assignee=ASSIGNEE_KEY, **sources)
+    return engine.query(sql, list(params))
+
+
+# --- Dashboard aggregations ---
+def project_progress(user_id):
+    return run_query('project_progress', user_id)
+
+def overdue_by_assignee(user_id):
+    return run_query('overdue_by_assignee', user_id)
+
+def most_urgent_overdue(user_id, limit=5):
+    return run_query('most_urgent_overdue', user_id, limit)
+
+def budget_rollup(user_id):
+    return run_query('budget_rollup', user_id)
+
+def workload_by_week(user_id, start, end):
+    """Sparse (assignee, week) load for open tasks due in [start, end), as a long DataFrame with ISO week labels."""
+    workload = run_query('workload_by_week', user_id, start.isoformat(), end.isoformat()).to_pandas()
+    workload['week_start'] = pd.to_datetime(workload['week_start'])
+    iso = workload['week_start'].dt.isocalendar()
+    workload['iso_week'] = iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)
+    return workload
+
+def workload_tasks(user_id, assignee, week_start):
+    week_start = pd.Timestamp(week_start).date()
+    return run_query('workload_tasks', user_id, assignee, week_start.isoformat(),
+                     (week_start + timedelta(days=7)).isoformat())
+
+# --- Report aggregations ---
+# archived=True reads the project from the archive database (database.archive_path())
+def _report_db_path(archived):
+    return database.archive_path() if archived else None
+
+def task_summary(project_id, archived=False):
+    return run_query('task_summary', project_id, db_path=_report_db_path(archived)).to_pylist()[0]
+
+def status_counts(project_id, archived=False):
+    return run_query('status_counts', project_id, db_path=_report_db_path(archived))
+
+def priority_counts(project_id, archived=False):
+    return run_query('priority_counts', project_id, db_path=_report_db_path(archived))
@@ -1,185 +1,37 @@
 import streamlit as st
-import sqlite3
-import hashlib
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import io # For CSV export
-import base64 # Not explicitly needed with st.download_button's data parameter
 import plotly.express as px # For visualizations
 import plotly.graph_objects as go # For more complex plots
+import os
+import tempfile
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
 # import pyfiglet 
 
- 
-
-# --- 1. Database Setup ---
-DB_NAME = 'project_tracker.db'
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            project_name TEXT NOT NULL,
-            description TEXT,
-            start_date DATE,
-            end_date DATE,
-            budget REAL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    # CORRECTED: Added DEFAULT 'Medium' to task_priority
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER NOT NULL,
-            task_name TEXT NOT NULL,
-            status TEXT DEFAULT 'Not Started',
-            task_priority TEXT DEFAULT 'Medium', -- CORRECTED: Added default value
-            progress_percentage INTEGER DEFAULT 0,
-            assigned_to TEXT,
-            due_date DATE,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
+# Data access lives in database.py and report generation in reports.py so they
+# can be imported (e.g. by benchmark.py) without rendering the UI.
+from database import (
+    init_db, set_current_tenant, add_user, verify_user, add_project, get_projects_by_user, update_project,
+    delete_project, add_task, get_tasks_table, tasks_table_to_frame, update_task, delete_task,
+    update_tasks_bulk, get_task_dependencies, add_task_dependency, remove_task_dependency, archive_project, restore_project, get_archivable_projects, search_archived_projects,
+    TASK_STATUS_OPTIONS, TASK_PRIORITY_OPTIONS,
+)
+from reports import generate_project_report_html, generate_pdf_from_html, export_csv_bytes, export_parquet_bytes, export_xlsx_file, progress_charts, XLSX_MIME
+import query_trace
+import data_cache
+import analytics
+import profiling
+import reminders
+import critical_path
+import evm
+import snapshots
+import transfer
 
 init_db()
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def get_db_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
-
-def add_user(username, password):
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        hashed_password = hash_password(password)
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
-        conn.commit()
-        user_id = c.lastrowid
-        return user_id
-    except sqlite3.IntegrityError:
-        st.error("Username already exists. Please choose a different one.")
-        return None
-    finally:
-        conn.close()
-
-def verify_user(username, password):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, password FROM users WHERE username = ?", (username,))
-    user_data = c.fetchone()
-    conn.close()
-    if user_data:
-        user_id, stored_password = user_data
-        if stored_password == hash_password(password):
-            return user_id
-    return None
-
-def add_project(user_id, project_name, description, start_date, end_date, budget):
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO projects (user_id, project_name, description, start_date, end_date, budget) VALUES (?, ?, ?, ?, ?, ?)",
-                  (user_id, project_name, description, start_date, end_date, budget))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Error adding project: {e}")
-        return False
-    finally:
-        conn.close()
-
-def get_projects_by_user(user_id):
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT id, project_name, description, start_date, end_date, budget FROM projects WHERE user_id = ? ORDER BY id ASC", conn, params=(user_id,))
-    conn.close()
-    if not df.empty:
-        # Add a user-specific sequential ID
-        df['User Project ID'] = range(1, len(df) + 1)
-        # Reorder columns to put the new ID first (optional)
-        df = df[['User Project ID', 'id', 'project_name', 'description', 'start_date', 'end_date', 'budget']]
-    return df
-
-def update_project(project_id, project_name, description, start_date, end_date, budget):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("UPDATE projects SET project_name=?, description=?, start_date=?, end_date=?, budget=? WHERE id=?",
-              (project_name, description, start_date, end_date, budget, project_id))
-    conn.commit()
-    conn.close()
-
-def delete_project(project_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM tasks WHERE project_id = ?", (project_id,)) # Delete associated tasks first
-    c.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-    conn.commit()
-    conn.close()
-
-def add_task(project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date):
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO tasks (project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  (project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Error adding task: {e}")
-        return False
-    finally:
-        conn.close()
-
-def get_tasks_by_project(project_id):
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT id, task_name, status, task_priority, progress_percentage, assigned_to, due_date FROM tasks WHERE project_id = ? ORDER BY id ASC", conn, params=(project_id,))
-    conn.close()
-
-    if not df.empty:
-        # Convert due_date to datetime objects for comparison
-        df['due_date'] = pd.to_datetime(df['due_date'])
-        # Get today's date without time for fair comparison
-        today = pd.to_datetime(datetime.now().date())
-
-        # Determine if task is overdue (past due_date AND not completed/cancelled)
-        df['Is Overdue'] = (df['due_date'] < today) & (~df['status'].isin(['Completed', 'Cancelled']))
-
-        # Add a project-specific sequential ID for tasks
-        df['Task No.'] = range(1, len(df) + 1)
-        # Reorder columns to include 'task_priority' and 'Is Overdue' in display
-        df = df[['Task No.', 'id', 'task_name', 'status', 'task_priority', 'progress_percentage', 'assigned_to', 'due_date', 'Is Overdue']]
-    return df
-
-# CORRECTED: Added task_priority parameter to update_task
-def update_task(task_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date):
-    conn = get_db_connection()
-    c = conn.cursor()
-    # CORRECTED: Included task_priority in the UPDATE statement
-    c.execute("UPDATE tasks SET task_name=?, status=?, task_priority=?, progress_percentage=?, assigned_to=?, due_date=? WHERE id=?",
-              (task_name, status, task_priority, progress_percentage, assigned_to, due_date, task_id))
-    conn.commit()
-    conn.close()
-
-def delete_task(task_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    conn.commit()
-    conn.close()
+reminders.start_background() # No-op unless PROJECT_TRACKER_REMINDERS=1
 
 # --- Streamlit App Layout ---
 
@@ -205,6 +57,8 @@ if 'show_add_task_form' not in st.session_state:
     st.session_state.show_add_task_form = False
 if 'filter_tasks_status' not in st.session_state:
     st.session_state.filter_tasks_status = 'All' # Default to 'All'
+if 'bulk_editor_version' not in st.session_state:
+    st.session_state.bulk_editor_version = 0
 
 # --- User Authentication (Login/Register) ---
 def login_register_section():
@@ -252,7 +106,98 @@ def login_register_section():
             else:
                 st.error("Passwords do not match.")
 
+# --- Prepared downloads ---
+# Large exports are written to a temporary file on request; st.session_state[key] only keeps
+# (what was exported, file path), and the file is removed once downloaded.
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'project_tracker_exports')
+EXPORT_MAX_AGE_S = 3600 # Files of sessions that never downloaded are removed after this
+
+def new_export_path(suffix):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    cutoff = time.time() - EXPORT_MAX_AGE_S
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass # Removed by another session meanwhile
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+def discard_prepared_download(key):
+    prepared = st.session_state.pop(key, None)
+    if prepared:
+        try:
+            os.remove(prepared[1])
+        except OSError:
+            pass
+
+def prepared_download_button(key, source, label, file_name, mime):
+    # Download button for the file prepared under key, if it was prepared for source
+    prepared = st.session_state.get(key)
+    if not prepared:
+        return
+    if prepared[0] != source or not os.path.exists(prepared[1]):
+        discard_prepared_download(key)
+        return
+    with open(prepared[1], 'rb') as data:
+        st.download_button(label=label, data=data, file_name=file_name, mime=mime, key=f"download_{key}",
+                           on_click=discard_prepared_download, args=(key,))
+
 # --- Content Functions ---
+def xlsx_download(label, project_ids, file_name, key):
+    # Built on request rather than on every rerun: large workbooks take a while to stream out
+    if st.button(f"Prepare {label}", key=f"prepare_{key}"):
+        discard_prepared_download(key)
+        path = new_export_path('.xlsx')
+        with st.spinner("Writing workbook..."):
+            if export_xlsx_file(path, project_ids):
+                st.session_state[key] = (tuple(project_ids), path)
+            else:
+                os.remove(path)
+    prepared_download_button(key, tuple(project_ids), f"Download {label}", file_name, XLSX_MIME)
+
+def workload_section():
+    st.markdown("---")
+    st.write("### Team Workload")
+    today = datetime.today().date()
+    this_week = today - timedelta(days=today.weekday()) # Monday
+    window_cols = st.columns([3, 1, 1])
+    first_week, last_week = window_cols[0].slider("Weeks (relative to this week)", -26, 52, (-4, 12), key="workload_weeks")
+    top_n = window_cols[1].number_input("Assignees shown (busiest first)", min_value=1, max_value=200, value=25, key="workload_top_n")
+    measure = window_cols[2].radio("Measure", ("open_tasks", "planned_days"), key="workload_measure",
+                                   format_func={'open_tasks': 'Open tasks', 'planned_days': 'Planned days'}.get)
+    start = this_week + timedelta(weeks=first_week)
+    end = this_week + timedelta(weeks=last_week + 1)
+
+    # Long format, one row per non-empty (assignee, week): only the visible slice is pivoted
+    workload = analytics.workload_by_week(st.session_state.user_id, start, end)
+    if workload.empty:
+        st.info("No open tasks with due dates in this window.")
+        return
+    load_by_assignee = workload.groupby('assignee')[measure].sum().sort_values(ascending=False)
+    shown = workload[workload['assignee'].isin(load_by_assignee.index[:top_n])]
+    weeks = pd.date_range(start, end, freq='W-MON', inclusive='left')
+    grid = (shown.pivot_table(index='assignee', columns='week_start', values=measure, aggfunc='sum', fill_value=0)
+            .reindex(index=load_by_assignee.index[:top_n], columns=weeks, fill_value=0))
+    iso = weeks.isocalendar()
+    week_labels = [f"{year}-W{week:02d}" for year, week in zip(iso['year'], iso['week'])]
+    fig = go.Figure(go.Heatmap(z=grid.to_numpy(), x=week_labels, y=grid.index, colorscale='YlOrRd',
+                               hovertemplate="%{y}<br>%{x}: %{z}<extra></extra>"))
+    fig.update_layout(title=f"{len(shown['assignee'].unique())} of {len(load_by_assignee)} assignees",
+                      yaxis={'autorange': 'reversed'}, height=max(300, 22 * len(grid) + 120))
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Drill-down into one cell
+    drill_cols = st.columns(2)
+    assignee = drill_cols[0].selectbox("Assignee", options=list(load_by_assignee.index), key="workload_assignee")
+    assignee_weeks = workload[workload['assignee'] == assignee].sort_values('week_start')
+    week_start = drill_cols[1].selectbox("Week", options=list(assignee_weeks['week_start']), key="workload_week",
+                                         format_func=dict(zip(assignee_weeks['week_start'], assignee_weeks['iso_week'])).get)
+    st.dataframe(analytics.workload_tasks(st.session_state.user_id, assignee, week_start), use_container_width=True, hide_index=True)
+
 def dashboard_page_content():
     st.subheader(f"Welcome to your Civil Engineering Project Tracker, {st.session_state.username}!")
 
@@ -272,17 +217,10 @@ def dashboard_page_content():
         st.markdown("---")
         st.write("### Project Progress at a Glance")
 
-        tasks_all_projects_df = pd.DataFrame()
-        for project_id in projects_df['id']:
-            tasks_for_project = get_tasks_by_project(project_id)
-            if not tasks_for_project.empty:
-                tasks_for_project['project_name'] = projects_df[projects_df['id'] == project_id]['project_name'].iloc[0]
-                tasks_all_projects_df = pd.concat([tasks_all_projects_df, tasks_for_project])
-
-        # CORRECTED: Check tasks_all_projects_df for 'progress_percentage' and emptiness
-        if not tasks_all_projects_df.empty and 'progress_percentage' in tasks_all_projects_df.columns:
-            # Calculate average progress per project
-            project_progress_summary = tasks_all_projects_df.groupby('project_name')['progress_percentage'].mean().reset_index()
+        # Aggregated in one query each by analytics.py (DuckDB when available, otherwise SQLite)
+        project_progress_summary = analytics.project_progress(st.session_state.user_id).to_pandas()
+
+        if not project_progress_summary.empty:
             fig = px.bar(project_progress_summary, x='project_name', y='progress_percentage',
                          title='Average Task Progress Per Project',
                          labels={'project_name': 'Project Name', 'progress_percentage': 'Average Progress (%)'},
@@ -294,26 +232,46 @@ def dashboard_page_content():
         st.markdown("---")
         st.write("### Overdue Task Summary Across All Projects")
 
-        all_user_tasks = pd.DataFrame()
-        for project_id in projects_df['id']:
-            tasks_for_project = get_tasks_by_project(project_id) # This now includes 'Is Overdue'
-            if not tasks_for_project.empty:
-                tasks_for_project['project_name'] = projects_df[projects_df['id'] == project_id]['project_name'].iloc[0]
-                all_user_tasks = pd.concat([all_user_tasks, tasks_for_project])
-
-        if not all_user_tasks.empty:
-            overdue_all_count = all_user_tasks[all_user_tasks['Is Overdue']].shape[0]
+        if not project_progress_summary.empty:
+            overdue_all_count = int(project_progress_summary['overdue_tasks'].sum())
             if overdue_all_count > 0:
                 st.error(f"🚨 You have a total of **{overdue_all_count}** tasks overdue across all your projects!")
                 st.write("Here are the top 5 most urgent overdue tasks:")
-                # Sort by due date to show most urgent first
-                overdue_summary_df = all_user_tasks[all_user_tasks['Is Overdue']].sort_values(by='due_date', ascending=True)
-                st.dataframe(overdue_summary_df[['project_name', 'task_name', 'due_date', 'assigned_to']].head(5), use_container_width=True, hide_index=True)
+                overdue_summary_df = analytics.most_urgent_overdue(st.session_state.user_id, limit=5).to_pandas()
+                st.dataframe(overdue_summary_df, use_container_width=True, hide_index=True)
+                st.write("Overdue tasks by assignee:")
+                st.dataframe(analytics.overdue_by_assignee(st.session_state.user_id).to_pandas(), use_container_width=True, hide_index=True)
             else:
                 st.success("🎉 Great! No overdue tasks across all your projects.")
         else:
             st.info("No tasks added yet to calculate overdue status.")
 
+        st.markdown("---")
+        st.write("### Portfolio Budget Rollup")
+        budget_df = analytics.budget_rollup(st.session_state.user_id).to_pandas()
+        budget_cols = st.columns(3)
+        budget_cols[0].metric("Total Budget", f"${budget_df['budget'].sum():,.2f}")
+        budget_cols[1].metric("Budget Earned (by progress)", f"${budget_df['earned_budget'].sum():,.2f}")
+        budget_cols[2].metric("Tasks", f"{int(budget_df['task_count'].sum())}")
+        st.dataframe(budget_df.drop(columns=['project_id']), use_container_width=True, hide_index=True)
+
+        st.markdown("---")
+        st.write("### Earned Value")
+        evm_result = evm.portfolio_evm(st.session_state.user_id) # Vectorized over all tasks, see evm.py
+        portfolio_evm = evm_result['portfolio'].iloc[0]
+        evm_cols = st.columns(6)
+        evm_cols[0].metric("Planned Value (PV)", f"${portfolio_evm['PV']:,.2f}")
+        evm_cols[1].metric("Earned Value (EV)", f"${portfolio_evm['EV']:,.2f}")
+        evm_cols[2].metric("Actual Cost (AC)", f"${portfolio_evm['AC']:,.2f}")
+        evm_cols[3].metric("CPI", "—" if pd.isna(portfolio_evm['CPI']) else f"{portfolio_evm['CPI']:.2f}")
+        evm_cols[4].metric("SPI", "—" if pd.isna(portfolio_evm['SPI']) else f"{portfolio_evm['SPI']:.2f}")
+        evm_cols[5].metric("Estimate at Completion (EAC)", f"${portfolio_evm['EAC']:,.2f}")
+        st.caption("CPI and SPI below 1 mean over budget and behind schedule. Record actual costs on tasks to get CPI.")
+        st.dataframe(evm_result['projects'].drop(columns=['project_id', 'EV_costed']), use_container_width=True, hide_index=True,
+                     column_config={column: st.column_config.NumberColumn(format="%.2f") for column in ('CPI', 'SPI')})
+
+        workload_section()
+
     else:
         st.info("You don't have any projects yet. Go to the 'My Projects' tab to create your first one!")
 
@@ -382,6 +340,8 @@ def projects_page_content():
             mime="text/csv",
             key="download_projects_csv_with_data" # Unique key (this key should be fine as it's not a form_submit_button)
         )
+        xlsx_download("Excel Workbook (all projects, one sheet each)", projects_df['id'].tolist(),
+                      f"portfolio_{st.session_state.username}.xlsx", key="portfolio_xlsx")
 
 
         st.write("### Select a Project to Manage Tasks or Edit/Delete")
@@ -411,7 +371,7 @@ def projects_page_content():
         # This is the main radio button for Add/Edit/Delete
         project_action = st.radio(
             "Choose action",
-            ("Add New Project", "Edit Selected Project", "Delete Selected Project"),
+            ("Add New Project", "Edit Selected Project", "Delete Selected Project", "Archive Selected Project"),
             horizontal=True,
             index=initial_project_action_index, # Use the determined index
             key="project_action_radio_main" # UNIQUE KEY IS CRITICAL! This radio button's key is fine.
@@ -449,9 +409,9 @@ def projects_page_content():
                     submitted_edit = st.form_submit_button("Update Project") # REMOVED key="edit_project_submit"
                     if submitted_edit:
                         # Call your update_project function here
-                        update_project(selected_project_id_from_df, edited_name, edited_description, edited_start_date, edited_end_date, edited_budget)
-                        st.success("Project updated successfully!")
-                        st.rerun()
+                        if update_project(selected_project_id_from_df, edited_name, edited_description, edited_start_date, edited_end_date, edited_budget):
+                            st.success("Project updated successfully!")
+                            st.rerun()
             else:
                 st.warning("Please select a project to edit.")
 
@@ -463,12 +423,26 @@ def projects_page_content():
                 # `st.button` is outside a form, so its `key` is fine if needed
                 if st.button("Confirm Delete Project", type="secondary", key="confirm_delete_project_btn"): # This key is likely fine.
                     # Call your delete_project function here
-                    delete_project(selected_project_id_from_df)
-                    st.success("Project deleted successfully!")
-                    st.rerun()
+                    if delete_project(selected_project_id_from_df):
+                        st.success("Project deleted successfully!")
+                        st.rerun()
             else:
                 st.warning("Please select a project to delete.")
 
+        elif project_action == "Archive Selected Project":
+            # Moves the project and its tasks to the archive database; restore it from "Archived Projects" below
+            if selected_project_id_from_df:
+                project_name_to_archive = projects_df[projects_df['id'] == selected_project_id_from_df]['project_name'].iloc[0]
+                st.info(f"Archiving Project: **{project_name_to_archive}**. It will be hidden from projects, tasks and the dashboard until restored.")
+                if st.button("Confirm Archive Project", key="confirm_archive_project_btn"):
+                    if archive_project(selected_project_id_from_df):
+                        st.session_state.selected_project_id = None
+                        st.session_state.selected_project_name = None
+                        st.success("Project archived successfully!")
+                        st.rerun()
+            else:
+                st.warning("Please select a project to archive.")
+
 
     else: # If projects_df is empty, only show "Add New Project" form
         st.info("You don't have any projects yet. Use the form below to create one.")
@@ -490,6 +464,238 @@ def projects_page_content():
         # If projects_df is empty, no CSV to download for projects
         # No project selection or edit/delete forms either, as there are no projects.
 
+    archived_projects_section()
+    project_transfer_section(projects_df)
+
+def project_transfer_section(projects_df):
+    # NDJSON project snapshots for moving a project to another instance (see transfer.py)
+    with st.expander("Export / Import Project Snapshot"):
+        if not projects_df.empty:
+            project_to_export = st.selectbox("Project to export", options=projects_df['id'].tolist(), key="snapshot_export_project",
+                                             format_func=lambda x: projects_df[projects_df['id'] == x]['project_name'].iloc[0])
+            if st.button("Prepare Project Snapshot", key="prepare_project_snapshot"):
+                discard_prepared_download('project_snapshot')
+                path = new_export_path('.ndjson')
+                with open(path, 'w', encoding='utf-8') as output: # Streamed from the cursor straight to disk
+                    transfer.export_project(project_to_export, output)
+                st.session_state.project_snapshot = (project_to_export, path)
+            prepared_download_button('project_snapshot', project_to_export, "Download Project Snapshot",
+                                     f"project_{project_to_export}.ndjson", "application/x-ndjson")
+
+        uploaded_snapshot = st.file_uploader("Import a project snapshot (.ndjson)", type=["ndjson", "jsonl"], key="snapshot_import_file")
+        if uploaded_snapshot is not None and st.button("Import Project", key="import_project_snapshot_btn"):
+            try:
+                transfer.import_project(uploaded_snapshot, st.session_state.user_id) # Byte lines, decoded one at a time
+                st.success("Project imported.")
+                st.rerun()
+            except transfer.SnapshotError as e:
+                st.error(f"Could not import snapshot: {e}")
+
+def archived_projects_section():
+    st.markdown("---")
+    with st.expander("Archived Projects"):
+        archivable_df = get_archivable_projects(st.session_state.user_id)
+        if not archivable_df.empty:
+            st.write(f"{len(archivable_df)} active project(s) are finished (all tasks completed/cancelled, or past their end date).")
+            if st.button("Archive all completed projects", key="archive_completed_projects_btn"):
+                archived_count = sum(bool(archive_project(project_id)) for project_id in archivable_df['id'])
+                st.success(f"Archived {archived_count} project(s).")
+                st.rerun()
+
+        search_term = st.text_input("Search archived projects", key="archived_project_search")
+        archived_df = search_archived_projects(st.session_state.user_id, search_term)
+        if archived_df.empty:
+            st.info("No archived projects found.")
+            return
+        st.dataframe(archived_df, use_container_width=True, hide_index=True)
+        project_to_restore = st.selectbox(
+            "Select archived project",
+            options=archived_df['id'].tolist(),
+            format_func=lambda x: archived_df[archived_df['id'] == x]['project_name'].iloc[0],
+            key="archived_project_selector"
+        )
+        if st.button("Restore Project", key="restore_project_btn"):
+            if restore_project(project_to_restore):
+                st.success("Project restored.")
+                st.rerun()
+
+BULK_EDIT_COLUMNS = ['task_name', 'status', 'task_priority', 'progress_percentage', 'assigned_to', 'due_date']
+
+def _comparable(series):
+    # Normalise values so unchanged cells compare equal (dates as ISO strings, blanks as '')
+    if series.name == 'due_date':
+        return pd.to_datetime(series, errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    return series.astype(object).where(series.notna(), '').astype(str)
+
+def diff_task_frames(original_df, edited_df):
+    """Rows of edited_df whose editable cells differ from original_df, as dicts for update_tasks_bulk()."""
+    original = original_df.set_index('id')[BULK_EDIT_COLUMNS]
+    edited = edited_df.set_index('id')[BULK_EDIT_COLUMNS].reindex(original.index)
+    changed = pd.Series(False, index=original.index)
+    for column in BULK_EDIT_COLUMNS:
+        changed |= _comparable(original[column]) != _comparable(edited[column])
+    return _task_rows(edited[changed])
+
+def _task_rows(frame):
+    rows = []
+    for task_id, row in frame.iterrows():
+        due_date = pd.to_datetime(row['due_date'], errors='coerce')
+        rows.append({
+            'id': int(task_id),
+            'task_name': row['task_name'] if pd.notna(row['task_name']) else '',
+            'status': row['status'],
+            'task_priority': row['task_priority'],
+            'progress_percentage': row['progress_percentage'],
+            'assigned_to': row['assigned_to'] if pd.notna(row['assigned_to']) and str(row['assigned_to']).strip() else None, # Blank stays NULL
+            'due_date': due_date.date() if pd.notna(due_date) else None,
+        })
+    return rows
+
+def bulk_edit_tasks_section(tasks_df):
+    st.markdown("---")
+    st.write("### Bulk Edit Tasks")
+    st.caption("Edit cells directly, then save: only changed rows are written, in a single transaction.")
+    # Bumped after each save so the editor starts again from the freshly loaded tasks
+    editor_key = f"bulk_task_editor_{st.session_state.selected_project_id}_{st.session_state.bulk_editor_version}"
+    editor_df = tasks_df[['id', 'Task No.'] + BULK_EDIT_COLUMNS].copy()
+    # Plain values in the editor: categorical columns would restrict cells to existing categories
+    editor_df = editor_df.astype({'status': object, 'task_priority': object, 'assigned_to': object})
+    editor_df.insert(0, 'Select', False)
+    edited_df = st.data_editor(
+        editor_df,
+        column_config={
+            'Select': st.column_config.CheckboxColumn("Select"),
+            'id': None, # Hidden, used to match rows
+            'task_name': st.column_config.TextColumn("Task Name", required=True),
+            'status': st.column_config.SelectboxColumn("Status", options=TASK_STATUS_OPTIONS, required=True),
+            'task_priority': st.column_config.SelectboxColumn("Priority", options=TASK_PRIORITY_OPTIONS, required=True),
+            'progress_percentage': st.column_config.NumberColumn("Progress (%)", min_value=0, max_value=100, step=1, required=True),
+            'assigned_to': st.column_config.TextColumn("Assigned To"),
+            'due_date': st.column_config.DateColumn("Due Date", format="YYYY-MM-DD"),
+        },
+        disabled=['Task No.'],
+        num_rows="fixed",
+        hide_index=True,
+        use_container_width=True,
+        key=editor_key,
+    )
+
+    changed_rows = diff_task_frames(tasks_df, edited_df)
+    selected = edited_df[edited_df['Select']]
+    bulk_cols = st.columns([0.3, 0.25, 0.2, 0.25])
+    with bulk_cols[0]:
+        save_clicked = st.button(f"💾 Save {len(changed_rows)} changed task(s)", disabled=not changed_rows, key="bulk_save_btn")
+    with bulk_cols[1]:
+        bulk_status = st.selectbox("Set status of selected", TASK_STATUS_OPTIONS, key="bulk_status_select", label_visibility="collapsed")
+    with bulk_cols[2]:
+        apply_status_clicked = st.button(f"Apply to {len(selected)} selected", disabled=selected.empty, key="bulk_apply_status_btn")
+    with bulk_cols[3]:
+        complete_clicked = st.button("✔ Mark selected complete", disabled=selected.empty, key="bulk_complete_btn")
+
+    rows_to_write = None
+    if save_clicked:
+        rows_to_write = changed_rows
+    elif apply_status_clicked or complete_clicked:
+        # Selected rows are written with any cell edits they carry, plus the new status
+        new_status = 'Completed' if complete_clicked else bulk_status
+        rows_to_write = _task_rows(selected.set_index('id'))
+        for row in rows_to_write:
+            row['status'] = new_status
+            if new_status == 'Completed':
+                row['progress_percentage'] = 100
+
+    if rows_to_write:
+        if update_tasks_bulk(rows_to_write):
+            st.session_state.bulk_editor_version += 1
+            st.success(f"Updated {len(rows_to_write)} task(s).")
+            st.rerun()
+
+# --- Arrow filters for the task table ---
+def filter_tasks_table(table, overdue='All', status='All', assigned_to='All'):
+    mask = pa.array([True] * table.num_rows)
+    if overdue != 'All':
+        mask = pc.and_(mask, pc.equal(table['Is Overdue'], overdue == 'Overdue'))
+    if status != 'All':
+        mask = pc.and_(mask, pc.fill_null(pc.equal(table['status'], status), False))
+    if assigned_to != 'All':
+        if pd.isna(assigned_to): # The assignee filter offers missing assignees too
+            mask = pc.and_(mask, pc.is_null(table['assigned_to']))
+        else:
+            mask = pc.and_(mask, pc.fill_null(pc.equal(table['assigned_to'], assigned_to), False))
+    return table.filter(mask)
+
+def sort_tasks_table(table, sort_by, descending=False):
+    column = table[sort_by]
+    if sort_by == 'status': # Workflow / priority order rather than alphabetical
+        column = pc.index_in(column, value_set=pa.array(TASK_STATUS_OPTIONS))
+    elif sort_by == 'task_priority':
+        column = pc.index_in(column, value_set=pa.array(TASK_PRIORITY_OPTIONS))
+    order = pc.sort_indices(pa.table({'key': column}), sort_keys=[('key', 'descending' if descending else 'ascending')])
+    return table.take(order)
+
+def search_tasks_table(table, term):
+    def matches(column):
+        return pc.fill_null(pc.match_substring(pc.cast(table[column], pa.string()), term, ignore_case=True), False)
+    return table.filter(pc.or_(matches('task_name'), matches('assigned_to')))
+
+def progress_history_section():
+    st.markdown("---")
+    st.write("### Progress History")
+    project_id = st.session_state.selected_project_id
+    projects_df = get_projects_by_user(st.session_state.user_id)
+    project = projects_df[projects_df['id'] == project_id].iloc[0]
+    today = datetime.today().date()
+    default_start = pd.to_datetime(project['start_date'], errors='coerce')
+    default_start = default_start.date() if pd.notna(default_start) and default_start.date() <= today else today - timedelta(days=30)
+    history_range = st.date_input("Date range", value=(default_start, today), key="progress_history_range")
+    if len(history_range) != 2:
+        return # Still picking the end date
+    curve = snapshots.progress_curve(project_id, *history_range)
+    burndown_fig, s_curve_fig = progress_charts(curve, project['start_date'], project['end_date'])
+    chart_cols = st.columns(2)
+    chart_cols[0].plotly_chart(burndown_fig, use_container_width=True)
+    chart_cols[1].plotly_chart(s_curve_fig, use_container_width=True)
+    st.caption("Daily snapshots store a task's progress only on days it changed; today's point uses the current values.")
+
+def critical_path_section(tasks_df):
+    st.markdown("---")
+    st.write("### Dependencies & Critical Path")
+    project_id = st.session_state.selected_project_id
+    projects_df = get_projects_by_user(st.session_state.user_id)
+    project_start = projects_df.loc[projects_df['id'] == project_id, 'start_date']
+    schedule_df, schedule = critical_path.schedule_frame(project_id, project_start.iloc[0] if not project_start.empty else None)
+
+    st.info(f"Critical path ({schedule.finish} days): {critical_path.critical_path_label(schedule_df) or 'no tasks'}")
+    late_count = int(schedule_df['finishes_after_due'].sum())
+    if late_count:
+        st.warning(f"{late_count} task(s) can't finish by their due date with the current durations and dependencies.")
+
+    def highlight_critical(row):
+        return ['background-color: #ffe0b2' if row['critical'] else ''] * len(row)
+
+    st.dataframe(schedule_df.drop(columns=['id']).style.apply(highlight_critical, axis=1), use_container_width=True, hide_index=True)
+
+    task_label = {row['id']: f"T{row['Task No.']} - {row['task_name']}" for _, row in tasks_df.iterrows()}
+    dep_cols = st.columns(2)
+    with dep_cols[0]:
+        with st.form("add_dependency_form"):
+            predecessor = st.selectbox("Predecessor", options=list(task_label), format_func=task_label.get)
+            successor = st.selectbox("Successor (starts after the predecessor finishes)", options=list(task_label), format_func=task_label.get)
+            if st.form_submit_button("Add Dependency"):
+                if add_task_dependency(predecessor, successor):
+                    st.success("Dependency added.")
+                    st.rerun()
+    with dep_cols[1]:
+        dependencies = get_task_dependencies(project_id)
+        if dependencies:
+            dependency = st.selectbox("Existing dependencies", options=dependencies,
+                                      format_func=lambda d: f"{task_label[d[0]]} → {task_label[d[1]]}", key="dependency_selector")
+            if st.button("Remove Dependency", key="remove_dependency_btn"):
+                if remove_task_dependency(*dependency):
+                    st.rerun()
+        else:
+            st.caption("No dependencies yet: every task can start on the project start date.")
+
 def tasks_page_content():
     if not st.session_state.selected_project_id:
         st.warning("No project selected. Please go to 'My Projects' tab and select one to manage tasks.")
@@ -497,7 +703,9 @@ def tasks_page_content():
 
     st.subheader(f"Tasks for Project: {st.session_state.selected_project_name}")
 
-    tasks_df = get_tasks_by_project(st.session_state.selected_project_id)
+    # One read into Arrow: the table feeds the filtered views and exports, the pandas frame the styled table and forms
+    tasks_table = get_tasks_table(st.session_state.selected_project_id)
+    tasks_df = tasks_table_to_frame(tasks_table)
 
     selected_task_id_from_df = None # Initialize outside conditional blocks
 
@@ -540,7 +748,8 @@ def tasks_page_content():
         # --- Data Visualization: Tasks by Status ---
         st.markdown("---")
         st.write("### Task Status Distribution")
-        status_counts = tasks_df['status'].value_counts().reset_index()
+        status_counts = tasks_df['status'].value_counts()
+        status_counts = status_counts[status_counts > 0].reset_index() # Categorical counts include unused categories
         status_counts.columns = ['Status', 'Count']
         fig_status = px.pie(status_counts, values='Count', names='Status',
                              title='Tasks by Status',
@@ -550,7 +759,8 @@ def tasks_page_content():
         # --- Data Visualization: Tasks by Priority ---
         st.markdown("---")
         st.write("### Task Priority Distribution")
-        priority_counts = tasks_df['task_priority'].value_counts().reset_index()
+        priority_counts = tasks_df['task_priority'].value_counts()
+        priority_counts = priority_counts[priority_counts > 0].reset_index()
         priority_counts.columns = ['Priority', 'Count']
         fig_priority = px.bar(priority_counts, x='Priority', y='Count',
                              title='Tasks by Priority',
@@ -577,25 +787,12 @@ def tasks_page_content():
             sort_by = st.selectbox("Sort by", ['Task No.', 'task_name', 'status', 'progress_percentage', 'due_date', 'task_priority'])
             sort_order = st.radio("Order", ['Ascending', 'Descending'], horizontal=True)
 
-        
-        if filter_overdue == 'Overdue':
-            filtered_tasks_df = filtered_tasks_df[filtered_tasks_df['Is Overdue'] == True]
-        elif filter_overdue == 'Not Overdue':
-            filtered_tasks_df = filtered_tasks_df[filtered_tasks_df['Is Overdue'] == False]
+        # Filtered and sorted with Arrow compute kernels; st.dataframe serializes the table as-is
+        filtered_tasks_table = filter_tasks_table(tasks_table, filter_overdue, filter_status, filter_assigned_to)
+        filtered_tasks_table = sort_tasks_table(filtered_tasks_table, sort_by, descending=(sort_order == 'Descending'))
 
-        filtered_tasks_df = tasks_df.copy()
-        if filter_status != 'All':
-            filtered_tasks_df = filtered_tasks_df[filtered_tasks_df['status'] == filter_status]
-        if filter_assigned_to != 'All':
-            filtered_tasks_df = filtered_tasks_df[filtered_tasks_df['assigned_to'] == filter_assigned_to]
-
-        if sort_order == 'Ascending':
-            filtered_tasks_df = filtered_tasks_df.sort_values(by=sort_by, ascending=True)
-        else:
-            filtered_tasks_df = filtered_tasks_df.sort_values(by=sort_by, ascending=False)
-
-        st.dataframe(filtered_tasks_df, use_container_width=True, hide_index=True)
-        if filtered_tasks_df.empty and (filter_status != 'All' or filter_assigned_to != 'All'):
+        st.dataframe(filtered_tasks_table, use_container_width=True, hide_index=True)
+        if filtered_tasks_table.num_rows == 0 and (filter_status != 'All' or filter_assigned_to != 'All'):
             st.info("No tasks match your filter criteria.")
 
 
@@ -603,25 +800,38 @@ def tasks_page_content():
         st.markdown("---")
         search_task_term = st.text_input("Search Tasks by Name/Assignee", key="task_search_bar")
         if search_task_term:
-            # Apply search to already filtered df
-            filtered_tasks_df = filtered_tasks_df[
-                filtered_tasks_df['task_name'].str.contains(search_task_term, case=False, na=False) |
-                filtered_tasks_df['assigned_to'].str.contains(search_task_term, case=False, na=False)
-            ]
-            st.dataframe(filtered_tasks_df, use_container_width=True, hide_index=True)
-            if filtered_tasks_df.empty:
+            # Apply search to already filtered table
+            filtered_tasks_table = search_tasks_table(filtered_tasks_table, search_task_term)
+            st.dataframe(filtered_tasks_table, use_container_width=True, hide_index=True)
+            if filtered_tasks_table.num_rows == 0:
                 st.info("No tasks match your search criteria.")
 
 
-        # --- Export to CSV for Tasks ---
-        csv_export_tasks = filtered_tasks_df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="Download Tasks as CSV",
-            data=csv_export_tasks,
-            file_name=f"tasks_data_{st.session_state.selected_project_name}.csv",
-            mime="text/csv",
-            key="download_tasks_csv"
-        )
+        # --- Export to CSV / Parquet for Tasks (written from the same Arrow table) ---
+        export_cols = st.columns(3)
+        with export_cols[0]:
+            st.download_button(
+                label="Download Tasks as CSV",
+                data=export_csv_bytes(filtered_tasks_table),
+                file_name=f"tasks_data_{st.session_state.selected_project_name}.csv",
+                mime="text/csv",
+                key="download_tasks_csv"
+            )
+        with export_cols[1]:
+            st.download_button(
+                label="Download Tasks as Parquet",
+                data=export_parquet_bytes(filtered_tasks_table),
+                file_name=f"tasks_data_{st.session_state.selected_project_name}.parquet",
+                mime="application/vnd.apache.parquet",
+                key="download_tasks_parquet"
+            )
+        with export_cols[2]:
+            xlsx_download("Excel Workbook (all tasks)", [st.session_state.selected_project_id],
+                          f"tasks_data_{st.session_state.selected_project_name}.xlsx", key="project_xlsx")
+
+        bulk_edit_tasks_section(tasks_df)
+        critical_path_section(tasks_df)
+        progress_history_section()
 
         st.write("### Select a Task to Edit or Delete")
         if not tasks_df.empty: # Make sure there are tasks to select from originally
@@ -640,8 +850,8 @@ def tasks_page_content():
     st.markdown("---")
     st.write("### Add | Edit | Delete Tasks")
     task_action = st.radio("Choose task action", ("Add New Task", "Edit Selected Task", "Delete Selected Task"), horizontal=True)
-    status_options = ['Not Started', 'In Progress', 'On Hold', 'Completed', 'Cancelled']
-    priority_options = ['Low', 'Medium', 'High'] # Define priority options
+    status_options = TASK_STATUS_OPTIONS
+    priority_options = TASK_PRIORITY_OPTIONS
 
     if task_action == "Add New Task":
         with st.form("add_task_form"):
@@ -652,10 +862,13 @@ def tasks_page_content():
             progress_percentage = st.slider("Progress (%)", 0, 100, 0)
             assigned_to = st.text_input("Assigned To (Optional)")
             due_date = st.date_input("Due Date", value=datetime.today())
+            duration_days = st.number_input("Duration (days)", min_value=0, value=1, step=1)
+            actual_cost = st.number_input("Actual Cost to Date ($)", min_value=0.0, value=None, step=100.0, format="%.2f",
+                                          help="Leave blank if no cost has been recorded yet")
             submitted = st.form_submit_button("Add Task")
             if submitted:
                 # CORRECTED: Pass task_priority to add_task
-                if add_task(st.session_state.selected_project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date):
+                if add_task(st.session_state.selected_project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, actual_cost):
                     st.success(f"Task '{task_name}' added!")
                     st.rerun()
 
@@ -673,12 +886,17 @@ def tasks_page_content():
                 edited_progress_percentage = st.slider("Progress (%)", 0, 100, int(selected_task_data['progress_percentage']))
                 edited_assigned_to = st.text_input("Assigned To (Optional)", value=selected_task_data['assigned_to'] if pd.notna(selected_task_data['assigned_to']) else "")
                 edited_due_date = st.date_input("Due Date", value=pd.to_datetime(selected_task_data['due_date']))
+                edited_duration_days = st.number_input("Duration (days)", min_value=0, step=1,
+                                                       value=int(selected_task_data['duration_days']) if pd.notna(selected_task_data['duration_days']) else 1)
+                edited_actual_cost = st.number_input("Actual Cost to Date ($)", min_value=0.0, step=100.0, format="%.2f",
+                                                     value=float(selected_task_data['actual_cost']) if pd.notna(selected_task_data['actual_cost']) else None,
+                                                     help="Clear to remove the recorded cost")
                 submitted_edit = st.form_submit_button("Update Task")
                 if submitted_edit:
                     # CORRECTED: Pass edited_task_priority to update_task
-                    update_task(selected_task_id_from_df, edited_task_name, edited_status, edited_task_priority, edited_progress_percentage, edited_assigned_to, edited_due_date)
-                    st.success("Task updated successfully!")
-                    st.rerun()
+                    if update_task(selected_task_id_from_df, edited_task_name, edited_status, edited_task_priority, edited_progress_percentage, edited_assigned_to, edited_due_date, edited_duration_days, edited_actual_cost):
+                        st.success("Task updated successfully!")
+                        st.rerun()
         else:
             st.warning("Please select a task to edit.")
 
@@ -687,132 +905,14 @@ def tasks_page_content():
         if selected_task_id_from_df:
             st.error(f"Deleting Task: **{tasks_df[tasks_df['id'] == selected_task_id_from_df]['task_name'].iloc[0]}**")
             if st.button("Confirm Delete Task", type="secondary"):
-                delete_task(selected_task_id_from_df)
-                st.success("Task deleted successfully!")
-                st.rerun()
+                if delete_task(selected_task_id_from_df):
+                    st.success("Task deleted successfully!")
+                    st.rerun()
         else:
             st.warning("Please select a task to delete.")
 
 
 
-def generate_project_report_html(project_id, user_id): # user_id currently unused, consider if needed
-    conn = None
-    try:
-        conn = get_db_connection()
-        # Fetch project data into a DataFrame first
-        project_df = pd.read_sql_query("SELECT * FROM projects WHERE id = ?", conn, params=(project_id,))
-
-        if project_df.empty:
-            st.error(f"Error: Project with ID {project_id} not found.")
-            return None # Or return an empty HTML string
-
-        project_data = project_df.iloc[0] # Now it's safe to access iloc[0]
-    except Exception as e:
-        st.error(f"Database error while fetching project: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
-
-    tasks_df = get_tasks_by_project(project_id) # This function now includes 'Is Overdue'
-
-    # Project Summary
-    html_content = f"<h1>Project Report: {project_data['project_name']}</h1>"
-    html_content += f"<p><strong>Description:</strong> {project_data['description']}</p>"
-    html_content += f"<p><strong>Start Date:</strong> {project_data['start_date']}</p>"
-    html_content += f"<p><strong>End Date:</strong> {project_data['end_date']}</p>"
-    html_content += f"<p><strong>Budget:</strong> ${project_data['budget']:,.2f}</p>" # Corrected formatting
-
-    html_content += "<h2>Task Overview</h2>"
-    if not tasks_df.empty:
-        overall_progress = tasks_df['progress_percentage'].mean()
-        html_content += f"<p><strong>Overall Project Progress:</strong> {overall_progress:.1f}%</p>"
-        html_content += f"<p><strong>Total Tasks:</strong> {len(tasks_df)}</p>"
-        completed_tasks = tasks_df[tasks_df['status'] == 'Completed'].shape[0]
-        html_content += f"<p><strong>Completed Tasks:</strong> {completed_tasks}</p>"
-        overdue_tasks_count = tasks_df[tasks_df['Is Overdue']].shape[0] # Assumes 'Is Overdue' is boolean
-        html_content += f"<p><strong>Overdue Tasks:</strong> <span style='color:red;'>{overdue_tasks_count}</span></p>"
-
-        display_tasks_df = tasks_df[['Task No.', 'task_name', 'status', 'task_priority', 'progress_percentage', 'assigned_to', 'due_date', 'Is Overdue']].copy()
-        display_tasks_df['due_date'] = display_tasks_df['due_date'].dt.strftime('%Y-%m-%d')
-
-        # Convert 'Is Overdue' boolean to 'Yes'/'No' for display BEFORE to_html
-        # This makes the string replacement more targeted and robust.
-        display_tasks_df['Is Overdue'] = display_tasks_df['Is Overdue'].map({True: 'Yes', False: 'No'})
-
-        styled_html_table = display_tasks_df.to_html(index=False, classes='tasks-table', escape=False)
-        
-        # Apply styling:
-        # Style header
-        styled_html_table = styled_html_table.replace('<th>Is Overdue</th>', '<th style="color:red;">Is Overdue</th>')
-        # Style 'Yes' cells in 'Is Overdue' column
-        # Now we replace based on the content 'Yes' which is more specific than 'True'
-        styled_html_table = styled_html_table.replace('<td>Yes</td>', '<td style="color:red; font-weight:bold;">Yes</td>')
-        # 'No' cells don't need specific styling beyond the default, but this ensures consistency if you wanted to style them too.
-        # styled_html_table = styled_html_table.replace('<td>No</td>', '<td>No</td>') # This line is effectively a no-op if 'No' is already the string
-
-        html_content += styled_html_table
-
-        html_content += """
-        <style>
-            .tasks-table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-            .tasks-table th, .tasks-table td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-            .tasks-table th { background-color: #f2f2f2; }
-            /* .overdue-task { background-color: #ffdddd; } */ /* Class defined but not used yet */
-        </style>
-        """
-
-        # Add Visualizations
-        html_content += "<h2>Visualizations</h2>"
-        try:
-            # Task Status Distribution
-            status_counts = tasks_df['status'].value_counts().reset_index()
-            status_counts.columns = ['Status', 'Count']
-            fig_status = px.pie(status_counts, values='Count', names='Status',
-                                title='Tasks by Status',
-                                color_discrete_sequence=px.colors.sequential.RdBu)
-            img_bytes_status = fig_status.to_image(format="png") # Requires kaleido
-            encoded_img_status = base64.b64encode(img_bytes_status).decode('utf-8')
-            html_content += f"<img src='data:image/png;base64,{encoded_img_status}' style='width: 100%; max-width: 600px; display: block; margin: 10px auto;'><br>"
-
-            # Task Priority Distribution
-            priority_counts = tasks_df['task_priority'].value_counts().reset_index()
-            priority_counts.columns = ['Priority', 'Count']
-            fig_priority = px.bar(priority_counts, x='Priority', y='Count',
-                                title='Tasks by Priority',
-                                labels={'Priority': 'Task Priority', 'Count': 'Number of Tasks'},
-                                color='Priority',
-                                category_orders={"Priority": ["High", "Medium", "Low"]},
-                                color_discrete_map={"High": "red", "Medium": "orange", "Low": "green"})
-            img_bytes_priority = fig_priority.to_image(format="png") # Requires kaleido
-            encoded_img_priority = base64.b64encode(img_bytes_priority).decode('utf-8')
-            html_content += f"<img src='data:image/png;base64,{encoded_img_priority}' style='width: 100%; max-width: 600px; display: block; margin: 10px auto;'><br>"
-        except Exception as e:
-            st.warning(f"Could not generate visualizations. Ensure 'kaleido' is installed (pip install kaleido). Error: {e}")
-            html_content += "<p><em>Visualizations could not be generated.</em></p>"
-    else:
-        html_content += "<p>No tasks found for this project.</p>"
-
-    return html_content
-
-
-def generate_pdf_from_html(html_content, filename="report.pdf"): # filename not used by weasyprint here
-    try:
-        from weasyprint import HTML
-        # You can also pass a CSS stylesheet to WeasyPrint if you have external CSS
-        # from weasyprint import CSS
-        # css = CSS(string=''' @page { size: A4; margin: 1in; } ''')
-        # pdf_bytes = HTML(string=html_content).write_pdf(stylesheets=[css])
-        pdf_bytes = HTML(string=html_content).write_pdf()
-        return pdf_bytes
-    except ImportError:
-        st.error("WeasyPrint library not found. Please install it (`pip install weasyprint`) to generate PDFs.")
-        st.info("You can still view the HTML preview below.")
-        return None
-    except Exception as e:
-        st.error(f"Error generating PDF with WeasyPrint: {e}")
-        return None
-
 
 def reports_page_content():
     # Assume st.session_state.username and st.session_state.user_id are set
@@ -823,16 +923,22 @@ def reports_page_content():
     st.subheader(f"Generate Project Reports, {st.session_state.username}")
 
     projects_df = get_projects_by_user(st.session_state.user_id)
+    include_archived = st.checkbox("Include archived projects", key="report_include_archived")
+    archived_df = search_archived_projects(st.session_state.user_id) if include_archived else pd.DataFrame()
 
-    if projects_df.empty:
+    if projects_df.empty and archived_df.empty:
         st.info("You need to add projects first to generate reports. Go to 'My Projects' tab.")
         return
 
-    # More robust way to map display names to IDs
+    # More robust way to map display names to (ID, archived) pairs
     project_display_to_id_map = {
-        f"P{row['User Project ID']} - {row['project_name']}": row['id']
+        f"P{row['User Project ID']} - {row['project_name']}": (row['id'], False)
         for _, row in projects_df.iterrows()
     }
+    project_display_to_id_map.update({
+        f"Archived #{row['id']} - {row['project_name']}": (row['id'], True)
+        for _, row in archived_df.iterrows()
+    })
     project_options = list(project_display_to_id_map.keys())
 
     selected_project_display = st.selectbox(
@@ -842,7 +948,7 @@ def reports_page_content():
     )
 
     if selected_project_display:
-        selected_project_id = project_display_to_id_map.get(selected_project_display)
+        selected_project_id, selected_archived = project_display_to_id_map.get(selected_project_display, (None, False))
 
         if selected_project_id is None:
             st.error("Error: Could not determine selected project ID.")
@@ -853,7 +959,7 @@ def reports_page_content():
 
         if st.button("Generate Report HTML & PDF", key="generate_report_btn"):
             with st.spinner("Generating report..."):
-                report_html = generate_project_report_html(selected_project_id, st.session_state.user_id)
+                report_html = generate_project_report_html(selected_project_id, st.session_state.user_id, archived=selected_archived)
 
             if report_html:
                 st.success("Report HTML generated!")
@@ -878,7 +984,53 @@ def reports_page_content():
             else:
                 st.error("Could not generate report HTML. Project might not exist or an error occurred.")
 
+# --- SQL Debug Panel (opt-in: PROJECT_TRACKER_SQL_DEBUG=1, or ?debug=sql for PROJECT_TRACKER_ADMINS) ---
+def sql_debug_enabled():
+    # The panel shows raw SQL and process-wide stats from every tenant's sessions, so the URL switch is admin-only
+    if os.environ.get('PROJECT_TRACKER_SQL_DEBUG') == '1':
+        return True
+    return st.query_params.get('debug') == 'sql' and st.session_state.username in profiling.ADMIN_USERS
+
+def sql_debug_panel():
+    trace = query_trace.current_trace()
+    if trace is None:
+        return
+    with st.sidebar.expander(f"🛢️ SQL: {trace.query_count} queries, {trace.db_time_s * 1000:.1f} ms", expanded=False):
+        st.caption(f"Rerun #{trace.rerun_id} · view: {trace.view} · budget: {query_trace.QUERY_BUDGET} queries")
+        if trace.over_budget:
+            st.warning(f"This rerun exceeded the query budget ({trace.query_count} > {query_trace.QUERY_BUDGET}).")
+        if trace.queries:
+            queries_df = pd.DataFrame([q.as_dict() for q in trace.queries])
+            st.dataframe(queries_df[['duration_ms', 'rows', 'sql']], use_container_width=True, hide_index=True)
+        if query_trace.view_stats:
+            st.write("Per view (this server process):")
+            st.dataframe(pd.DataFrame.from_dict(query_trace.view_stats, orient='index'), use_container_width=True)
+        cache_stats = data_cache.stats()
+        st.write(f"Shared data cache: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1024 / 1024:.1f} of "
+                 f"{cache_stats['max_bytes'] / 1024 / 1024:.0f} MB, hit rate {cache_stats['hit_rate']:.0%}")
+        st.caption(" · ".join(f"{name}: {cache_stats[name]}" for name in ('hits', 'misses', 'evictions', 'expirations', 'invalidations')))
+
+# --- Profiling Panel (opt-in, see profiling.py) ---
+def profile_panel(result):
+    st.markdown("---")
+    with st.expander(f"⏱️ Profile ({result.mode}): {result.view} view took {result.elapsed_s * 1000:.1f} ms", expanded=True):
+        if result.summary:
+            st.caption(result.summary)
+        st.dataframe(pd.DataFrame(result.rows), use_container_width=True, hide_index=True)
+        for title, rows in result.tables.items():
+            st.write(f"{title}:")
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        if result.mode == 'memory' and profiling.memory_stats:
+            st.write("Per view (this server process):")
+            st.dataframe(pd.DataFrame.from_dict(profiling.memory_stats, orient='index'), use_container_width=True)
+        data, file_name, mime = result.download
+        st.download_button(label=f"Download {file_name}", data=data, file_name=file_name, mime=mime, key="download_profile")
+
 # --- Main App Logic ---
+set_current_tenant(st.session_state.user_id if st.session_state.logged_in else None) # Routes queries to the user's shard
+query_trace.begin_rerun(st.session_state.current_view if st.session_state.logged_in else 'Login')
+if st.session_state.logged_in:
+    snapshots.snapshot_if_due() # Queues today's progress snapshot for this user's database on its writer thread, once a day
 if not st.session_state.logged_in:
     login_register_section() # Show login/register if not logged in
 else:
@@ -936,14 +1088,21 @@ else:
     st.markdown("---") # Separator below navigation buttons
 
     # --- Page Routing based on current_view ---
-    if st.session_state.current_view == 'Dashboard':
-        dashboard_page_content()
-    elif st.session_state.current_view == 'Projects':
-        projects_page_content()
-    elif st.session_state.current_view == 'Tasks':
-        tasks_page_content()
-    elif st.session_state.current_view == 'Reports': # NEW
-        reports_page_content()
+    view_functions = {
+        'Dashboard': dashboard_page_content,
+        'Projects': projects_page_content,
+        'Tasks': tasks_page_content,
+        'Reports': reports_page_content, # NEW
+    }
+    view_fn = view_functions.get(st.session_state.current_view)
+    if view_fn:
+        profile_mode = profiling.requested_mode(st.session_state.username, st.query_params)
+        if profile_mode:
+            profile_result = profiling.run_profiled(st.session_state.current_view, view_fn, profile_mode,
+                                                    session_state=st.session_state)
+            profile_panel(profile_result)
+        else:
+            view_fn()
     # Add other pages here if you expand the navigation
 
     
@@ -1010,3 +1169,7 @@ text-align: center;
 </div>
 """
 st.markdown(footer,unsafe_allow_html=True)
+
+if sql_debug_enabled():
+    sql_debug_panel()
+query_trace.end_rerun()
@@ -0,0 +1,239 @@
+"""Online backups of the tracker databases with SQLite's backup API.
+
+Each database (main, shards and their archives) is copied with
+sqlite3.Connection.backup a few pages per step, pausing between steps so app
+sessions can keep writing; a write from another connection simply makes SQLite
+restart the copy. If writes keep restarting it, the copy is redone in a single
+step, holding a read lock just for that. Every copy is checked with PRAGMA
+integrity_check before it joins the backup set, and only the newest
+PROJECT_TRACKER_BACKUP_KEEP sets are kept.
+
+    python backup.py run [--dest DIR] [--every HOURS]   one backup set now (or every HOURS)
+    python backup.py list [--dest DIR]
+    python backup.py restore SET_DIR                    copy a set back over the live files
+
+A set is a directory named after its UTC start time holding the database copies
+and manifest.json (source path, pages copied, duration, integrity result per
+file). Restore writes through the backup API as well; restart the app
+afterwards so its caches don't outlive the data they were read from.
+
+    PROJECT_TRACKER_BACKUP_DIR=backups      where sets are written
+    PROJECT_TRACKER_BACKUP_KEEP=7           sets kept by rotation
+    PROJECT_TRACKER_BACKUP_PAGES=256        pages copied per step
+    PROJECT_TRACKER_BACKUP_PAUSE_MS=10      pause between steps
+    PROJECT_TRACKER_BACKUP_MAX_RESTARTS=20  restarts before falling back to one step
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+import database
+
+BACKUP_DIR = os.environ.get('PROJECT_TRACKER_BACKUP_DIR', 'backups')
+KEEP = int(os.environ.get('PROJECT_TRACKER_BACKUP_KEEP', '7'))
+PAGES_PER_STEP = int(os.environ.get('PROJECT_TRACKER_BACKUP_PAGES', '256'))
+PAUSE_S = float(os.environ.get('PROJECT_TRACKER_BACKUP_PAUSE_MS', '10')) / 1000
+MAX_RESTARTS = int(os.environ.get('PROJECT_TRACKER_BACKUP_MAX_RESTARTS', '20'))
+MANIFEST = 'manifest.json'
+
+logger = logging.getLogger('project_tracker.backup')
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def source_paths():
+    # Every data database plus the archive next to it, if one was ever created
+    paths = []
+    for db_path in database.data_db_paths():
+        paths.append(db_path)
+        if os.path.exists(database.archive_path(db_path)):
+            paths.append(database.archive_path(db_path))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def copy_database(source, target, pages=PAGES_PER_STEP, pause=PAUSE_S):
+    """Copy source to target in steps of `pages`; returns {'pages': total, 'pages_copied': n, 'restarts': n, 'seconds': s}."""
+    stats = {'pages': 0, 'pages_copied': 0, 'restarts': 0}
+    done = 0 # Pages of the current pass
+
+    def progress(status, remaining, total):
+        nonlocal done
+        copied = total - remaining
+        if copied < done: # Another connection wrote to the source: SQLite started over
+            stats['restarts'] += 1
+            done = 0
+            if stats['restarts'] > MAX_RESTARTS and pages > 0:
+                raise _TooManyRestarts() # Aborts this copy
+        stats['pages_copied'] += copied - done
+        stats['pages'] = total
+        done = copied
+
+    started = time.perf_counter()
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=pause)
+        except _TooManyRestarts:
+            logger.warning("%s: %d restarts from concurrent writes, copying in one step", source, stats['restarts'])
+            done = 0
+            src.backup(dst, pages=-1, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def integrity_check(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return 'ok' if result == ['ok'] else '; '.join(result)
+
+
+def _standalone(path):
+    # The copy inherits the source's WAL mode; a rollback journal keeps the set to one file per database
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+
+
+def _backup_name(path, root):
+    # Unique, flat file name inside the set, e.g. shards/shard_03.db -> shards__shard_03.db
+    path = os.path.abspath(path)
+    relative = os.path.relpath(path, root)
+    if relative.startswith(os.pardir): # Outside the main database's directory
+        relative = path.lstrip(os.sep)
+    return relative.replace(os.sep, '__')
+
+
+def run_backup(dest=BACKUP_DIR, keep=KEEP, pages=PAGES_PER_STEP, pause=PAUSE_S):
+    """Write one verified backup set under dest and rotate old sets; returns the manifest."""
+    started = datetime.now(timezone.utc)
+    set_dir = os.path.join(dest, started.strftime('%Y%m%dT%H%M%SZ'))
+    partial_dir = set_dir + '.partial'
+    os.makedirs(partial_dir)
+    root = os.path.dirname(os.path.abspath(database.DB_NAME))
+    manifest = {'started_at': started.isoformat(), 'files': []}
+    try:
+        for source in source_paths():
+            name = _backup_name(source, root)
+            stats = copy_database(source, os.path.join(partial_dir, name), pages, pause)
+            _standalone(os.path.join(partial_dir, name))
+            stats.update(source=os.path.abspath(source), file=name, integrity=integrity_check(os.path.join(partial_dir, name)))
+            manifest['files'].append(stats)
+            logger.info("%s: %d pages (%d copied, %d restarts) in %.2fs, integrity %s",
+                        source, stats['pages'], stats['pages_copied'], stats['restarts'], stats['seconds'], stats['integrity'])
+            if stats['integrity'] != 'ok':
+                raise BackupError(f"Backup of {source} failed its integrity check: {stats['integrity']}")
+        manifest['seconds'] = round((datetime.now(timezone.utc) - started).total_seconds(), 3)
+        with open(os.path.join(partial_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(partial_dir, set_dir) # Only complete, verified sets count as backups
+    except Exception:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise
+    rotate(dest, keep)
+    return manifest
+
+
+def list_sets(dest=BACKUP_DIR):
+    """Complete backup sets under dest, oldest first."""
+    if not os.path.isdir(dest):
+        return []
+    return sorted(os.path.join(dest, name) for name in os.listdir(dest)
+                  if os.path.isfile(os.path.join(dest, name, MANIFEST)))
+
+
+def rotate(dest=BACKUP_DIR, keep=KEEP):
+    for set_dir in list_sets(dest)[:-keep] if keep > 0 else []:
+        shutil.rmtree(set_dir)
+        logger.info("Removed old backup set %s", set_dir)
+
+
+def restore(set_dir, pages=PAGES_PER_STEP):
+    """Copy every database of a backup set over its original path; returns the restored paths."""
+    with open(os.path.join(set_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    for entry in manifest['files']: # Refuse a damaged set before touching any live file
+        integrity = integrity_check(os.path.join(set_dir, entry['file']))
+        if integrity != 'ok':
+            raise BackupError(f"{entry['file']} in {set_dir} failed its integrity check: {integrity}")
+    restored = []
+    for entry in manifest['files']:
+        os.makedirs(os.path.dirname(entry['source']) or '.', exist_ok=True)
+        stats = copy_database(os.path.join(set_dir, entry['file']), entry['source'], pages, pause=0)
+        logger.info("Restored %s (%d pages in %.2fs)", entry['source'], stats['pages'], stats['seconds'])
+        restored.append(entry['source'])
+    return restored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up and restore the project tracker databases.")
+    parser.add_argument('--db', help="Main database (default: PROJECT_TRACKER_DB or project_tracker.db)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help="Write a backup set")
+    run_parser.add_argument('--dest', default=BACKUP_DIR, help="Directory for backup sets")
+    run_parser.add_argument('--keep', type=int, default=KEEP, help="Backup sets to keep")
+    run_parser.add_argument('--pages', type=int, default=PAGES_PER_STEP, help="Pages copied per step")
+    run_parser.add_argument('--every', type=float, help="Repeat every EVERY hours until interrupted")
+    list_parser = sub.add_parser('list', help="List backup sets")
+    list_parser.add_argument('--dest', default=BACKUP_DIR, help="Directory for backup sets")
+    restore_parser = sub.add_parser('restore', help="Restore a backup set over the live databases")
+    restore_parser.add_argument('set_dir', help="Backup set directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if args.db:
+        database.DB_NAME = args.db
+    if args.command == 'list':
+        for set_dir in list_sets(args.dest):
+            with open(os.path.join(set_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+            pages = sum(entry['pages'] for entry in manifest['files'])
+            print(f"{set_dir}  {len(manifest['files'])} file(s)  {pages} pages  {manifest['seconds']}s")
+        return 0
+    if args.command == 'restore':
+        try:
+            restore(args.set_dir)
+        except BackupError as e:
+            logger.error("%s", e)
+            return 1
+        return 0
+
+    database.init_db()
+    while True:
+        try:
+            manifest = run_backup(args.dest, args.keep, args.pages)
+            logger.info("Backup set complete: %d file(s) in %.2fs", len(manifest['files']), manifest['seconds'])
+        except BackupError as e:
+            logger.error("%s", e)
+            if not args.every:
+                return 1
+        if not args.every:
+            return 0
+        try:
+            time.sleep(args.every * 3600)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
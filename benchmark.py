@@ -0,0 +1,281 @@
+"""Benchmark suite for the Civil Engineering Project Tracker.
+
+Fills a SQLite database with a synthetic civil-engineering dataset
+(N users x M projects x K tasks), times every data function, the dashboard
+aggregation and report generation, and writes the results as JSON so runs can
+be compared between versions.
+
+    python benchmark.py --users 20 --projects 10 --tasks 200 --output bench_results.json
+    python benchmark.py --compare bench_old.json bench_results.json
+
+The dataset is written to benchmark.db by default; pass --db project_tracker.db
+to benchmark against the app's own database file. To benchmark sharded storage,
+split the generated file with `python sharding.py migrate --db benchmark.db` and
+rerun with PROJECT_TRACKER_STORAGE=sharded and --reuse.
+
+The shared data cache (data_cache.py) is disabled so reads hit the database;
+pass --cache to time warm-cache reads instead.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import analytics
+import data_cache
+import database
+import write_queue
+
+BENCH_PASSWORD = 'benchmark'
+
+PROJECT_TYPES = [
+    'Road Resurfacing', 'Bridge Rehabilitation', 'Culvert Construction', 'Drainage Upgrade',
+    'Residential Block', 'Office Complex', 'Water Treatment Plant', 'Retaining Wall',
+    'Pedestrian Footbridge', 'Sewer Line Extension', 'Warehouse', 'Flyover',
+]
+PHASES = ['Phase A', 'Phase B', 'Phase C', 'Lot 1', 'Lot 2', 'Section North', 'Section South']
+TASK_NAMES = [
+    'Site Clearance', 'Setting Out', 'Excavation', 'Blinding', 'Foundation Reinforcement',
+    'Foundation Concrete', 'Column Casting', 'Beam Formwork', 'Slab Casting', 'Blockwork',
+    'Roofing', 'Plastering', 'Drainage Installation', 'Subbase Compaction', 'Asphalt Laying',
+    'Kerb Installation', 'Road Marking', 'Backfilling', 'Waterproofing', 'Handover Inspection',
+]
+ENGINEER_FIRST_NAMES = ['Ade', 'Bola', 'Chidi', 'Dayo', 'Emeka', 'Funmi', 'Gbenga', 'Halima',
+                        'Ifeoma', 'Jide', 'Kemi', 'Lanre', 'Musa', 'Ngozi', 'Ola', 'Tunde']
+ENGINEER_LAST_NAMES = ['Adeyemi', 'Bello', 'Okafor', 'Yusuff', 'Eze', 'Ibrahim', 'Olatunji', 'Nwosu']
+
+# (status, weight, progress range) - progress is kept consistent with the status
+STATUS_DISTRIBUTION = [
+    ('Not Started', 0.25, (0, 0)),
+    ('In Progress', 0.35, (5, 95)),
+    ('On Hold', 0.07, (10, 80)),
+    ('Completed', 0.28, (100, 100)),
+    ('Cancelled', 0.05, (0, 50)),
+]
+PRIORITY_DISTRIBUTION = [('Low', 0.3), ('Medium', 0.5), ('High', 0.2)]
+UNASSIGNED_SHARE = 0.05
+
+
+# --- Dataset generator ---
+def generate_dataset(db_path, users, projects_per_user, tasks_per_project, seed=42):
+    """Write users x projects x tasks rows into db_path and return the dataset summary."""
+    rng = random.Random(seed)
+    database.DB_NAME = db_path
+    database.init_db()
+
+    statuses = [s for s, _, _ in STATUS_DISTRIBUTION]
+    status_weights = [w for _, w, _ in STATUS_DISTRIBUTION]
+    progress_ranges = {s: r for s, _, r in STATUS_DISTRIBUTION}
+    priorities = [p for p, _ in PRIORITY_DISTRIBUTION]
+    priority_weights = [w for _, w in PRIORITY_DISTRIBUTION]
+    today = date.today()
+    password = database.hash_password(BENCH_PASSWORD)
+
+    conn = database.get_db_connection()
+    c = conn.cursor()
+    for u in range(users):
+        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (f"bench_user_{seed}_{u}", password))
+        user_id = c.lastrowid
+        # Each user works with their own crew; a few engineers carry most of the tasks
+        crew = [f"{rng.choice(ENGINEER_FIRST_NAMES)} {rng.choice(ENGINEER_LAST_NAMES)}" for _ in range(rng.randint(6, 15))]
+        crew_weights = [1.0 / (rank + 1) for rank in range(len(crew))]
+
+        for p in range(projects_per_user):
+            start = today - timedelta(days=rng.randint(0, 730))
+            end = start + timedelta(days=rng.randint(90, 720))
+            c.execute("INSERT INTO projects (user_id, project_name, description, start_date, end_date, budget) VALUES (?, ?, ?, ?, ?, ?)",
+                      (user_id, f"{rng.choice(PROJECT_TYPES)} {rng.choice(PHASES)}", f"Synthetic benchmark project {p + 1}",
+                       start.isoformat(), end.isoformat(), round(rng.uniform(50_000, 25_000_000), 2)))
+            project_id = c.lastrowid
+
+            rows = []
+            span = (end - start).days
+            for t in range(tasks_per_project):
+                status = rng.choices(statuses, status_weights)[0]
+                low, high = progress_ranges[status]
+                assigned_to = '' if rng.random() < UNASSIGNED_SHARE else rng.choices(crew, crew_weights)[0]
+                due_date = start + timedelta(days=int(span * (t + rng.random()) / tasks_per_project))
+                rows.append((project_id, f"{TASK_NAMES[t % len(TASK_NAMES)]} {t // len(TASK_NAMES) + 1}", status,
+                             rng.choices(priorities, priority_weights)[0], rng.randint(low, high), assigned_to,
+                             due_date.isoformat()))
+            c.executemany("INSERT INTO tasks (project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    conn.close()
+    return {'users': users, 'projects_per_user': projects_per_user, 'tasks_per_project': tasks_per_project,
+            'total_projects': users * projects_per_user, 'total_tasks': users * projects_per_user * tasks_per_project,
+            'seed': seed}
+
+
+# --- Timing harness ---
+def time_call(fn, repeat, setup=None):
+    # setup() runs untimed before each call and returns the positional args for fn
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'runs': len(ordered),
+        'min_s': ordered[0],
+        'median_s': statistics.median(ordered),
+        'mean_s': statistics.fmean(ordered),
+        'p95_s': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'max_s': ordered[-1],
+        'stdev_s': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def dashboard_aggregation(user_id):
+    # Mirrors dashboard_page_content(): progress per project, the overdue summary and the budget rollup
+    database.get_projects_by_user(user_id)
+    return (analytics.project_progress(user_id), analytics.most_urgent_overdue(user_id, limit=5),
+            analytics.overdue_by_assignee(user_id), analytics.budget_rollup(user_id))
+
+
+def _scratch_project(user_id, tasks_per_project):
+    database.add_project(user_id, 'Benchmark Scratch Project', 'Created by benchmark.py', date.today(), date.today(), 1000.0)
+    project_id = int(database.get_projects_by_user(user_id)['id'].iloc[-1])
+    db_path = database.resolve_db_path()
+    write_queue.execute(db_path, lambda conn: conn.executemany(
+        "INSERT INTO tasks (project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date) VALUES (?, ?, 'In Progress', 'Medium', 50, 'Bench', ?)",
+        [(project_id, f"Scratch Task {i}", date.today().isoformat()) for i in range(tasks_per_project)]))
+    database.invalidate_cache(db_path, project_ids=[project_id])
+    return project_id
+
+
+def run_benchmarks(user_id, username, tasks_per_project, repeat):
+    from reports import generate_project_report_html  # Imported late: pulls in plotly
+
+    database.set_current_tenant(user_id) # Resolves the user's shard in sharded storage mode
+    projects_df = database.get_projects_by_user(user_id)
+    project_id = int(projects_df['id'].iloc[0])
+    task_ids = database.get_tasks_by_project(project_id)['id'].tolist()
+    today = date.today()
+    results = {}
+
+    def bench(name, fn, setup=None, runs=repeat):
+        results[name] = time_call(fn, runs, setup)
+        print(f"  {name:<32} median {results[name]['median_s'] * 1000:9.2f} ms  (n={runs})")
+
+    bench('verify_user', lambda: database.verify_user(username, BENCH_PASSWORD))
+    bench('get_projects_by_user', lambda: database.get_projects_by_user(user_id))
+    bench('get_tasks_by_project', lambda: database.get_tasks_by_project(project_id))
+    bench('dashboard_aggregation', lambda: dashboard_aggregation(user_id))
+    bench('add_task', lambda: database.add_task(project_id, 'Benchmark Task', 'Not Started', 'Medium', 0, 'Bench', today))
+    bench('update_task', lambda task_id: database.update_task(task_id, 'Benchmark Update', 'In Progress', 'High', 40, 'Bench', today),
+          setup=lambda: (random.choice(task_ids),))
+    bench('delete_task', lambda: None if not task_ids else database.delete_task(task_ids.pop()))
+    bench('add_project', lambda: database.add_project(user_id, 'Benchmark Project', 'Benchmark', today, today, 1000.0))
+    bench('update_project', lambda: database.update_project(project_id, 'Benchmark Project', 'Updated', today, today, 2000.0))
+    bench('delete_project', database.delete_project, setup=lambda: (_scratch_project(user_id, tasks_per_project),),
+          runs=max(1, repeat // 5))
+    bench('generate_project_report_html', lambda: generate_project_report_html(project_id, user_id), runs=max(1, repeat // 5))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Comparing two result files ---
+def compare_results(baseline_path, current_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    with open(current_path) as f:
+        current = json.load(f)['results']
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline ms':>12} {'current ms':>12} {'ratio':>8}")
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            print(f"{name:<32} {'(only in one file)':>34}")
+            continue
+        old, new = baseline[name]['median_s'], current[name]['median_s']
+        ratio = new / old if old else float('inf')
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{name:<32} {old * 1000:12.2f} {new * 1000:12.2f} {ratio:8.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the project tracker against a synthetic dataset.")
+    parser.add_argument('--db', default='benchmark.db', help="SQLite file to generate and benchmark (default: benchmark.db)")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--projects', type=int, default=10, help="Projects per user")
+    parser.add_argument('--tasks', type=int, default=100, help="Tasks per project")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help="Timed runs per benchmark")
+    parser.add_argument('--reuse', action='store_true', help="Benchmark an already generated --db instead of regenerating it")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write the JSON results")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="Compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=1.2, help="Median slowdown ratio reported as a regression")
+    parser.add_argument('--cache', action='store_true', help="Keep the shared data cache on (reads are then mostly cache hits)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare_results(args.compare[0], args.compare[1], args.threshold)
+        return 1 if regressions else 0
+
+    database.DB_NAME = args.db
+    if not args.cache:
+        data_cache.MAX_BYTES = 0
+    if args.reuse:
+        conn = database.get_catalog_connection()
+        row = conn.execute("SELECT id, username FROM users WHERE username LIKE 'bench_user_%' ORDER BY id LIMIT 1").fetchone()
+        conn.close()
+        if row is None:
+            parser.error(f"{args.db} has no benchmark users; run without --reuse first")
+        dataset = {'reused': True}
+    else:
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        print(f"Generating {args.users} users x {args.projects} projects x {args.tasks} tasks into {args.db} ...")
+        start = time.perf_counter()
+        dataset = generate_dataset(args.db, args.users, args.projects, args.tasks, args.seed)
+        dataset['generation_s'] = time.perf_counter() - start
+        conn = database.get_catalog_connection()
+        row = conn.execute("SELECT id, username FROM users WHERE username = ?", (f"bench_user_{args.seed}_0",)).fetchone()
+        conn.close()
+
+    print("Running benchmarks ...")
+    results = run_benchmarks(row[0], row[1], args.tasks, args.repeat)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sqlite': database.sqlite3.sqlite_version,
+            'pandas': database.pd.__version__,
+            'analytics_engine': analytics.get_engine().name,
+            'repeat': args.repeat,
+            'cache_bytes': data_cache.MAX_BYTES,
+        },
+        'dataset': dataset,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Partitioned Parquet export of projects and tasks for BI tools.
+
+Writes a Hive-partitioned dataset that DuckDB, Spark, pandas/pyarrow.dataset or
+Power BI can read directly:
+
+    OUT/projects/user_id=U/part-0.parquet               with 'User Project ID'
+    OUT/tasks/user_id=U/project_id=P/part-0.parquet     with 'Task No.' and 'Is Overdue'
+
+Rows are streamed from SQLite in batches of --batch-rows (one Parquet row group
+each) and written zstd-compressed with Arrow types (dates as date32, labels
+dictionary-encoded). Soft-deleted and archived projects are not exported.
+
+OUT/_export_state.json remembers each database's change_log position and the
+export day. A re-export only rewrites the partitions of users and projects that
+changed since then, plus projects whose 'Is Overdue' flags moved with the date;
+partitions of projects that were deleted or archived are removed. --full
+rewrites everything.
+
+    python bi_export.py export OUT [--full] [--batch-rows N]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import analytics
+import database
+
+STATE_FILE = '_export_state.json'
+COMPRESSION = 'zstd'
+
+logger = logging.getLogger('project_tracker.bi_export')
+
+# Partition keys come first in the SQL rows and are dropped from the files (they are in the path)
+TASK_ROW_SCHEMA = pa.schema([('user_id', pa.int64()), ('project_id', pa.int64())] + list(database.TASK_ARROW_SCHEMA))
+PROJECT_ROW_SCHEMA = pa.schema([
+    ('user_id', pa.int64()),
+    ('id', pa.int64()),
+    ('project_name', pa.string()),
+    ('description', pa.string()),
+    ('start_date', pa.string()),
+    ('end_date', pa.string()),
+    ('budget', pa.float64()),
+])
+
+TASKS_SQL = '''
+    SELECT p.user_id, t.project_id, t.id, t.task_name, t.status, t.task_priority, t.progress_percentage,
+           t.assigned_to, t.due_date, t.duration_days, t.actual_cost
+    FROM tasks t JOIN projects p ON p.id = t.project_id
+    WHERE p.deleted_at IS NULL {where}
+    ORDER BY p.user_id, t.project_id, t.id'''
+PROJECTS_SQL = '''
+    SELECT user_id, id, project_name, description, start_date, end_date, budget
+    FROM projects
+    WHERE deleted_at IS NULL {where}
+    ORDER BY user_id, id'''
+
+
+def _partition_path(out_dir, table_name, *keys):
+    return os.path.join(out_dir, table_name, *(f"{name}={value}" for name, value in keys))
+
+
+def _parse_dates(table, columns):
+    for column in columns:
+        parsed = pc.strptime(table[column], format='%Y-%m-%d', unit='s', error_is_null=True).cast(pa.date32())
+        table = table.set_column(table.schema.get_field_index(column), column, parsed)
+    return table
+
+
+class _PartitionWriter:
+    """Writes consecutive row runs into one Parquet file per partition, replacing the old file on close."""
+
+    def __init__(self, out_dir, table_name, key_names):
+        self.out_dir = out_dir
+        self.table_name = table_name
+        self.key_names = key_names
+        self.key = None
+        self.writer = None
+        self.rows = 0 # Rows written to the current partition
+        self.written = []
+
+    def write(self, key, table):
+        if key != self.key:
+            self.close()
+            self.key = key
+            directory = _partition_path(self.out_dir, self.table_name, *zip(self.key_names, key))
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.makedirs(directory)
+            self.path = os.path.join(directory, 'part-0.parquet')
+            self.writer = pq.ParquetWriter(self.path + '.tmp', table.schema, compression=COMPRESSION)
+        self.writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.path + '.tmp', self.path)
+            self.written.append(self.key)
+        self.key, self.writer, self.rows = None, None, 0
+
+
+def _runs(batch, key_names):
+    # Batches are ordered by the partition keys: yield (key, slice) for each run of equal keys
+    keys = list(zip(*(batch.column(name).to_pylist() for name in key_names)))
+    start = 0
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[start]:
+            yield keys[start], batch.slice(start, i - start)
+            start = i
+
+
+def export_tasks(conn, out_dir, project_ids=None, batch_rows=database.ARROW_BATCH_ROWS):
+    """Stream tasks into tasks/user_id=/project_id= partitions (all projects, or only project_ids); returns the keys written."""
+    where, params = '', ()
+    if project_ids is not None:
+        where, params = "AND t.project_id IN (SELECT value FROM json_each(?))", (json.dumps(sorted(project_ids)),)
+    writer = _PartitionWriter(out_dir, 'tasks', ('user_id', 'project_id'))
+    try:
+        for batch in database.fetch_record_batches(conn, TASKS_SQL.format(where=where), params, TASK_ROW_SCHEMA, batch_rows):
+            for key, rows in _runs(batch, ('user_id', 'project_id')):
+                first_task_no = writer.rows + 1 if key == writer.key else 1
+                table = pa.Table.from_batches([rows.drop_columns(['user_id', 'project_id'])])
+                writer.write(key, database.derive_task_columns(table, first_task_no))
+    finally:
+        writer.close()
+    return writer.written
+
+
+def export_projects(conn, out_dir, user_ids=None, batch_rows=database.ARROW_BATCH_ROWS):
+    """Stream projects into projects/user_id= partitions (all users, or only user_ids); returns the keys written."""
+    where, params = '', ()
+    if user_ids is not None:
+        where, params = "AND user_id IN (SELECT value FROM json_each(?))", (json.dumps(sorted(user_ids)),)
+    writer = _PartitionWriter(out_dir, 'projects', ('user_id',))
+    try:
+        for batch in database.fetch_record_batches(conn, PROJECTS_SQL.format(where=where), params, PROJECT_ROW_SCHEMA, batch_rows):
+            for key, rows in _runs(batch, ('user_id',)):
+                first_no = writer.rows + 1 if key == writer.key else 1
+                table = _parse_dates(pa.Table.from_batches([rows.drop_columns(['user_id'])]), ('start_date', 'end_date'))
+                # Same numbering as the My Projects list
+                table = table.add_column(0, 'User Project ID', pa.array(range(first_no, first_no + table.num_rows), type=pa.int64()))
+                writer.write(key, table)
+    finally:
+        writer.close()
+    return writer.written
+
+
+def _remove_partitions(out_dir, table_name, keys):
+    for key in keys:
+        directory = _partition_path(out_dir, table_name, *key)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+            parent = os.path.dirname(directory)
+            if table_name == 'tasks' and not os.listdir(parent): # Last project of the user
+                os.rmdir(parent)
+
+
+def _exported_task_partitions(out_dir, user_ids):
+    # (user_id, project_id) of the task partitions on disk for these users
+    found = set()
+    for user_id in user_ids:
+        directory = _partition_path(out_dir, 'tasks', ('user_id', user_id))
+        if os.path.isdir(directory):
+            found.update((user_id, int(name.split('=', 1)[1])) for name in os.listdir(directory) if name.startswith('project_id='))
+    return found
+
+
+def _task_keys(pairs):
+    return [(('user_id', user_id), ('project_id', project_id)) for user_id, project_id in pairs]
+
+
+def _load_state(out_dir):
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def export_database(db_path, out_dir, state, full, batch_rows):
+    """Export one database (main or shard); updates state in place and returns (project partitions, task partitions) written."""
+    today = date.today().isoformat()
+    conn = database.connect(db_path)
+    try:
+        # Watermark first, so writes made during the export are picked up by the next one
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        last_seq = state['change_seq'].get(db_path)
+        if full or last_seq is None:
+            written = export_projects(conn, out_dir, batch_rows=batch_rows), export_tasks(conn, out_dir, batch_rows=batch_rows)
+        else:
+            changes = conn.execute("SELECT kind, owner_id FROM change_log WHERE seq > ?", (last_seq,)).fetchall()
+            user_ids = {owner for kind, owner in changes if kind == 'projects'}
+            project_ids = {owner for kind, owner in changes if kind == 'tasks'}
+            if state.get('day') and state['day'] != today: # 'Is Overdue' flipped for open tasks that fell due since
+                project_ids.update(row[0] for row in conn.execute(
+                    f"SELECT DISTINCT project_id FROM tasks WHERE due_date >= ? AND due_date < ? AND {analytics.OPEN_STATUS_FILTER}",
+                    (state['day'], today)))
+            live = dict(conn.execute("SELECT id, user_id FROM projects WHERE deleted_at IS NULL").fetchall()) # project -> owner
+
+            # Task partitions of projects that were deleted, archived or given to another owner go away;
+            # the changed projects' partitions are rewritten (or stay removed if they have no tasks left)
+            on_disk = _exported_task_partitions(out_dir, user_ids | set(live.values()))
+            project_ids.update(project_id for project_id, user_id in live.items()
+                               if user_id in user_ids and (user_id, project_id) not in on_disk) # e.g. new owner
+            _remove_partitions(out_dir, 'tasks', _task_keys(
+                (user_id, project_id) for user_id, project_id in on_disk if live.get(project_id) != user_id or project_id in project_ids))
+            written_projects = export_projects(conn, out_dir, user_ids, batch_rows) if user_ids else []
+            _remove_partitions(out_dir, 'projects', [(('user_id', user_id),) for user_id in user_ids if (user_id,) not in written_projects])
+            project_ids &= live.keys()
+            written = written_projects, export_tasks(conn, out_dir, project_ids, batch_rows) if project_ids else []
+    finally:
+        conn.close()
+    state['change_seq'][db_path] = seq
+    return written
+
+
+def export_all(out_dir, full=False, batch_rows=database.ARROW_BATCH_ROWS):
+    """Export the main database and every shard into out_dir; returns {db path: (project partitions, task partitions)}."""
+    state = None if full else _load_state(out_dir)
+    if state is None:
+        full = True
+        state = {'change_seq': {}}
+        for table_name in ('projects', 'tasks'):
+            shutil.rmtree(os.path.join(out_dir, table_name), ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+    results = {db_path: export_database(db_path, out_dir, state, full, batch_rows) for db_path in database.data_db_paths()}
+    state['day'] = date.today().isoformat()
+    _save_state(out_dir, state)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export projects and tasks as partitioned Parquet for BI tools.")
+    parser.add_argument('--db', help="Main database (default: PROJECT_TRACKER_DB or project_tracker.db)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help="Write or refresh the dataset")
+    export_parser.add_argument('out', help="Output directory")
+    export_parser.add_argument('--full', action='store_true', help="Rewrite every partition")
+    export_parser.add_argument('--batch-rows', type=int, default=database.ARROW_BATCH_ROWS, help="Rows per batch / row group")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if args.db:
+        database.DB_NAME = args.db
+    database.init_db()
+    for db_path, (projects, tasks) in export_all(args.out, args.full, args.batch_rows).items():
+        logger.info("%s: %d project partition(s), %d task partition(s) written", db_path, len(projects), len(tasks))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
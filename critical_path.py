@@ -0,0 +1,180 @@
+"""Critical path method (CPM) scheduling over task dependencies.
+
+Tasks have a duration in days (tasks.duration_days) and predecessors
+(task_dependencies). A forward pass in topological order gives each task's
+earliest start/finish, a backward pass its latest start/finish; total float is
+the slack between them, and tasks with zero float form the critical path. Both
+passes are O(V + E).
+
+Schedules are kept per project in data_cache (under its byte budget, dropped
+when the project is deleted, archived or restored). When only durations changed
+since the last computation, just the affected subgraph is recomputed: the
+forward pass for the changed tasks' descendants, and the backward pass for
+their ancestors (or for every task if the project finish moved). Any change to
+the tasks or links themselves rebuilds the schedule.
+"""
+import sys
+import threading
+from collections import deque
+from datetime import date, timedelta
+
+import pandas as pd
+
+import data_cache
+import database
+
+
+class CycleError(ValueError):
+    pass
+
+
+class ProjectSchedule:
+    def __init__(self, durations, edges):
+        self.durations = dict(durations) # task id -> days
+        self.edges = frozenset(edges) # (predecessor, successor)
+        self.successors = {task_id: [] for task_id in self.durations}
+        self.predecessors = {task_id: [] for task_id in self.durations}
+        for pred, succ in self.edges:
+            self.successors[pred].append(succ)
+            self.predecessors[succ].append(pred)
+        self.order = self._topological_order()
+        self.position = {task_id: i for i, task_id in enumerate(self.order)}
+        self.sinks = [task_id for task_id in self.order if not self.successors[task_id]]
+        self.early_start, self.early_finish, self.late_start, self.late_finish = {}, {}, {}, {}
+        self._forward(self.order)
+        self.finish = self._project_finish()
+        self._backward(reversed(self.order))
+        self.last_recomputed = len(self.order)
+
+    def _topological_order(self):
+        # Kahn's algorithm; ties broken by task id so the order is stable
+        indegree = {task_id: len(preds) for task_id, preds in self.predecessors.items()}
+        ready = deque(sorted(task_id for task_id, count in indegree.items() if count == 0))
+        order = []
+        while ready:
+            task_id = ready.popleft()
+            order.append(task_id)
+            for succ in sorted(self.successors[task_id]):
+                indegree[succ] -= 1
+                if indegree[succ] == 0:
+                    ready.append(succ)
+        if len(order) != len(indegree):
+            raise CycleError("Task dependencies contain a cycle")
+        return order
+
+    def _forward(self, task_ids):
+        for task_id in task_ids:
+            start = max((self.early_finish[p] for p in self.predecessors[task_id]), default=0)
+            self.early_start[task_id] = start
+            self.early_finish[task_id] = start + self.durations[task_id]
+
+    def _backward(self, task_ids):
+        for task_id in task_ids:
+            finish = min((self.late_start[s] for s in self.successors[task_id]), default=self.finish)
+            self.late_finish[task_id] = finish
+            self.late_start[task_id] = finish - self.durations[task_id]
+
+    def _project_finish(self):
+        return max((self.early_finish[task_id] for task_id in self.sinks), default=0)
+
+    def _reachable(self, task_ids, adjacency):
+        seen, stack = set(task_ids), list(task_ids)
+        while stack:
+            for neighbour in adjacency[stack.pop()]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        return seen
+
+    def update_durations(self, changes):
+        """Apply {task id: days} and recompute only the affected tasks; returns how many were recomputed."""
+        changes = {task_id: days for task_id, days in changes.items() if self.durations[task_id] != days}
+        if not changes:
+            return 0
+        self.durations.update(changes)
+        forward = sorted(self._reachable(changes, self.successors), key=self.position.__getitem__)
+        self._forward(forward)
+        finish = self._project_finish()
+        if finish != self.finish: # Every late date shifts with the project finish
+            self.finish = finish
+            backward = self.order
+        else: # Late dates depend only on successors, so only the changed tasks' ancestors move
+            backward = sorted(self._reachable(changes, self.predecessors), key=self.position.__getitem__)
+        self._backward(reversed(backward))
+        self.last_recomputed = len(set(forward) | set(backward))
+        return self.last_recomputed
+
+    @property
+    def nbytes(self):
+        # Rough footprint for data_cache's byte budget: the per-task dicts and lists plus their int values
+        containers = [self.durations, self.edges, self.successors, self.predecessors, self.order, self.position,
+                      self.early_start, self.early_finish, self.late_start, self.late_finish]
+        return sum(sys.getsizeof(c) for c in containers) + 28 * (8 * len(self.order) + 2 * len(self.edges))
+
+    def total_float(self, task_id):
+        return self.late_start[task_id] - self.early_start[task_id]
+
+    def critical_tasks(self):
+        return [task_id for task_id in sorted(self.order, key=lambda t: (self.early_start[t], self.position[t]))
+                if self.total_float(task_id) == 0]
+
+
+_schedules_lock = threading.RLock() # Cached schedules are shared by sessions and updated in place
+
+
+def get_schedule(project_id, archived=False, tasks=None):
+    tasks = tasks if tasks is not None else database.get_tasks_table(project_id, archived)
+    durations = {task_id: max(0, days if days is not None else 1)
+                 for task_id, days in zip(tasks['id'].to_pylist(), tasks['duration_days'].to_pylist())}
+    edges = frozenset(database.get_task_dependencies(project_id, archived))
+    db_path = database.archive_path() if archived else database.resolve_db_path()
+    build = lambda: ProjectSchedule(durations, edges)
+    with _schedules_lock:
+        schedule = data_cache.get_or_load('schedule', db_path, project_id, build)
+        if schedule.edges == edges and schedule.durations.keys() == durations.keys():
+            schedule.update_durations(durations) # Only durations changed: incremental
+        else:
+            data_cache.invalidate('schedule', db_path, project_id)
+            schedule = data_cache.get_or_load('schedule', db_path, project_id, build)
+        return schedule
+
+
+def schedule_frame(project_id, project_start=None, archived=False):
+    """CPM dates per task in early-start order, counting calendar days from project_start; returns (frame, schedule)."""
+    tasks = database.get_tasks_table(project_id, archived)
+    with _schedules_lock:
+        schedule = get_schedule(project_id, archived, tasks)
+        return _frame(schedule, tasks, pd.Timestamp(project_start or date.today())), schedule
+
+
+def _frame(schedule, tasks, start):
+    task_numbers = dict(zip(tasks['id'].to_pylist(), tasks['Task No.'].to_pylist()))
+    names = dict(zip(tasks['id'].to_pylist(), tasks['task_name'].to_pylist()))
+    due_dates = dict(zip(tasks['id'].to_pylist(), tasks['due_date'].to_pylist()))
+
+    rows = []
+    for task_id in sorted(schedule.order, key=lambda t: (schedule.early_start[t], schedule.position[t])):
+        early_start = start + timedelta(days=schedule.early_start[task_id])
+        # Inclusive last working day; zero-day milestones finish on their start day
+        early_finish = start + timedelta(days=max(schedule.early_finish[task_id] - 1, schedule.early_start[task_id]))
+        due = pd.Timestamp(due_dates[task_id]) if due_dates[task_id] is not None else None
+        rows.append({
+            'Task No.': task_numbers[task_id],
+            'id': task_id,
+            'task_name': names[task_id],
+            'duration_days': schedule.durations[task_id],
+            'predecessors': ', '.join(f"T{task_numbers[p]}" for p in sorted(schedule.predecessors[task_id])),
+            'early_start': early_start,
+            'early_finish': early_finish,
+            'late_start': start + timedelta(days=schedule.late_start[task_id]),
+            'total_float': schedule.total_float(task_id),
+            'critical': schedule.total_float(task_id) == 0,
+            'due_date': due,
+            'finishes_after_due': due is not None and early_finish > due,
+        })
+    return pd.DataFrame(rows)
+
+
+def critical_path_label(frame):
+    # e.g. "T1 → T4 → T7"
+    return ' → '.join(f"T{number}" for number in frame.loc[frame['critical'], 'Task No.'])
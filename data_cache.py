@@ -0,0 +1,170 @@
+"""Process-wide data cache shared by every Streamlit session.
+
+Project lists and task tables are read once per server process instead of once
+per session. Entries are keyed by (kind, database path, owner id) and tagged with
+the data version that was current when they were read; writes in database.py
+bump the version, so a stale entry is never served. Cached values are immutable
+(pyarrow Tables) or handed out as deep copies (DataFrames: project lists and EVM
+results, a few rows per user), so one session's edits never reach the cached
+value other sessions read. The exception is CPM schedules, which critical_path.py
+updates in place under its own lock. st.session_state only holds ids and view state.
+
+The cache holds at most PROJECT_TRACKER_CACHE_MB megabytes across all sessions,
+evicting the least recently used entries first, and reloads entries older than
+PROJECT_TRACKER_CACHE_TTL_S seconds (which also keeps "Is Overdue" current).
+
+    PROJECT_TRACKER_CACHE_MB=256      global byte budget (0 disables the cache)
+    PROJECT_TRACKER_CACHE_TTL_S=300   entry lifetime
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+MAX_BYTES = int(float(os.environ.get('PROJECT_TRACKER_CACHE_MB', '256')) * 1024 * 1024)
+TTL_S = float(os.environ.get('PROJECT_TRACKER_CACHE_TTL_S', '300'))
+
+
+class _Entry:
+    __slots__ = ('value', 'version', 'nbytes', 'loaded_at')
+
+    def __init__(self, value, version, nbytes):
+        self.value = value
+        self.version = version
+        self.nbytes = nbytes
+        self.loaded_at = time.monotonic()
+
+
+_lock = threading.Lock()
+_entries = OrderedDict() # key -> _Entry, least recently used first
+_versions = {} # key -> data version, bumped by invalidate(); only kept while the key is cached or loading
+_loading = {} # key -> loads in flight, whose results are checked against _versions before they're stored
+_bytes = 0
+_counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+
+def _nbytes(value):
+    if isinstance(value, dict): # e.g. several frames computed together
+        return sum(_nbytes(item) for item in value.values())
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return getattr(value, 'nbytes', 0) # pyarrow Tables; critical_path.ProjectSchedule estimates its own
+
+
+def _shared(value):
+    # Tables are immutable; a shallow DataFrame copy would share its column buffers with the cached frame
+    if isinstance(value, dict):
+        return {name: _shared(item) for name, item in value.items()}
+    return value.copy(deep=True) if isinstance(value, pd.DataFrame) else value
+
+
+def _drop(key):
+    global _bytes
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _bytes -= entry.nbytes
+
+
+def _forget_version(key):
+    # Without a cached entry or a load to check, the next load starts from version 0 with fresh data
+    if key not in _entries and key not in _loading:
+        _versions.pop(key, None)
+
+
+def get_or_load(kind, db_path, owner_id, loader):
+    """Return the cached value for (kind, db_path, owner_id), calling loader() on a miss."""
+    if MAX_BYTES <= 0:
+        return loader()
+    key = (kind, db_path, owner_id)
+    with _lock:
+        version = _versions.get(key, 0)
+        entry = _entries.get(key)
+        if entry is not None and entry.version == version:
+            if time.monotonic() - entry.loaded_at <= TTL_S:
+                _entries.move_to_end(key)
+                _counters['hits'] += 1
+                return _shared(entry.value)
+            _counters['expirations'] += 1
+        _drop(key)
+        _counters['misses'] += 1
+        _loading[key] = _loading.get(key, 0) + 1
+
+    try:
+        value = loader() # Outside the lock so a slow read doesn't block other sessions
+        nbytes = _nbytes(value)
+    except BaseException:
+        with _lock:
+            _finish_loading(key)
+        raise
+    with _lock:
+        _finish_loading(key)
+        # Only store if no write happened while loading, and the value fits at all
+        if _versions.get(key, 0) == version and nbytes <= MAX_BYTES:
+            _drop(key)
+            _store(key, _Entry(value, version, nbytes))
+        else:
+            _forget_version(key)
+    return _shared(value)
+
+
+def _finish_loading(key):
+    if _loading[key] > 1:
+        _loading[key] -= 1
+    else:
+        del _loading[key]
+
+
+def _store(key, entry):
+    global _bytes
+    _entries[key] = entry
+    _bytes += entry.nbytes
+    while _bytes > MAX_BYTES and _entries:
+        evicted = next(iter(_entries))
+        _drop(evicted)
+        _forget_version(evicted)
+        _counters['evictions'] += 1
+
+
+def invalidate(kind, db_path, owner_id):
+    with _lock:
+        key = (kind, db_path, owner_id)
+        _versions[key] = _versions.get(key, 0) + 1
+        _drop(key)
+        _forget_version(key) # Kept only if a load in flight must see the bump
+        _counters['invalidations'] += 1
+
+
+def clear():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+        for key in list(_versions):
+            _forget_version(key)
+
+
+def stats():
+    """Footprint and hit/miss counters for this server process."""
+    with _lock:
+        lookups = _counters['hits'] + _counters['misses']
+        by_kind = {}
+        for (kind, _, _), entry in _entries.items():
+            count, nbytes = by_kind.get(kind, (0, 0))
+            by_kind[kind] = (count + 1, nbytes + entry.nbytes)
+        return dict(_counters,
+                    entries=len(_entries),
+                    bytes=_bytes,
+                    max_bytes=MAX_BYTES,
+                    hit_rate=_counters['hits'] / lookups if lookups else 0.0,
+                    by_kind=by_kind)
+
+
+def largest_entries(top=10):
+    """The biggest cached values as (kind, db_path, owner_id, bytes, age_s), largest first."""
+    with _lock:
+        now = time.monotonic()
+        entries = [(kind, db_path, owner_id, entry.nbytes, now - entry.loaded_at)
+                   for (kind, db_path, owner_id), entry in _entries.items()]
+    return sorted(entries, key=lambda entry: entry[3], reverse=True)[:top]
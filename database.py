@@ -0,0 +1,841 @@
+import streamlit as st
+import sqlite3
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from datetime import datetime
+
+import data_cache
+import query_trace
+import write_queue
+
+# --- 1. Database Setup ---
+# Override with PROJECT_TRACKER_DB to point the app (or the benchmark suite) at another file.
+DB_NAME = os.environ.get('PROJECT_TRACKER_DB', 'project_tracker.db')
+
+# Storage mode. 'single' keeps everything in DB_NAME. 'sharded' keeps users and the
+# shard catalogue in DB_NAME and each tenant's projects/tasks in SHARD_DIR/<shard>.db,
+# so tenants don't serialize on one write lock. See sharding.py to split an existing file.
+STORAGE_MODE = os.environ.get('PROJECT_TRACKER_STORAGE', 'single')
+SHARD_DIR = os.environ.get('PROJECT_TRACKER_SHARD_DIR', 'shards')
+
+# Soft-delete mode: delete_project() only hides the project; a background job then
+# purges its tasks in small batches so a large delete never holds the write lock for long.
+SOFT_DELETE = os.environ.get('PROJECT_TRACKER_SOFT_DELETE') == '1'
+PURGE_BATCH_SIZE = int(os.environ.get('PROJECT_TRACKER_PURGE_BATCH_SIZE', '500'))
+PURGE_PAUSE_S = float(os.environ.get('PROJECT_TRACKER_PURGE_PAUSE_MS', '20')) / 1000
+
+# How often each server process checks change_log for writes made by other processes
+# (several Streamlit servers behind a load balancer share the database files).
+CHANGE_POLL_S = float(os.environ.get('PROJECT_TRACKER_CHANGE_POLL_MS', '500')) / 1000
+
+TASK_STATUS_OPTIONS = ['Not Started', 'In Progress', 'On Hold', 'Completed', 'Cancelled']
+TASK_PRIORITY_OPTIONS = ['Low', 'Medium', 'High']
+
+# Task frames use compact dtypes (categorical status/priority/assignee, int8 progress).
+# PROJECT_TRACKER_ARROW_DTYPES=1 also stores task names as pyarrow strings.
+ARROW_DTYPES = os.environ.get('PROJECT_TRACKER_ARROW_DTYPES') == '1'
+
+# CORRECTED: Added DEFAULT 'Medium' to task_priority
+TASKS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id INTEGER NOT NULL,
+        task_name TEXT NOT NULL,
+        status TEXT DEFAULT 'Not Started',
+        task_priority TEXT DEFAULT 'Medium', -- CORRECTED: Added default value
+        progress_percentage INTEGER DEFAULT 0,
+        assigned_to TEXT,
+        due_date DATE,
+        FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+    )
+'''
+
+# Change feed for the shared data cache. Triggers keep one row per changed list
+# (kind, owner_id) and replace it on every write, so the table stays small and seq
+# orders the changes; sync_cache() reads the rows newer than the last seq it saw.
+CHANGE_LOG_SQL = [
+    '''CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        owner_id INTEGER NOT NULL,
+        UNIQUE (kind, owner_id)
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS projects_change_insert AFTER INSERT ON projects BEGIN
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('projects', NEW.user_id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS projects_change_update AFTER UPDATE ON projects BEGIN
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('projects', OLD.user_id);
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('projects', NEW.user_id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS projects_change_delete AFTER DELETE ON projects BEGIN
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('projects', OLD.user_id);
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('tasks', OLD.id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_change_insert AFTER INSERT ON tasks BEGIN
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('tasks', NEW.project_id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_change_update AFTER UPDATE ON tasks BEGIN
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('tasks', OLD.project_id);
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('tasks', NEW.project_id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS tasks_change_delete AFTER DELETE ON tasks BEGIN
+        INSERT OR REPLACE INTO change_log (kind, owner_id) VALUES ('tasks', OLD.project_id);
+    END''',
+]
+
+def init_db():
+    conn = sqlite3.connect(DB_NAME)
+    create_schema(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS shards (
+            user_id INTEGER PRIMARY KEY,
+            shard_name TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_shards_shard_name ON shards (shard_name)") # data_db_paths()
+    conn.commit()
+    conn.close()
+    if SOFT_DELETE: # Resume purges interrupted by a restart
+        schedule_purge(DB_NAME)
+        conn = sqlite3.connect(DB_NAME)
+        for (shard_name,) in conn.execute("SELECT DISTINCT shard_name FROM shards").fetchall():
+            schedule_purge(shard_path(shard_name))
+        conn.close()
+
+def create_schema(conn):
+    # Tables shared by the main database and every shard
+    c = conn.cursor()
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            project_name TEXT NOT NULL,
+            description TEXT,
+            start_date DATE,
+            end_date DATE,
+            budget REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    c.execute(TASKS_TABLE_SQL.format(table='tasks'))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_project_id ON tasks (project_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)") # Range scans by the reminder scheduler
+    add_missing_columns(conn, 'projects', {'deleted_at': 'TIMESTAMP'}) # Set by soft deletes
+    # Checked by query_plans.py: per-user project lists and dashboard aggregations, and the purge job's lookup
+    c.execute("CREATE INDEX IF NOT EXISTS idx_projects_user_id ON projects (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_projects_deleted_at ON projects (deleted_at) WHERE deleted_at IS NOT NULL")
+    if not tasks_cascade_on_delete(conn):
+        rebuild_tasks_table(conn)
+    add_missing_columns(conn, 'tasks', {
+        'duration_days': 'INTEGER DEFAULT 1', # Used by the critical path (critical_path.py)
+        'actual_cost': 'REAL', # Cost to date, for earned value (evm.py); NULL when not recorded
+    })
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS task_dependencies (
+            predecessor_id INTEGER NOT NULL,
+            successor_id INTEGER NOT NULL,
+            PRIMARY KEY (predecessor_id, successor_id),
+            FOREIGN KEY (predecessor_id) REFERENCES tasks (id) ON DELETE CASCADE,
+            FOREIGN KEY (successor_id) REFERENCES tasks (id) ON DELETE CASCADE
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_task_dependencies_successor ON task_dependencies (successor_id)")
+    # Daily progress history (snapshots.py): a row only when a task's progress changed; day = days since 1970-01-01
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS progress_snapshots (
+            task_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            progress INTEGER NOT NULL,
+            PRIMARY KEY (task_id, day),
+            FOREIGN KEY (task_id) REFERENCES tasks (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    for statement in CHANGE_LOG_SQL: # After any rebuild, which drops the tasks triggers
+        c.execute(statement)
+    conn.commit()
+
+def add_missing_columns(conn, table, columns):
+    # Upgrades databases created by older versions; columns maps name -> declaration
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, declaration in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+def tasks_cascade_on_delete(conn):
+    foreign_keys = conn.execute("PRAGMA foreign_key_list(tasks)").fetchall()
+    # Row layout: (id, seq, table, from, to, on_update, on_delete, match)
+    return any(fk[2] == 'projects' and fk[6] == 'CASCADE' for fk in foreign_keys)
+
+def rebuild_tasks_table(conn):
+    # SQLite can't alter a foreign key, so copy tasks into a table declared with ON DELETE CASCADE
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        with conn:
+            old_columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+            conn.execute("DROP TABLE IF EXISTS tasks_rebuild")
+            conn.execute(TASKS_TABLE_SQL.format(table='tasks_rebuild'))
+            new_columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks_rebuild)")]
+            # Columns added later by ALTER TABLE are not in TASKS_TABLE_SQL; carry them over too
+            for row in conn.execute("PRAGMA table_info(tasks)").fetchall():
+                if row[1] not in new_columns:
+                    conn.execute(f"ALTER TABLE tasks_rebuild ADD COLUMN {row[1]} {row[2]}" + (f" DEFAULT {row[4]}" if row[4] is not None else ""))
+                    new_columns.append(row[1])
+            columns = ', '.join(c for c in old_columns if c in new_columns)
+            conn.execute(f"INSERT INTO tasks_rebuild ({columns}) SELECT {columns} FROM tasks")
+            conn.execute("DROP TABLE tasks")
+            conn.execute("ALTER TABLE tasks_rebuild RENAME TO tasks")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_project_id ON tasks (project_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+# --- Shard routing ---
+# The tenant is per thread because Streamlit runs each session's rerun in its own thread.
+_tenant = threading.local()
+_shard_lock = threading.Lock()
+_shard_paths = {} # user_id -> shard file, filled from the catalogue on first use
+_ready_shards = set() # shard files whose schema exists
+
+def set_current_tenant(user_id):
+    _tenant.user_id = user_id
+
+def get_current_tenant():
+    return getattr(_tenant, 'user_id', None)
+
+def shard_path(shard_name):
+    return os.path.join(SHARD_DIR, f"{shard_name}.db")
+
+def assign_shard(user_id, shard_name=None):
+    # Map a user to a shard (default: one per user; pass an organisation name to share one)
+    shard_name = shard_name or f"user_{user_id}"
+    write_queue.execute(DB_NAME, lambda conn: conn.execute("INSERT OR REPLACE INTO shards (user_id, shard_name) VALUES (?, ?)",
+                                                           (user_id, shard_name)))
+    with _shard_lock:
+        _shard_paths.pop(user_id, None)
+    return shard_path(shard_name)
+
+def ensure_shard(path):
+    if path in _ready_shards:
+        return
+    with _shard_lock:
+        if path not in _ready_shards:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            conn = sqlite3.connect(path)
+            create_schema(conn)
+            conn.close()
+            _ready_shards.add(path)
+
+def copy_user_to_shard(user_id, path):
+    # Keeps projects.user_id -> users.id valid inside the shard; passwords stay in the catalogue only
+    conn = get_catalog_connection()
+    row = conn.execute("SELECT id, username FROM users WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    if row:
+        write_queue.execute(path, lambda shard_conn: shard_conn.execute("INSERT OR IGNORE INTO users (id, username, password) VALUES (?, ?, '')", row))
+
+def resolve_db_path(user_id=None):
+    """Database file holding the projects and tasks of user_id (default: the current tenant)."""
+    if STORAGE_MODE != 'sharded':
+        return DB_NAME
+    if user_id is None:
+        user_id = get_current_tenant()
+    if user_id is None:
+        return DB_NAME
+    path = _shard_paths.get(user_id)
+    if path is None:
+        conn = get_catalog_connection()
+        row = conn.execute("SELECT shard_name FROM shards WHERE user_id = ?", (user_id,)).fetchone()
+        conn.close()
+        path = shard_path(row[0]) if row else assign_shard(user_id)
+        ensure_shard(path)
+        copy_user_to_shard(user_id, path)
+        with _shard_lock:
+            _shard_paths[user_id] = path
+    return path
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, factory=query_trace.connection_factory())
+    conn.execute("PRAGMA foreign_keys = ON") # Off by default in SQLite; needed for ON DELETE CASCADE
+    return conn
+
+def get_catalog_connection():
+    # Users and the shard catalogue always live in DB_NAME
+    return connect(DB_NAME)
+
+def get_db_connection(user_id=None):
+    return connect(resolve_db_path(user_id))
+
+# Session reads use read-only connections; session writes go through the database's
+# single writer thread (write_queue.py), which group-commits them.
+def connect_readonly(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, factory=query_trace.connection_factory())
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def get_read_connection(user_id=None):
+    return connect_readonly(resolve_db_path(user_id))
+
+def data_db_paths():
+    # The main database plus every shard in sharded storage mode
+    paths = [DB_NAME]
+    conn = get_catalog_connection()
+    try:
+        paths += [shard_path(name) for (name,) in conn.execute("SELECT DISTINCT shard_name FROM shards ORDER BY shard_name")]
+    finally:
+        conn.close()
+    return paths
+
+def add_user(username, password):
+    hashed_password = hash_password(password)
+    try:
+        return write_queue.execute(DB_NAME, lambda conn: conn.execute(
+            "INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password)).lastrowid)
+    except sqlite3.IntegrityError:
+        st.error("Username already exists. Please choose a different one.")
+        return None
+
+def verify_user(username, password):
+    conn = connect_readonly(DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT id, password FROM users WHERE username = ?", (username,))
+    user_data = c.fetchone()
+    conn.close()
+    if user_data:
+        user_id, stored_password = user_data
+        if stored_password == hash_password(password):
+            return user_id
+    return None
+
+def add_project(user_id, project_name, description, start_date, end_date, budget):
+    db_path = resolve_db_path(user_id)
+    try:
+        write_queue.execute(db_path, lambda conn: conn.execute(
+            "INSERT INTO projects (user_id, project_name, description, start_date, end_date, budget) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, project_name, description, start_date, end_date, budget)))
+        invalidate_cache(db_path, user_ids=[user_id])
+        return True
+    except Exception as e:
+        st.error(f"Error adding project: {e}")
+        return False
+
+def get_projects_by_user(user_id):
+    # Shared by all sessions until the user's projects change (see data_cache.py)
+    db_path = resolve_db_path(user_id)
+    sync_cache(db_path)
+    return data_cache.get_or_load('projects', db_path, user_id, lambda: _load_projects(user_id))
+
+def _load_projects(user_id):
+    conn = get_read_connection(user_id)
+    df = pd.read_sql_query("SELECT id, project_name, description, start_date, end_date, budget FROM projects WHERE user_id = ? AND deleted_at IS NULL ORDER BY id ASC", conn, params=(user_id,))
+    conn.close()
+    if not df.empty:
+        # Add a user-specific sequential ID
+        df['User Project ID'] = range(1, len(df) + 1)
+        # Reorder columns to put the new ID first (optional)
+        df = df[['User Project ID', 'id', 'project_name', 'description', 'start_date', 'end_date', 'budget']]
+    return df
+
+def update_project(project_id, project_name, description, start_date, end_date, budget):
+    db_path = resolve_db_path()
+
+    def update(conn):
+        conn.execute("UPDATE projects SET project_name=?, description=?, start_date=?, end_date=?, budget=? WHERE id=?",
+                     (project_name, description, start_date, end_date, budget, project_id))
+        return _project_owners(conn, [project_id])
+    try:
+        invalidate_cache(db_path, user_ids=write_queue.execute(db_path, update))
+        return True
+    except Exception as e:
+        st.error(f"Error updating project: {e}")
+        return False
+
+def delete_project(project_id):
+    db_path = resolve_db_path()
+
+    def delete(conn):
+        owners = _project_owners(conn, [project_id])
+        if SOFT_DELETE:
+            # Hidden immediately; tasks and the project row are removed by the purge job
+            conn.execute("UPDATE projects SET deleted_at = CURRENT_TIMESTAMP WHERE id = ?", (project_id,))
+        else:
+            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,)) # Tasks go with it (ON DELETE CASCADE)
+        return owners
+    try:
+        owners = write_queue.execute(db_path, delete)
+    except Exception as e:
+        st.error(f"Error deleting project: {e}")
+        return False
+    invalidate_cache(db_path, user_ids=owners, project_ids=[project_id], removed=True)
+    if SOFT_DELETE:
+        schedule_purge(db_path)
+    return True
+
+# --- Cache invalidation (see data_cache.py) ---
+def invalidate_cache(db_path, user_ids=(), project_ids=(), removed=False):
+    # Project lists are cached per user, task tables per project. This covers this process's
+    # own writes immediately; other processes' writes arrive through sync_cache().
+    # removed: project_ids left db_path, so also drop their CPM schedules, which otherwise outlive edits
+    for user_id in user_ids:
+        data_cache.invalidate('projects', db_path, user_id)
+    for project_id in project_ids:
+        data_cache.invalidate('tasks', db_path, project_id)
+        if removed:
+            data_cache.invalidate('schedule', db_path, project_id)
+
+_change_seqs = {} # db path -> (last change_log seq seen, monotonic time of the poll)
+_change_locks = {} # db path -> lock held while that database's change_log is polled
+_change_locks_lock = threading.Lock()
+
+def _change_lock(db_path):
+    with _change_locks_lock:
+        lock = _change_locks.get(db_path)
+        if lock is None:
+            lock = _change_locks[db_path] = threading.Lock()
+        return lock
+
+def sync_cache(db_path):
+    """Drop cache entries for lists other processes changed, polling at most every CHANGE_POLL_S."""
+    last_seq, polled_at = _change_seqs.get(db_path, (None, 0.0))
+    if time.monotonic() - polled_at < CHANGE_POLL_S:
+        return
+    lock = _change_lock(db_path)
+    if not lock.acquire(blocking=False):
+        return # Another session thread is polling this database right now
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            if last_seq is None: # First read of this database: nothing is cached from it yet
+                rows = []
+                last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+            else:
+                rows = conn.execute("SELECT seq, kind, owner_id FROM change_log WHERE seq > ? ORDER BY seq", (last_seq,)).fetchall()
+        finally:
+            conn.close()
+        for seq, kind, owner_id in rows:
+            data_cache.invalidate(kind, db_path, owner_id)
+            last_seq = seq
+        _change_seqs[db_path] = (last_seq, time.monotonic())
+    finally:
+        lock.release()
+
+def data_version(db_path=None, user_id=None, project_id=None):
+    """Latest change_log seq: moves on every project/task write, from any process.
+
+    With user_id, only writes to that user's project list or their projects' tasks count;
+    with project_id, only writes to that project's tasks or its owner's project list.
+    """
+    conn = connect_readonly(db_path or resolve_db_path())
+    try:
+        if user_id is not None:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM change_log WHERE (kind = 'projects' AND owner_id = ?) "
+                "OR (kind = 'tasks' AND owner_id IN (SELECT id FROM projects WHERE user_id = ?))", (user_id, user_id)).fetchone()[0]
+        if project_id is not None:
+            return conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM change_log WHERE (kind = 'tasks' AND owner_id = ?) "
+                "OR (kind = 'projects' AND owner_id = (SELECT user_id FROM projects WHERE id = ?))", (project_id, project_id)).fetchone()[0]
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    finally:
+        conn.close()
+
+def _project_owners(conn, project_ids):
+    placeholders = ','.join('?' * len(project_ids))
+    # De-duplicated here rather than with DISTINCT, which would need a temporary B-tree
+    return sorted({row[0] for row in conn.execute(f"SELECT user_id FROM projects WHERE id IN ({placeholders})", list(project_ids))})
+
+def _task_projects(conn, task_ids):
+    placeholders = ','.join('?' * len(task_ids))
+    return sorted({row[0] for row in conn.execute(f"SELECT project_id FROM tasks WHERE id IN ({placeholders})", list(task_ids))})
+
+# --- Deferred purge of soft-deleted projects ---
+_purge_queue = queue.Queue()
+_purge_thread = None
+_purge_thread_lock = threading.Lock()
+
+def schedule_purge(db_path):
+    global _purge_thread
+    _purge_queue.put(db_path)
+    with _purge_thread_lock:
+        if _purge_thread is None or not _purge_thread.is_alive():
+            _purge_thread = threading.Thread(target=_purge_worker, name='project-purge', daemon=True)
+            _purge_thread.start()
+
+def _purge_worker():
+    while True:
+        db_path = _purge_queue.get()
+        if not os.path.exists(db_path):
+            continue
+        try:
+            purge_deleted_projects(db_path)
+        except Exception as e:
+            logging.getLogger('project_tracker.purge').exception("Purge of %s failed: %s", db_path, e)
+
+def purge_deleted_projects(db_path, batch_size=None, pause_s=None):
+    """Delete soft-deleted projects in db_path, a batch of tasks per transaction. Returns tasks purged."""
+    batch_size = batch_size or PURGE_BATCH_SIZE
+    pause_s = PURGE_PAUSE_S if pause_s is None else pause_s
+    purged = 0
+    conn = connect_readonly(db_path)
+    try:
+        project_ids = [row[0] for row in conn.execute("SELECT id FROM projects WHERE deleted_at IS NOT NULL")]
+    finally:
+        conn.close()
+    for project_id in project_ids:
+        while True: # One writer-queue operation per batch, so session writes queue behind a batch, not the whole purge
+            deleted = write_queue.execute(db_path, lambda conn: conn.execute(
+                "DELETE FROM tasks WHERE id IN (SELECT id FROM tasks WHERE project_id = ? LIMIT ?)", (project_id, batch_size)).rowcount)
+            purged += deleted
+            if deleted < batch_size:
+                break
+            time.sleep(pause_s) # Let interactive writes run between batches
+        write_queue.execute(db_path, lambda conn: conn.execute("DELETE FROM projects WHERE id = ? AND deleted_at IS NOT NULL", (project_id,)))
+    return purged
+
+def add_task(project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days=1, actual_cost=None):
+    db_path = resolve_db_path()
+    try:
+        write_queue.execute(db_path, lambda conn: conn.execute(
+            "INSERT INTO tasks (project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, actual_cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, actual_cost)))
+        invalidate_cache(db_path, project_ids=[project_id])
+        return True
+    except Exception as e:
+        st.error(f"Error adding task: {e}")
+        return False
+
+# --- Arrow read path ---
+# sqlite3 has no Arrow interface, so rows are fetched in batches and transposed straight
+# into Arrow record batches; derived columns are computed with Arrow compute kernels.
+# The resulting table goes to st.dataframe and the CSV/Parquet exports without pandas.
+ARROW_BATCH_ROWS = 10000
+TASK_ARROW_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('task_name', pa.string()),
+    ('status', pa.string()),
+    ('task_priority', pa.string()),
+    ('progress_percentage', pa.int8()),
+    ('assigned_to', pa.string()),
+    ('due_date', pa.string()),
+    ('duration_days', pa.int32()),
+    ('actual_cost', pa.float64()),
+])
+
+def fetch_record_batches(conn, sql, params, schema, batch_rows=ARROW_BATCH_ROWS):
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+def get_tasks_table(project_id, archived=False):
+    """A project's tasks as a pyarrow Table with the same columns as get_tasks_by_project()."""
+    db_path = archive_path() if archived else resolve_db_path()
+    # Shared by all sessions until the project's tasks change (see data_cache.py)
+    sync_cache(db_path)
+    return data_cache.get_or_load('tasks', db_path, project_id, lambda: _load_tasks_table(project_id, archived))
+
+def _load_tasks_table(project_id, archived):
+    conn = get_archive_connection() if archived else get_read_connection()
+    try:
+        batches = list(fetch_record_batches(
+            conn, "SELECT id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, actual_cost FROM tasks WHERE project_id = ? ORDER BY id ASC",
+            (project_id,), TASK_ARROW_SCHEMA))
+    finally:
+        conn.close()
+    return derive_task_columns(pa.Table.from_batches(batches, schema=TASK_ARROW_SCHEMA))
+
+def derive_task_columns(table, first_task_no=1):
+    """Typed dates, dictionary-encoded labels, 'Is Overdue' and 'Task No.' for one project's tasks in id order.
+
+    first_task_no continues the numbering when a project's tasks arrive in several pieces (bi_export.py).
+    """
+    # Unparseable dates become null instead of failing the whole read
+    due_date = pc.strptime(table['due_date'], format='%Y-%m-%d', unit='s', error_is_null=True).cast(pa.date32())
+    today = pa.scalar(datetime.now().date(), type=pa.date32())
+    is_overdue = pc.and_(pc.less(due_date, today), pc.invert(pc.is_in(table['status'], value_set=pa.array(['Completed', 'Cancelled']))))
+    table = table.set_column(table.schema.get_field_index('due_date'), 'due_date', due_date)
+    for column in ('status', 'task_priority', 'assigned_to'): # Few distinct values: dictionary-encoded
+        table = table.set_column(table.schema.get_field_index(column), column, pc.dictionary_encode(table[column]))
+    table = table.append_column('Is Overdue', pc.fill_null(is_overdue, False))
+    # Add a project-specific sequential ID for tasks
+    return table.add_column(0, 'Task No.', pa.array(range(first_task_no, first_task_no + table.num_rows), type=pa.int64()))
+
+def get_tasks_by_project(project_id, archived=False):
+    return tasks_table_to_frame(get_tasks_table(project_id, archived))
+
+def tasks_table_to_frame(table):
+    # Dictionary columns arrive as categoricals and dates as datetime64; compact_task_frame() fixes category order
+    df = table.to_pandas(date_as_object=False)
+    if not df.empty:
+        df = compact_task_frame(df)
+    return df
+
+def _categories(values, known):
+    # Known options first (in workflow order), then any unexpected values already stored
+    return known + sorted(set(values.dropna()) - set(known))
+
+def compact_task_frame(df):
+    """Convert a tasks frame to compact dtypes, in place where possible; returns the frame."""
+    df['status'] = df['status'].astype(pd.CategoricalDtype(_categories(df['status'], TASK_STATUS_OPTIONS)))
+    df['task_priority'] = df['task_priority'].astype(pd.CategoricalDtype(_categories(df['task_priority'], TASK_PRIORITY_OPTIONS)))
+    df['assigned_to'] = df['assigned_to'].astype('category') # Few distinct names: dictionary-encoded
+    df['progress_percentage'] = pd.to_numeric(df['progress_percentage'], errors='coerce').astype('Int8') # 0-100
+    if ARROW_DTYPES:
+        df['task_name'] = df['task_name'].astype('string[pyarrow]')
+    return df
+
+# CORRECTED: Added task_priority parameter to update_task
+UNCHANGED = object() # update_task: leave the column as it is
+
+def update_task(task_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days=None, actual_cost=UNCHANGED):
+    db_path = resolve_db_path()
+
+    def update(conn):
+        # CORRECTED: Included task_priority in the UPDATE statement
+        if actual_cost is UNCHANGED:
+            conn.execute("UPDATE tasks SET task_name=?, status=?, task_priority=?, progress_percentage=?, assigned_to=?, due_date=?, "
+                         "duration_days=COALESCE(?, duration_days) WHERE id=?",
+                         (task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, task_id))
+        else: # None clears a recorded cost
+            conn.execute("UPDATE tasks SET task_name=?, status=?, task_priority=?, progress_percentage=?, assigned_to=?, due_date=?, "
+                         "duration_days=COALESCE(?, duration_days), actual_cost=? WHERE id=?",
+                         (task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, actual_cost, task_id))
+        return _task_projects(conn, [task_id])
+    try:
+        invalidate_cache(db_path, project_ids=write_queue.execute(db_path, update))
+        return True
+    except Exception as e:
+        st.error(f"Error updating task: {e}")
+        return False
+
+def validate_task_values(task_name, status, task_priority, progress_percentage):
+    errors = []
+    if not task_name or not str(task_name).strip():
+        errors.append("task name is required")
+    if status not in TASK_STATUS_OPTIONS:
+        errors.append(f"invalid status {status!r}")
+    if task_priority not in TASK_PRIORITY_OPTIONS:
+        errors.append(f"invalid priority {task_priority!r}")
+    try:
+        progress_ok = float(progress_percentage).is_integer() and 0 <= float(progress_percentage) <= 100
+    except (TypeError, ValueError):
+        progress_ok = False
+    if not progress_ok:
+        errors.append(f"progress must be a whole number from 0 to 100 (got {progress_percentage!r})")
+    return errors
+
+def update_tasks_bulk(task_rows):
+    """Write many edited tasks in one transaction.
+
+    task_rows: dicts with id, task_name, status, task_priority, progress_percentage,
+    assigned_to and due_date (only the rows that changed). All rows are validated
+    first; nothing is written if any row is invalid.
+    """
+    errors = []
+    for row in task_rows:
+        errors += [f"Task {row['id']}: {e}" for e in validate_task_values(row['task_name'], row['status'], row['task_priority'], row['progress_percentage'])]
+    if errors:
+        for error in errors:
+            st.error(error)
+        return False
+    params = [(row['task_name'].strip(), row['status'], row['task_priority'], int(row['progress_percentage']),
+               row['assigned_to'], row['due_date'], int(row['id'])) for row in task_rows]
+    db_path = resolve_db_path()
+
+    def update(conn): # One operation: all rows are written, or none if any fails
+        conn.executemany("UPDATE tasks SET task_name=?, status=?, task_priority=?, progress_percentage=?, assigned_to=?, due_date=? WHERE id=?", params)
+        return _task_projects(conn, [row[-1] for row in params])
+    try:
+        invalidate_cache(db_path, project_ids=write_queue.execute(db_path, update))
+        return True
+    except Exception as e:
+        st.error(f"Error updating tasks: {e}")
+        return False
+
+def delete_task(task_id):
+    db_path = resolve_db_path()
+
+    def delete(conn):
+        project_ids = _task_projects(conn, [task_id])
+        conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        return project_ids
+    try:
+        invalidate_cache(db_path, project_ids=write_queue.execute(db_path, delete))
+        return True
+    except Exception as e:
+        st.error(f"Error deleting task: {e}")
+        return False
+
+# --- Task dependencies (scheduled by critical_path.py) ---
+def get_task_dependencies(project_id, archived=False):
+    conn = get_archive_connection() if archived else get_read_connection()
+    rows = conn.execute("SELECT d.predecessor_id, d.successor_id FROM task_dependencies d JOIN tasks t ON t.id = d.successor_id "
+                        "WHERE t.project_id = ? ORDER BY d.predecessor_id, d.successor_id", (project_id,)).fetchall()
+    conn.close()
+    return rows
+
+def add_task_dependency(predecessor_id, successor_id):
+    """Make successor_id wait for predecessor_id; refuses links across projects and cycles."""
+    if predecessor_id == successor_id:
+        st.error("A task cannot depend on itself.")
+        return False
+
+    def add(conn):
+        # Checked inside the write, so a concurrent edit can't slip a cycle in; returns the reason it was refused
+        projects = dict(conn.execute("SELECT id, project_id FROM tasks WHERE id IN (?, ?)", (predecessor_id, successor_id)).fetchall())
+        if len(projects) != 2 or projects[predecessor_id] != projects[successor_id]:
+            return "Dependencies must link two tasks of the same project."
+        edges = conn.execute("SELECT d.predecessor_id, d.successor_id FROM task_dependencies d JOIN tasks t ON t.id = d.successor_id "
+                             "WHERE t.project_id = ?", (projects[successor_id],)).fetchall()
+        if creates_cycle(edges, predecessor_id, successor_id):
+            return "That dependency would create a cycle."
+        conn.execute("INSERT OR IGNORE INTO task_dependencies (predecessor_id, successor_id) VALUES (?, ?)", (predecessor_id, successor_id))
+        return None
+    try:
+        refused = write_queue.execute(resolve_db_path(), add)
+    except Exception as e:
+        st.error(f"Error adding dependency: {e}")
+        return False
+    if refused:
+        st.error(refused)
+        return False
+    return True
+
+def remove_task_dependency(predecessor_id, successor_id):
+    try:
+        write_queue.execute(resolve_db_path(), lambda conn: conn.execute(
+            "DELETE FROM task_dependencies WHERE predecessor_id = ? AND successor_id = ?", (predecessor_id, successor_id)))
+        return True
+    except Exception as e:
+        st.error(f"Error removing dependency: {e}")
+        return False
+
+def creates_cycle(edges, predecessor_id, successor_id):
+    # Adding predecessor -> successor closes a cycle if predecessor is already reachable from successor
+    successors = {}
+    for pred, succ in edges:
+        successors.setdefault(pred, []).append(succ)
+    stack, seen = [successor_id], set()
+    while stack:
+        node = stack.pop()
+        if node == predecessor_id:
+            return True
+        if node not in seen:
+            seen.add(node)
+            stack.extend(successors.get(node, ()))
+    return False
+
+# --- Archive tier ---
+# Archived projects and their tasks move to a sibling <db>_archive.db with the same schema
+# (plus projects.archived_at), so the hot tables only hold active work. Ids are kept, and
+# AUTOINCREMENT never reuses them, so restoring puts rows back exactly as they were.
+def archive_path(db_path=None):
+    root, ext = os.path.splitext(db_path or resolve_db_path())
+    return f"{root}_archive{ext or '.db'}"
+
+def ensure_archive(path):
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    add_missing_columns(conn, 'projects', {'archived_at': 'TIMESTAMP'})
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_projects_user_archived_at ON projects (user_id, archived_at)") # search_archived_projects()
+    conn.commit()
+    conn.close()
+
+def get_archive_connection():
+    path = archive_path()
+    ensure_archive(path)
+    return connect(path)
+
+def _common_columns(conn, table, source, target):
+    source_columns = [row[1] for row in conn.execute(f"PRAGMA {source}.table_info({table})")]
+    target_columns = {row[1] for row in conn.execute(f"PRAGMA {target}.table_info({table})")}
+    return ', '.join(c for c in source_columns if c in target_columns)
+
+def _move_project(project_id, source, target):
+    # Copies the project, its owner row and its tasks from one schema to the other, then deletes the source (tasks cascade)
+    db_path = resolve_db_path()
+    path = archive_path(db_path)
+    ensure_archive(path)
+
+    def move(conn): # Runs on the active database's writer, with the archive attached
+        owner = conn.execute(f"SELECT user_id FROM {source}.projects WHERE id = ?", (project_id,)).fetchone()
+        if owner is None:
+            return None
+        conn.execute(f"INSERT OR IGNORE INTO {target}.users (id, username, password) "
+                     f"SELECT u.id, u.username, '' FROM {source}.users u JOIN {source}.projects p ON p.user_id = u.id WHERE p.id = ?", (project_id,))
+        project_columns = _common_columns(conn, 'projects', source, target)
+        archived_at = ", archived_at" if target == 'archive' else ""
+        conn.execute(f"INSERT INTO {target}.projects ({project_columns}{archived_at}) "
+                     f"SELECT {project_columns}{', CURRENT_TIMESTAMP' if archived_at else ''} FROM {source}.projects WHERE id = ?", (project_id,))
+        task_columns = _common_columns(conn, 'tasks', source, target)
+        conn.execute(f"INSERT INTO {target}.tasks ({task_columns}) SELECT {task_columns} FROM {source}.tasks WHERE project_id = ?", (project_id,))
+        conn.execute(f"INSERT INTO {target}.task_dependencies (predecessor_id, successor_id) SELECT d.predecessor_id, d.successor_id "
+                     f"FROM {source}.task_dependencies d JOIN {source}.tasks t ON t.id = d.successor_id WHERE t.project_id = ?", (project_id,))
+        conn.execute(f"INSERT INTO {target}.progress_snapshots (task_id, day, progress) SELECT s.task_id, s.day, s.progress "
+                     f"FROM {source}.progress_snapshots s JOIN {source}.tasks t ON t.id = s.task_id WHERE t.project_id = ?", (project_id,))
+        conn.execute(f"DELETE FROM {source}.projects WHERE id = ?", (project_id,))
+        return owner[0]
+    try:
+        owner = write_queue.execute(db_path, move, attach={'archive': path})
+    except Exception as e:
+        st.error(f"Error moving project between the active and archive databases: {e}")
+        return False
+    if owner is None:
+        return False
+    for changed_path in (db_path, path): # The project left one database's lists and joined the other's
+        invalidate_cache(changed_path, user_ids=[owner], project_ids=[project_id], removed=True)
+    return True
+
+def archive_project(project_id):
+    return _move_project(project_id, 'main', 'archive')
+
+def restore_project(project_id):
+    return _move_project(project_id, 'archive', 'main')
+
+def get_archivable_projects(user_id):
+    # Finished work: every task completed/cancelled, or the end date has passed
+    conn = get_db_connection(user_id)
+    df = pd.read_sql_query("""
+        SELECT p.id, p.project_name, p.end_date, COUNT(t.id) AS task_count,
+               SUM(CASE WHEN t.status IN ('Completed', 'Cancelled') THEN 1 ELSE 0 END) AS closed_tasks
+        FROM projects p LEFT JOIN tasks t ON t.project_id = p.id
+        WHERE p.user_id = ? AND p.deleted_at IS NULL
+        GROUP BY p.id
+        HAVING (COUNT(t.id) > 0 AND closed_tasks = COUNT(t.id)) OR p.end_date < date('now', 'localtime')
+        ORDER BY p.id""", conn, params=(user_id,))
+    conn.close()
+    return df
+
+def search_archived_projects(user_id, search_term=''):
+    conn = get_archive_connection()
+    pattern = f"%{search_term}%"
+    df = pd.read_sql_query("""
+        SELECT p.id, p.project_name, p.description, p.start_date, p.end_date, p.budget, p.archived_at,
+               (SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id) AS task_count
+        FROM projects p
+        WHERE p.user_id = ? AND (p.project_name LIKE ? OR p.description LIKE ?)
+        ORDER BY p.archived_at DESC, p.id DESC""", conn, params=(user_id, pattern, pattern))
+    conn.close()
+    return df
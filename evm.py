@@ -0,0 +1,115 @@
+"""Earned value management (EVM) across a user's portfolio.
+
+Each task is allotted a share of its project's budget (its budget at completion,
+BAC) in proportion to duration_days. The task is planned to run linearly over
+the duration_days up to its due date, so planned value (PV) is BAC times the
+elapsed share of that window; earned value (EV) is BAC times progress, and
+actual cost (AC) is tasks.actual_cost. CPI only counts tasks with a recorded
+cost. From those:
+
+    CPI = EV / AC    SPI = EV / PV    EAC = BAC / CPI (BAC while no cost is recorded)
+
+All of a user's tasks are read with one query (analytics.py) and the metrics
+are computed column-wise with pandas/NumPy, then rolled up per project and for
+the portfolio. Results are cached per day and per version of the owner's data
+(the latest change_log seq for their projects and tasks) in the shared data
+cache, so the dashboard and reports don't recompute them per rerun, and other
+tenants' writes don't invalidate them.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import data_cache
+import database
+
+# Columns produced by task_metrics() and summed by the rollups. EV_costed is EV
+# counted only for tasks with a recorded cost, so CPI compares like with like.
+VALUE_COLUMNS = ['BAC', 'PV', 'EV', 'EV_costed', 'AC']
+
+
+def _ratio(numerator, denominator):
+    # NaN where the denominator is zero/missing (e.g. no cost recorded yet)
+    numerator = np.asarray(numerator, dtype='float64')
+    denominator = np.asarray(denominator, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def _add_indices(frame):
+    frame['CPI'] = _ratio(frame['EV_costed'], frame['AC'])
+    frame['SPI'] = _ratio(frame['EV'], frame['PV'])
+    # EAC = BAC / CPI; without a CPI the budget is still the best estimate
+    frame['EAC'] = np.where(np.isnan(frame['CPI']), frame['BAC'], _ratio(frame['BAC'], frame['CPI']))
+    frame['VAC'] = frame['BAC'] - frame['EAC']
+    return frame
+
+
+def task_metrics(inputs, today=None):
+    """Per-task BAC, PV, EV, AC, CPI, SPI, EAC and VAC for the rows of an evm_inputs query."""
+    today = np.datetime64(today or date.today(), 'D')
+    frame = inputs.copy()
+    budget = pd.to_numeric(frame['budget'], errors='coerce').fillna(0).to_numpy('float64')
+    duration = pd.to_numeric(frame['duration_days'], errors='coerce').fillna(1).clip(lower=0).to_numpy('float64')
+    progress = pd.to_numeric(frame['progress_percentage'], errors='coerce').fillna(0).clip(0, 100).to_numpy('float64')
+    due = pd.to_datetime(frame['due_date'], errors='coerce').to_numpy('datetime64[D]')
+
+    # Budget split by duration within each project; equal shares when every task is a milestone
+    task_count = frame.groupby('project_id')['project_id'].transform('size').to_numpy('float64')
+    total_days = pd.Series(duration).groupby(frame['project_id'].to_numpy()).transform('sum').to_numpy('float64')
+    weight = np.where(total_days > 0, _ratio(duration, total_days), 1.0 / task_count)
+    bac = budget * weight
+
+    # Planned share: 0 before due - duration, 1 from the due date on; undated tasks plan nothing
+    days_left = (due - today).astype('float64')
+    with np.errstate(invalid='ignore'):
+        planned = np.where(duration > 0, 1 - days_left / np.where(duration > 0, duration, 1), (days_left <= 0).astype('float64'))
+    planned = np.nan_to_num(np.clip(planned, 0, 1), nan=0.0)
+
+    frame['BAC'] = bac
+    frame['PV'] = bac * planned
+    frame['EV'] = bac * progress / 100
+    actual_cost = pd.to_numeric(frame['actual_cost'], errors='coerce')
+    frame['EV_costed'] = frame['EV'].where(actual_cost.notna(), 0.0)
+    frame['AC'] = actual_cost.fillna(0).to_numpy('float64')
+    return _add_indices(frame)
+
+
+def project_rollup(tasks):
+    """Sum task values per project and recompute the indices from the sums."""
+    projects = tasks.groupby(['project_id', 'project_name'], sort=False, observed=True)[VALUE_COLUMNS].sum().reset_index()
+    return _add_indices(projects)
+
+
+def portfolio_totals(tasks):
+    totals = {column: float(tasks[column].sum()) for column in VALUE_COLUMNS}
+    totals = _add_indices(pd.DataFrame([totals])).iloc[0].to_dict()
+    totals['projects'] = int(tasks['project_id'].nunique())
+    totals['tasks'] = len(tasks)
+    return totals
+
+
+def _compute(inputs, today):
+    tasks = task_metrics(inputs, today)
+    return {'tasks': tasks, 'projects': project_rollup(tasks), 'portfolio': pd.DataFrame([portfolio_totals(tasks)])}
+
+
+def portfolio_evm(user_id, today=None):
+    """EVM for all of a user's tasks: {'tasks', 'projects', 'portfolio'} DataFrames (portfolio has one row)."""
+    today = today or date.today()
+    db_path = database.resolve_db_path()
+    # Writes to this user's projects or tasks move the version, from this process or another
+    version = database.data_version(db_path, user_id=user_id)
+    return data_cache.get_or_load('evm', db_path, (user_id, version, today), lambda: _compute(
+        analytics.run_query('evm_inputs', user_id).to_pandas(), today))
+
+
+def project_evm(project_id, archived=False, today=None):
+    """EVM for one project's tasks (active or archived), same shape as portfolio_evm()."""
+    today = today or date.today()
+    db_path = database.archive_path() if archived else database.resolve_db_path()
+    version = database.data_version(db_path, project_id=project_id)
+    return data_cache.get_or_load('evm_project', db_path, (project_id, version, today), lambda: _compute(
+        analytics.run_query('evm_project_inputs', project_id, db_path=db_path).to_pandas(), today))
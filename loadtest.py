@@ -0,0 +1,323 @@
+"""Concurrent-session load test for app2.py using Streamlit's AppTest.
+
+Each virtual engineer is an AppTest instance driving app2.py through a
+scripted flow: log in, open the dashboard, pick a project, filter its tasks,
+edit a task and generate a report, with a random think time between steps.
+Every step is one script rerun; its wall time and outcome (an uncaught
+exception, a timeout or a missing widget counts as an error) are recorded.
+
+Every session runs in its own process: AppTest installs a mock Streamlit
+runtime as a process-wide singleton for each rerun, so two AppTest instances in
+one process break each other. Each session therefore has its own data cache and
+writer thread, like N single-user servers sharing the database files, which
+makes the figures a pessimistic bound for one real server. Processes load the
+app before the clock starts and then begin together (or spread over --ramp-s);
+budget ~150 MB of memory per session.
+
+    python loadtest.py --sessions 20 --iterations 3 --output loadtest_results.json
+    python loadtest.py --sessions 50 --think-ms 0 --ramp-s 10 --reuse
+    python loadtest.py --compare loadtest_old.json loadtest_results.json
+
+The synthetic dataset comes from benchmark.py (bench_user_* users, password
+'benchmark') and is written to loadtest.db by default; session n logs in as
+user n modulo --users. Results (p50/p95/p99 rerun latency and error rate, per
+step and overall) are written as JSON so runs can be compared between versions.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import multiprocessing
+import time
+from collections import Counter
+from datetime import datetime
+
+import benchmark
+import database
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app2.py')
+STEPS = ['login', 'dashboard', 'projects', 'select_project', 'tasks', 'filter_tasks',
+         'edit_task_form', 'select_task', 'save_task', 'reports', 'generate_report']
+MAX_ERROR_SAMPLES = 20
+
+
+# --- One virtual engineer ---
+class _StepError(Exception):
+    pass
+
+
+def _widget(elements, label):
+    # Widgets without a key are found by their label
+    for element in elements:
+        if element.label == label:
+            return element
+    raise _StepError(f"no widget labelled {label!r}")
+
+
+def _ids(sql, owner_id):
+    conn = database.connect_readonly(database.DB_NAME)
+    try:
+        ids = [row[0] for row in conn.execute(sql, (owner_id,))]
+    finally:
+        conn.close()
+    if not ids:
+        raise _StepError(f"nothing to select for {owner_id}")
+    return ids
+
+
+class Session:
+    """Drives one AppTest through the scripted flow and records (step, seconds, error) samples."""
+
+    def __init__(self, username, seed, think_s, timeout):
+        from streamlit.testing.v1 import AppTest  # Imported late: only needed in the session processes
+
+        self.username = username
+        self.rng = random.Random(seed)
+        self.think_s = think_s
+        self.new_app = lambda: AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.at = self.new_app()
+        self.samples = []
+
+    def step(self, name, action):
+        # action() sets widget values and returns the element whose run() performs the rerun
+        if self.think_s:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_s)
+        error = None
+        start = time.perf_counter()
+        try:
+            action().run()
+            if self.at.exception:
+                error = self.at.exception[0].value.splitlines()[0] if self.at.exception[0].value else 'exception'
+        except Exception as e: # Timeouts, missing widgets
+            error = f"{type(e).__name__}: {e}"
+        self.samples.append((name, time.perf_counter() - start, error))
+        return error is None
+
+    def login(self):
+        self.at.run()
+        self.at.text_input(key='login_username').input(self.username)
+        self.at.text_input(key='login_password').input(benchmark.BENCH_PASSWORD)
+        if not self.step('login', lambda: _widget(self.at.button, 'Login').click()):
+            return False
+        # The login rerun leaves the login form's widgets in AppTest's element tree (a browser drops them), and
+        # the next run() would fail on them; carry the logged-in session state over to a fresh AppTest instead
+        logged_in = {key: self.at.session_state[key] for key in ('logged_in', 'username', 'user_id', 'current_view')}
+        self.at = self.new_app()
+        for key, value in logged_in.items():
+            self.at.session_state[key] = value
+        return self.step('dashboard', lambda: self.at)
+
+    def flow(self):
+        at, rng = self.at, self.rng
+        self.step('dashboard', lambda: at.button(key='nav_dashboard_button').click())
+        self.step('projects', lambda: at.button(key='nav_projects_button').click())
+
+        def select_project():
+            # Selectboxes with a format_func are set by value (AppTest's select_index() would pass the label)
+            project_ids = _ids("SELECT id FROM projects WHERE user_id = ? AND deleted_at IS NULL", at.session_state['user_id'])
+            return at.selectbox(key='select_project_to_manage').select(rng.choice(project_ids))
+        if not self.step('select_project', select_project):
+            return
+        self.step('tasks', lambda: at.button(key='nav_tasks_button').click())
+
+        def filter_tasks():
+            selectbox = at.selectbox(key='filter_status_tasks')
+            return selectbox.select_index(rng.randrange(len(selectbox.options)))
+        self.step('filter_tasks', filter_tasks)
+        if not self.step('edit_task_form', lambda: _widget(at.radio, 'Choose task action').set_value('Edit Selected Task')):
+            return
+
+        def select_task():
+            task_ids = _ids("SELECT id FROM tasks WHERE project_id = ?", at.session_state['selected_project_id'])
+            return at.selectbox(key='select_task_to_manage').select(rng.choice(task_ids))
+        if not self.step('select_task', select_task):
+            return
+
+        def save_task():
+            _widget(at.slider, 'Progress (%)').set_value(rng.randint(0, 100))
+            return _widget(at.button, 'Update Task').click()
+        self.step('save_task', save_task)
+        self.step('reports', lambda: at.button(key='nav_reports_button').click())
+        self.step('generate_report', lambda: at.button(key='generate_report_btn').click())
+
+
+def _session_process(session_no, username, iterations, think_s, timeout, seed, delay_s, db_path, ready, results):
+    from streamlit import config, logger
+    # Silences the bare-mode warnings AppTest triggers on every rerun; app errors end up in the report
+    config.set_option('logger.level', 'critical')
+    logger.set_log_level('critical')
+    os.environ['PROJECT_TRACKER_DB'] = db_path
+    os.chdir(os.path.dirname(APP_PATH)) # Like `streamlit run` from the repository: app2.py opens logo.jpg relative to it
+    samples = []
+    try:
+        session = Session(username, seed + session_no, think_s, timeout)
+        session.at.run() # Warm-up: imports app2.py's modules in this process before the clock starts
+    except Exception as e:
+        samples.append(('login', 0.0, f"{type(e).__name__}: {e}"))
+        session = None
+    try:
+        ready.wait()
+    except multiprocessing.BrokenBarrierError:
+        pass
+    if session is not None:
+        time.sleep(delay_s)
+        if session.login():
+            for _ in range(iterations):
+                session.flow()
+        samples = session.samples
+    results.put(samples)
+
+
+def run_sessions(sessions, usernames, iterations, think_s, timeout, seed, db_path, ramp_s=0.0):
+    """Run the sessions concurrently, one process each; returns (all samples, wall seconds from the common start)."""
+    ready = multiprocessing.Barrier(sessions + 1)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(
+        target=_session_process, name=f"loadtest-session-{n}", daemon=True,
+        args=(n, usernames[n % len(usernames)], iterations, think_s, timeout, seed, ramp_s * n / sessions, db_path, ready, results))
+        for n in range(sessions)]
+    for process in processes:
+        process.start()
+    ready.wait() # Every session has loaded the app
+    start = time.perf_counter()
+    samples = []
+    for _ in processes: # Drain before joining: a process can't exit while its results sit in the pipe
+        samples.extend(results.get())
+    wall_s = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    return samples, wall_s
+
+
+# --- Statistics ---
+def percentile(ordered, q):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))]
+
+
+def summarize(samples):
+    timings = sorted(seconds for _, seconds, _ in samples)
+    errors = sum(1 for _, _, error in samples if error)
+    if not timings:
+        return {'reruns': 0, 'errors': 0, 'error_rate': 0.0}
+    return {
+        'reruns': len(timings),
+        'errors': errors,
+        'error_rate': errors / len(timings),
+        'mean_s': sum(timings) / len(timings),
+        'p50_s': percentile(timings, 0.50),
+        'p95_s': percentile(timings, 0.95),
+        'p99_s': percentile(timings, 0.99),
+        'max_s': timings[-1],
+    }
+
+
+def build_report(samples, wall_s):
+    steps = {name: summarize([s for s in samples if s[0] == name]) for name in STEPS}
+    overall = summarize(samples)
+    overall['wall_s'] = wall_s
+    overall['reruns_per_s'] = len(samples) / wall_s if wall_s else 0.0
+    errors = Counter(f"{name}: {error}" for name, _, error in samples if error)
+    return {'overall': overall, 'steps': {name: stats for name, stats in steps.items() if stats['reruns']}, 'errors': dict(errors.most_common(MAX_ERROR_SAMPLES))}
+
+
+def print_report(report):
+    print(f"{'step':<18} {'reruns':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, stats in list(report['steps'].items()) + [('overall', report['overall'])]:
+        print(f"{name:<18} {stats['reruns']:7d} {stats['errors']:7d} {stats['p50_s'] * 1000:9.1f} "
+              f"{stats['p95_s'] * 1000:9.1f} {stats['p99_s'] * 1000:9.1f} {stats['max_s'] * 1000:9.1f}")
+    overall = report['overall']
+    print(f"{overall['reruns_per_s']:.1f} reruns/s over {overall['wall_s']:.1f}s, error rate {overall['error_rate']:.2%}")
+    for error, count in report['errors'].items():
+        print(f"  {count:5d} x {error}")
+
+
+# --- Comparing two result files ---
+def compare_results(baseline_path, current_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+    regressions = []
+    print(f"{'step':<18} {'baseline p95':>13} {'current p95':>13} {'ratio':>7} {'errors':>15}")
+    rows = [(name, baseline['steps'].get(name), current['steps'].get(name)) for name in STEPS]
+    rows.append(('overall', baseline['overall'], current['overall']))
+    for name, old, new in rows:
+        if not old or not new:
+            continue
+        ratio = new['p95_s'] / old['p95_s'] if old['p95_s'] else float('inf')
+        flag = ''
+        if ratio > threshold or new['error_rate'] > old['error_rate']:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<18} {old['p95_s'] * 1000:11.1f}ms {new['p95_s'] * 1000:11.1f}ms {ratio:7.2f} "
+              f"{old['error_rate']:6.2%} -> {new['error_rate']:6.2%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app2.py with concurrent AppTest sessions.")
+    parser.add_argument('--db', default='loadtest.db', help="SQLite file to generate and test against (default: loadtest.db)")
+    parser.add_argument('--users', type=int, default=20, help="Synthetic users (sessions log in round-robin)")
+    parser.add_argument('--projects', type=int, default=5, help="Projects per user")
+    parser.add_argument('--tasks', type=int, default=200, help="Tasks per project")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reuse', action='store_true', help="Test an already generated --db instead of regenerating it")
+    parser.add_argument('--sessions', type=int, default=10, help="Concurrent sessions")
+    parser.add_argument('--iterations', type=int, default=3, help="Flows per session after login")
+    parser.add_argument('--think-ms', type=float, default=500, help="Mean think time between steps")
+    parser.add_argument('--ramp-s', type=float, default=0.0, help="Spread session start-up over this many seconds")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds before a rerun counts as timed out")
+    parser.add_argument('--output', default='loadtest_results.json', help="Where to write the JSON results")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="Compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=1.2, help="p95 slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare_results(args.compare[0], args.compare[1], args.threshold)
+        return 1 if regressions else 0
+
+    args.db = os.path.abspath(args.db) # Sessions run from the repository directory
+    database.DB_NAME = args.db
+    if args.reuse:
+        dataset = {'reused': True}
+    else:
+        for path in (args.db, args.db + '-wal', args.db + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"Generating {args.users} users x {args.projects} projects x {args.tasks} tasks into {args.db} ...")
+        dataset = benchmark.generate_dataset(args.db, args.users, args.projects, args.tasks, args.seed)
+    conn = database.get_catalog_connection()
+    usernames = [row[0] for row in conn.execute("SELECT username FROM users WHERE username LIKE 'bench_user_%' ORDER BY id")]
+    conn.close()
+    if not usernames:
+        parser.error(f"{args.db} has no benchmark users; run without --reuse first")
+
+    print(f"Running {args.sessions} session(s) x {args.iterations} flow(s) ...")
+    samples, wall_s = run_sessions(args.sessions, usernames, args.iterations, args.think_ms / 1000, args.timeout,
+                                   args.seed, args.db, args.ramp_s)
+
+    report = build_report(samples, wall_s)
+    report['meta'] = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': benchmark.git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'sessions': args.sessions,
+        'iterations': args.iterations,
+        'think_ms': args.think_ms,
+        'ramp_s': args.ramp_s,
+    }
+    report['dataset'] = dataset
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""On-demand profiling of the routed Streamlit views.
+
+Profiling is off unless PROJECT_TRACKER_PROFILE is set on the server, or an
+admin (a username listed in PROJECT_TRACKER_ADMINS, comma separated) adds
+?profile=... to the URL. Three modes are available:
+
+    cprofile  deterministic cProfile run; downloadable .prof for pstats/snakeviz
+    sample    stack sampling every PROJECT_TRACKER_PROFILE_INTERVAL_MS (default 5 ms);
+              downloadable folded stacks for flamegraph.pl / speedscope
+    memory    tracemalloc over the view: its allocation peak and the lines of the
+              tracker's own code whose allocations are still alive afterwards
+              (the innermost tracker frame of PROJECT_TRACKER_PROFILE_MEMORY_FRAMES,
+              default 10), plus the largest objects in st.session_state and in
+              the shared data cache (DataFrames measured with
+              memory_usage(deep=True)); downloadable text report. Each run is
+              also logged to the 'project_tracker.memory' logger, and memory_stats
+              keeps the per-view peaks for this server process.
+
+tracemalloc traces the whole process, so a memory run's peak includes whatever
+other sessions allocate at the same time; profile on a quiet server for exact
+numbers. Tracing only runs during the profiled view, and it slows the view down
+roughly tenfold at 10 frames (1 frame is cheap but charges most allocations to
+pandas/pyarrow internals), so the elapsed time of a memory run is not comparable
+with the other modes.
+
+When profiling is not requested the view function is called directly.
+"""
+import cProfile
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_MODES = ('cprofile', 'sample', 'memory')
+SAMPLE_INTERVAL_S = float(os.environ.get('PROJECT_TRACKER_PROFILE_INTERVAL_MS', '5')) / 1000
+ADMIN_USERS = {u.strip() for u in os.environ.get('PROJECT_TRACKER_ADMINS', '').split(',') if u.strip()}
+MEMORY_FRAMES = int(os.environ.get('PROJECT_TRACKER_PROFILE_MEMORY_FRAMES', '10'))
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+memory_logger = logging.getLogger('project_tracker.memory')
+_tracing_lock = threading.Lock()
+_tracing_runs = 0 # Memory runs in progress; tracemalloc is process-wide, the last one out stops it
+_owns_tracing = False # True when a memory run started tracemalloc (rather than PYTHONTRACEMALLOC)
+_memory_stats_lock = threading.Lock()
+memory_stats = {} # view -> {'runs', 'last_peak_mb', 'max_peak_mb', 'last_retained_mb'} for this process
+
+
+def requested_mode(username, query_params):
+    """Return the profiling mode for this rerun, or None when profiling is off."""
+    env_mode = os.environ.get('PROJECT_TRACKER_PROFILE')
+    if env_mode:
+        return env_mode if env_mode in PROFILE_MODES else 'cprofile'
+    param = query_params.get('profile')
+    if param and username in ADMIN_USERS:
+        return param if param in PROFILE_MODES else 'cprofile'
+    return None
+
+
+class ProfileResult:
+    def __init__(self, view, mode, elapsed_s):
+        self.view = view
+        self.mode = mode
+        self.elapsed_s = elapsed_s
+        self.rows = [] # Top functions, most expensive first
+        self.download = None # (bytes, file_name, mime)
+        self.summary = None # One-line summary shown above the rows
+        self.tables = {} # Further tables by title, e.g. the session_state footprint in memory mode
+
+
+def run_profiled(view, view_fn, mode='cprofile', top=30, session_state=None):
+    if mode == 'sample':
+        return _run_sampled(view, view_fn, top)
+    if mode == 'memory':
+        return _run_memory(view, view_fn, top, session_state)
+    return _run_cprofile(view, view_fn, top)
+
+
+def _run_cprofile(view, view_fn, top):
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        view_fn()
+    finally:
+        profiler.disable()
+    result = ProfileResult(view, 'cprofile', time.perf_counter() - start)
+    stats = pstats.Stats(profiler)
+    # stats.stats: (file, line, func) -> (primitive calls, total calls, own time, cumulative time, callers)
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    result.rows = [{
+        'function': _label(file_name, line, func),
+        'calls': total_calls,
+        'own_ms': own_time * 1000,
+        'cumulative_ms': cumulative * 1000,
+    } for (file_name, line, func), (_, total_calls, own_time, cumulative, _) in ranked]
+    # Same layout as pstats.Stats.dump_stats(), so it loads with pstats/snakeviz
+    result.download = (marshal.dumps(stats.stats), f"profile_{view.lower()}.prof", 'application/octet-stream')
+    return result
+
+
+def _run_sampled(view, view_fn, top):
+    sampler = StackSampler(threading.get_ident(), SAMPLE_INTERVAL_S, root_code=_run_sampled.__code__)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        view_fn()
+    finally:
+        sampler.stop()
+    result = ProfileResult(view, 'sample', time.perf_counter() - start)
+    total = sum(sampler.stacks.values()) or 1
+    own, inclusive = Counter(), Counter()
+    for stack, count in sampler.stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    result.rows = [{
+        'function': frame,
+        'samples': inclusive[frame],
+        'own_pct': own[frame] * 100 / total,
+        'inclusive_pct': inclusive[frame] * 100 / total,
+    } for frame, _ in inclusive.most_common(top)]
+    folded = '\n'.join(f"{stack} {count}" for stack, count in sampler.stacks.most_common())
+    result.download = (folded.encode('utf-8'), f"profile_{view.lower()}.folded", 'text/plain')
+    return result
+
+
+def _start_tracing():
+    global _tracing_runs, _owns_tracing
+    with _tracing_lock:
+        if _tracing_runs == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(MEMORY_FRAMES)
+                _owns_tracing = True
+            tracemalloc.reset_peak() # Not while another run is measuring its own peak
+        _tracing_runs += 1
+
+
+def _stop_tracing():
+    global _tracing_runs, _owns_tracing
+    with _tracing_lock:
+        _tracing_runs -= 1
+        if _tracing_runs == 0 and _owns_tracing: # Leaves tracing on if PYTHONTRACEMALLOC started it
+            tracemalloc.stop()
+            _owns_tracing = False
+
+
+def _run_memory(view, view_fn, top, session_state):
+    _start_tracing()
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            view_fn()
+        finally:
+            elapsed_s = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+    finally:
+        _stop_tracing()
+
+    result = ProfileResult(view, 'memory', elapsed_s)
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+    # Allocations made inside pandas/pyarrow are charged to the tracker line that called into them
+    retained = Counter()
+    blocks = Counter()
+    for stat in after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'traceback'):
+        line = _app_line(stat.traceback)
+        retained[line] += stat.size_diff
+        blocks[line] += stat.count_diff
+    diff = [(line, size) for line, size in retained.most_common() if size > 0]
+    result.rows = [{'line': line, 'retained_kb': size / 1024, 'blocks': blocks[line]} for line, size in diff[:top]]
+    peak_bytes, retained_bytes = peak - baseline, current - baseline
+    result.summary = (f"Peak {peak_bytes / 1024 / 1024:.1f} MB above the start of the view, "
+                      f"{retained_bytes / 1024 / 1024:.1f} MB still allocated after it")
+
+    if session_state is not None:
+        footprints = sorted(((str(key), type(value).__name__, object_footprint(value)) for key, value in session_state.items()),
+                            key=lambda item: item[2], reverse=True)
+        result.tables['Largest st.session_state entries'] = [
+            {'key': key, 'type': type_name, 'kb': nbytes / 1024} for key, type_name, nbytes in footprints[:top]]
+    import data_cache
+    result.tables['Largest shared data cache entries'] = [
+        {'kind': kind, 'database': os.path.basename(db_path), 'owner': str(owner_id), 'kb': nbytes / 1024, 'age_s': age_s}
+        for kind, db_path, owner_id, nbytes, age_s in data_cache.largest_entries(top)]
+
+    report = [f"{view} view: {result.summary}", '', 'Allocations still alive after the view, by line:']
+    report += [f"{size / 1024:10.1f} KiB {blocks[line]:8d} blocks  {line}" for line, size in diff[:200]]
+    for title, rows in result.tables.items():
+        report += ['', f"{title}:"] + ['  ' + '  '.join(f"{name}={value}" for name, value in row.items()) for row in rows]
+    result.download = ('\n'.join(report).encode('utf-8'), f"memory_{view.lower()}.txt", 'text/plain')
+
+    with _memory_stats_lock:
+        stats = memory_stats.setdefault(view, {'runs': 0, 'last_peak_mb': 0.0, 'max_peak_mb': 0.0, 'last_retained_mb': 0.0})
+        stats['runs'] += 1
+        stats['last_peak_mb'] = peak_bytes / 1024 / 1024
+        stats['max_peak_mb'] = max(stats['max_peak_mb'], stats['last_peak_mb'])
+        stats['last_retained_mb'] = retained_bytes / 1024 / 1024
+    memory_logger.info("view=%s peak_mb=%.1f retained_mb=%.1f top_line=%s", view, peak_bytes / 1024 / 1024,
+                       retained_bytes / 1024 / 1024, result.rows[0]['line'] if result.rows else '-')
+    return result
+
+
+def _app_line(traceback):
+    # Innermost frame in the tracker's own files, else the innermost frame
+    for frame in reversed(traceback): # tracemalloc tracebacks run from the oldest frame to the most recent
+        if frame.filename.startswith(APP_DIR) and frame.filename != __file__:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+    return f"{traceback[-1].filename}:{traceback[-1].lineno}"
+
+
+def object_footprint(value, _seen=None):
+    """Approximate bytes held by value: deep memory_usage() for pandas objects, nbytes for Arrow, recursive for containers."""
+    import pandas as pd
+    import pyarrow as pa
+
+    _seen = set() if _seen is None else _seen
+    if id(value) in _seen: # Shared objects count once
+        return 0
+    _seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (pa.Table, pa.RecordBatch, pa.Array, pa.ChunkedArray)):
+        return value.nbytes
+    if hasattr(value, 'data') and isinstance(getattr(value, 'data'), pd.DataFrame): # pandas Styler
+        return object_footprint(value.data, _seen)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(object_footprint(k, _seen) + object_footprint(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(object_footprint(item, _seen) for item in value)
+    return size
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer, counting folded stacks."""
+
+    def __init__(self, thread_id, interval_s, root_code=None):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.root_code = root_code # Frames from this code object outward are left out of the stacks
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='view-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None and frame.f_code is not self.root_code:
+                code = frame.f_code
+                frames.append(_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+
+def _label(file_name, line, func):
+    return f"{func} ({os.path.basename(file_name)}:{line})"
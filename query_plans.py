@@ -0,0 +1,226 @@
+"""Query-plan regression check for the data-access functions.
+
+Seeds a small synthetic database (benchmark.generate_dataset), calls every data
+function the app uses while query_trace.capture() records the statements they
+issue, from any thread, including the write queue's writer thread. Then it runs
+EXPLAIN QUERY PLAN on each distinct statement against the same database and
+prints the plans. The check fails if a plan
+    - scans a whole table ('SCAN <table>', with or without a covering index), or
+    - sorts or de-duplicates in a temporary B-tree ('USE TEMP B-TREE FOR ...'),
+unless ALLOWED lists that (function, plan step) with the reason it is fine.
+Subqueries, CTEs, json_each() and other virtual tables may be scanned.
+
+    python query_plans.py                  check, print failing plans (exit 1 on failure)
+    python query_plans.py --verbose        print every plan
+    python query_plans.py --db plans.db --keep
+
+Parameters are bound as NULL: without sqlite_stat tables (the app never runs
+ANALYZE) SQLite's plan doesn't depend on the values.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import analytics
+import benchmark
+import data_cache
+import database
+import query_trace
+
+# (function, plan step) -> why a full scan or temporary B-tree is acceptable there
+ALLOWED = {
+    ('data_db_paths', 'SCAN shards USING COVERING INDEX idx_shards_shard_name'):
+        "lists every shard by design; the index returns them sorted and distinct",
+    ('take_snapshot', 'SCAN t'):
+        "the daily snapshot compares every task by design, once a day",
+    ('get_task_dependencies', 'USE TEMP B-TREE FOR ORDER BY'):
+        "sorts one project's dependency edges for a stable list",
+    ('project_progress', 'USE TEMP B-TREE FOR ORDER BY'):
+        "sorts one row per project of the user",
+    ('budget_rollup', 'USE TEMP B-TREE FOR ORDER BY'):
+        "sorts one row per project of the user",
+    ('overdue_by_assignee', 'USE TEMP B-TREE FOR GROUP BY'):
+        "groups on a computed assignee key; only the user's overdue tasks reach it",
+    ('overdue_by_assignee', 'USE TEMP B-TREE FOR ORDER BY'):
+        "orders the aggregated rows by their counts",
+    ('most_urgent_overdue', 'USE TEMP B-TREE FOR ORDER BY'):
+        "top-N sort of the user's overdue tasks (LIMIT keeps only N rows in the B-tree)",
+    ('workload_by_week', 'USE TEMP B-TREE FOR GROUP BY'):
+        "groups on computed (assignee, week) keys over the user's open tasks in the window",
+    ('workload_tasks', 'USE TEMP B-TREE FOR ORDER BY'):
+        "sorts one assignee's open tasks for one week",
+    ('generate_project_report_html', 'USE TEMP B-TREE FOR GROUP BY'):
+        "groups one project's tasks by status/priority for the report",
+    ('generate_project_report_html', 'USE TEMP B-TREE FOR ORDER BY'):
+        "orders the few status/priority groups by their counts",
+}
+
+SCAN_RE = re.compile(r'^SCAN (\S+)')
+TEMP_BTREE = 'USE TEMP B-TREE'
+
+
+# --- Exercising the data functions ---
+def data_functions(user_id, username):
+    """(name, callable) for every data function, in an order where each one has the rows it needs."""
+    import critical_path
+    import evm
+    import reports
+    import snapshots
+
+    today = date.today()
+    project_id = int(database.get_projects_by_user(user_id)['id'].iloc[0])
+    task_ids = database.get_tasks_by_project(project_id)['id'].tolist()
+    archive_id = int(database.get_projects_by_user(user_id)['id'].iloc[-1])
+    tasks = database.get_tasks_by_project(project_id)
+    bulk_rows = [dict(row, due_date=str(row['due_date'])) for row in tasks.head(3)[
+        ['id', 'task_name', 'status', 'task_priority', 'progress_percentage', 'assigned_to', 'due_date']].to_dict('records')]
+
+    return [
+        ('verify_user', lambda: database.verify_user(username, benchmark.BENCH_PASSWORD)),
+        ('add_user', lambda: database.add_user('query_plans_user', 'secret')),
+        ('data_db_paths', database.data_db_paths),
+        ('data_version', database.data_version),
+        ('sync_cache', lambda: database.sync_cache(database.DB_NAME)),
+        ('get_projects_by_user', lambda: database.get_projects_by_user(user_id)),
+        ('get_tasks_by_project', lambda: database.get_tasks_by_project(project_id)),
+        ('get_task_dependencies', lambda: database.get_task_dependencies(project_id)),
+        ('add_project', lambda: database.add_project(user_id, 'Plan Check', 'query_plans.py', today, today, 1000.0)),
+        ('update_project', lambda: database.update_project(project_id, 'Plan Check', 'Updated', today, today, 2000.0)),
+        ('add_task', lambda: database.add_task(project_id, 'Plan Check Task', 'Not Started', 'Medium', 0, 'Plan', today)),
+        ('update_task', lambda: database.update_task(task_ids[0], 'Plan Check Task', 'In Progress', 'High', 40, 'Plan', today)),
+        ('update_tasks_bulk', lambda: database.update_tasks_bulk(bulk_rows)),
+        ('add_task_dependency', lambda: database.add_task_dependency(task_ids[1], task_ids[2])),
+        ('remove_task_dependency', lambda: database.remove_task_dependency(task_ids[1], task_ids[2])),
+        ('delete_task', lambda: database.delete_task(task_ids[-1])),
+        ('project_progress', lambda: analytics.project_progress(user_id)),
+        ('overdue_by_assignee', lambda: analytics.overdue_by_assignee(user_id)),
+        ('most_urgent_overdue', lambda: analytics.most_urgent_overdue(user_id)),
+        ('budget_rollup', lambda: analytics.budget_rollup(user_id)),
+        ('workload_by_week', lambda: analytics.workload_by_week(user_id, today - timedelta(days=28), today + timedelta(days=84))),
+        ('workload_tasks', lambda: analytics.workload_tasks(user_id, 'Unassigned', today)),
+        ('portfolio_evm', lambda: evm.portfolio_evm(user_id)),
+        ('project_evm', lambda: evm.project_evm(project_id)),
+        ('get_schedule', lambda: critical_path.get_schedule(project_id)),
+        ('take_snapshot', snapshots.take_snapshot),
+        ('progress_curve', lambda: snapshots.progress_curve(project_id, today - timedelta(days=30), today)),
+        ('generate_project_report_html', lambda: reports.generate_project_report_html(project_id, user_id)),
+        ('export_xlsx_bytes', lambda: reports.export_xlsx_bytes([project_id])),
+        ('get_archivable_projects', lambda: database.get_archivable_projects(user_id)),
+        ('archive_project', lambda: database.archive_project(archive_id)),
+        ('search_archived_projects', lambda: database.search_archived_projects(user_id, 'Plan')),
+        ('get_tasks_by_project (archived)', lambda: database.get_tasks_by_project(archive_id, archived=True)),
+        ('restore_project', lambda: database.restore_project(archive_id)),
+        ('delete_project', lambda: database.delete_project(archive_id)),
+        ('purge_deleted_projects', lambda: database.purge_deleted_projects(database.DB_NAME, pause_s=0)),
+    ]
+
+
+def capture_statements(functions):
+    """Run the functions; returns {(path, sql): first function that issued it}, in first-seen order."""
+    statements = {}
+    for name, function in functions:
+        with query_trace.capture() as captured:
+            function()
+        for path, sql in captured:
+            if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE'):
+                statements.setdefault((path, sql), name)
+    return statements
+
+
+# --- Checking plans ---
+def explain(path, sql):
+    """EXPLAIN QUERY PLAN rows as (id, parent, detail)."""
+    conn = sqlite3.connect(path, uri=path.startswith('file:'))
+    try:
+        archive = database.archive_path(path)
+        if not path.startswith('file:') and os.path.exists(archive): # _move_project() reads both through one connection
+            conn.execute("ATTACH DATABASE ? AS archive", (archive,))
+        named = re.findall(r'(?<![:\w]):(\w+)', sql)
+        params = dict.fromkeys(named) if named else [None] * sql.count('?')
+        return [(row[0], row[1], row[3]) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    finally:
+        conn.close()
+
+
+def problems(plan):
+    # Plan steps that read a whole table or sort/de-duplicate in a temporary B-tree
+    derived = {detail.split()[-1] for _, _, detail in plan if detail.startswith(('MATERIALIZE', 'CO-ROUTINE'))}
+    found = []
+    for _, _, detail in plan:
+        scan = SCAN_RE.match(detail)
+        if scan and not (scan.group(1).startswith('(') or scan.group(1) in derived
+                         or detail.startswith('SCAN CONSTANT ROW') or 'VIRTUAL TABLE' in detail):
+            found.append(detail)
+        elif detail.startswith(TEMP_BTREE):
+            found.append(detail)
+    return found
+
+
+def format_plan(plan):
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('    ' + '  ' * depth[node_id] + detail)
+    return '\n'.join(lines)
+
+
+def check(statements, verbose=False):
+    """Explain every statement; prints plans and returns the number of statements with disallowed plan steps."""
+    failures = 0
+    for (path, sql), function in statements.items():
+        try:
+            plan = explain(path, sql)
+        except sqlite3.Error as e:
+            print(f"[{function}] could not explain ({e}):\n    {' '.join(sql.split())}\n")
+            failures += 1
+            continue
+        found = [detail for detail in problems(plan) if (function, detail) not in ALLOWED]
+        allowed = [detail for detail in problems(plan) if (function, detail) in ALLOWED]
+        if found or verbose:
+            status = 'FAIL' if found else 'ok'
+            print(f"[{function}] {status}  {os.path.basename(path)}\n    {' '.join(sql.split())}\n{format_plan(plan)}")
+            for detail in found:
+                print(f"    !! {detail}")
+            for detail in allowed:
+                print(f"    allowed: {detail} ({ALLOWED[(function, detail)]})")
+            print()
+        failures += bool(found)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the query plans of every data function for full scans and temp B-trees.")
+    parser.add_argument('--db', help="Database file to seed (default: a temporary file)")
+    parser.add_argument('--keep', action='store_true', help="Keep the seeded database")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Print every plan, not only failing ones")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='query_plans_'), 'plans.db')
+    for path in (db_path, database.archive_path(db_path)):
+        if os.path.exists(path):
+            os.remove(path)
+    data_cache.MAX_BYTES = 0 # Every call reaches the database
+    analytics.ANALYTICS_ENGINE = 'sqlite' # DuckDB has its own planner
+    benchmark.generate_dataset(db_path, users=3, projects_per_user=4, tasks_per_project=50)
+    conn = database.get_catalog_connection()
+    user_id, username = conn.execute("SELECT id, username FROM users ORDER BY id LIMIT 1").fetchone()
+    conn.close()
+    database.set_current_tenant(user_id)
+
+    statements = capture_statements(data_functions(user_id, username))
+    failures = check(statements, args.verbose)
+    print(f"{len(statements)} statement(s) checked, {failures} with full scans or temp B-trees")
+    if not args.keep and not args.db:
+        for path in (db_path, database.archive_path(db_path)):
+            if os.path.exists(path):
+                os.remove(path)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
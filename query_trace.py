@@ -0,0 +1,241 @@
+"""SQL trace instrumentation for the project tracker.
+
+Every connection returned by database.get_db_connection() uses TracedConnection,
+whose cursors record each statement's text, duration and row count. Records are
+grouped per Streamlit rerun (see begin_rerun/end_rerun in app2.py) and per view,
+and statements slower than PROJECT_TRACKER_SLOW_QUERY_MS go to the slow-query log.
+
+Environment settings:
+    PROJECT_TRACKER_SQL_TRACE=0           disable the instrumentation entirely
+    PROJECT_TRACKER_SLOW_QUERY_MS=100     slow-query threshold in milliseconds
+    PROJECT_TRACKER_SLOW_QUERY_LOG=...    slow-query log file (default slow_queries.log)
+    PROJECT_TRACKER_QUERY_BUDGET=50       statements allowed per rerun before a warning is logged
+"""
+import contextlib
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+TRACE_ENABLED = os.environ.get('PROJECT_TRACKER_SQL_TRACE', '1') != '0'
+SLOW_QUERY_MS = float(os.environ.get('PROJECT_TRACKER_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG = os.environ.get('PROJECT_TRACKER_SLOW_QUERY_LOG', 'slow_queries.log')
+QUERY_BUDGET = int(os.environ.get('PROJECT_TRACKER_QUERY_BUDGET', '50'))
+
+slow_query_logger = logging.getLogger('project_tracker.slow_queries')
+if not slow_query_logger.handlers:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG, delay=True) # File is only created on the first slow query
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.setLevel(logging.INFO)
+    slow_query_logger.propagate = False
+
+# Statement capture for tooling (query_plans.py): every statement from every thread, writer threads included
+_captures = []
+_captures_lock = threading.Lock()
+
+# Streamlit runs each session's script in its own thread, so the active rerun is thread-local
+_local = threading.local()
+_rerun_ids = itertools.count(1)
+_view_stats_lock = threading.Lock()
+view_stats = {} # view -> {'reruns', 'queries', 'db_time_s', 'max_queries'} for this process
+
+
+class QueryRecord:
+    __slots__ = ('sql', 'duration_s', 'rows', 'view')
+
+    def __init__(self, sql, duration_s, rows, view):
+        self.sql = sql
+        self.duration_s = duration_s
+        self.rows = rows
+        self.view = view
+
+    def as_dict(self):
+        return {'sql': self.sql, 'duration_ms': self.duration_s * 1000, 'rows': self.rows, 'view': self.view}
+
+
+class RerunTrace:
+    def __init__(self, view):
+        self.rerun_id = next(_rerun_ids)
+        self.view = view
+        self.queries = []
+        self.started = time.perf_counter()
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_time_s(self):
+        return sum(q.duration_s for q in self.queries)
+
+    @property
+    def over_budget(self):
+        return self.query_count > QUERY_BUDGET
+
+
+def begin_rerun(view):
+    """Start collecting statements for a new rerun of the given view."""
+    end_rerun() # A rerun interrupted by st.rerun() never reaches end_rerun()
+    _local.trace = RerunTrace(view)
+    return _local.trace
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+@contextlib.contextmanager
+def attached(trace):
+    """Record this thread's statements in trace (a rerun's trace from another thread) while active.
+
+    write_queue's writer thread runs each operation under the submitting rerun's trace.
+    """
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def end_rerun():
+    trace = current_trace()
+    if trace is None:
+        return None
+    _local.trace = None
+    with _view_stats_lock:
+        stats = view_stats.setdefault(trace.view, {'reruns': 0, 'queries': 0, 'db_time_s': 0.0, 'max_queries': 0})
+        stats['reruns'] += 1
+        stats['queries'] += trace.query_count
+        stats['db_time_s'] += trace.db_time_s
+        stats['max_queries'] = max(stats['max_queries'], trace.query_count)
+    if trace.over_budget:
+        slow_query_logger.warning("rerun %d (%s) issued %d statements (budget %d), %.1f ms in SQLite",
+                                  trace.rerun_id, trace.view, trace.query_count, QUERY_BUDGET, trace.db_time_s * 1000)
+    return trace
+
+
+@contextlib.contextmanager
+def capture():
+    """Collect (database path, statement text) for everything executed on traced connections, by any thread, while active."""
+    statements = []
+    with _captures_lock:
+        _captures.append(statements)
+    try:
+        yield statements
+    finally:
+        with _captures_lock:
+            _captures.remove(statements)
+
+
+def _finish(record):
+    if record.duration_s * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.info("%.1f ms, %d rows, view=%s: %s", record.duration_s * 1000, record.rows,
+                               record.view, ' '.join(record.sql.split()))
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times execute() and the fetches that follow it."""
+
+    def _start(self, sql, run):
+        self._finish_pending()
+        trace = current_trace()
+        if _captures:
+            with _captures_lock:
+                for statements in _captures:
+                    statements.append((self.connection.path, sql))
+        start = time.perf_counter()
+        try:
+            result = run()
+        finally:
+            elapsed = time.perf_counter() - start
+            rows = self.rowcount if self.rowcount > 0 else 0
+            record = QueryRecord(sql, elapsed, rows, trace.view if trace else None)
+            if trace is not None:
+                trace.queries.append(record)
+            if self.description is None: # DML/DDL: nothing left to fetch
+                _finish(record)
+                record = None
+            self._pending = record
+        return result
+
+    def _finish_pending(self):
+        record = getattr(self, '_pending', None)
+        if record is not None:
+            self._pending = None
+            _finish(record)
+
+    def _fetched(self, start, rows, exhausted):
+        record = getattr(self, '_pending', None)
+        if record is not None:
+            record.duration_s += time.perf_counter() - start
+            record.rows += rows
+            if exhausted:
+                self._finish_pending()
+
+    def execute(self, sql, parameters=()):
+        return self._start(sql, lambda: super(TracedCursor, self).execute(sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._start(sql, lambda: super(TracedCursor, self).executemany(sql, seq_of_parameters))
+
+    def executescript(self, sql_script):
+        return self._start(sql_script, lambda: super(TracedCursor, self).executescript(sql_script))
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows), len(rows) < (self.arraysize if size is None else size))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def close(self):
+        self._finish_pending()
+        super().close()
+
+
+class TracedConnection(sqlite3.Connection):
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.path = database # File name or file: URI, for capture()
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory():
+    # Passed as sqlite3.connect(factory=...) by database.get_db_connection()
+    return TracedConnection if TRACE_ENABLED else sqlite3.Connection
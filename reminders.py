@@ -0,0 +1,400 @@
+"""Due-date reminders: "due soon" and "overdue" digests per assignee.
+
+A scheduler keeps upcoming reminder events in a min-heap ordered by fire time.
+Only open tasks due inside the look-ahead window are loaded, page by page from
+the due_date index, and the window moves forward as days pass, so the tasks
+table is never scanned as a whole. Edits made in the app are picked up from
+change_log (see database.py) by re-reading just the changed projects' tasks.
+Events are checked against the database when they fire (closed, rescheduled or
+archived tasks are dropped), batched per assignee for DIGEST_INTERVAL_S and
+delivered as one digest through a sink. reminder_log records what was
+delivered, so a restart doesn't repeat reminders.
+
+    python reminders.py run [--sink SINK] [--once]
+    PROJECT_TRACKER_REMINDERS=1 streamlit run app2.py    (scheduler thread inside the app)
+
+Run a single scheduler per deployment: several app processes with
+PROJECT_TRACKER_REMINDERS=1 would each send the same digests.
+
+Sinks: log (default), file:PATH (one JSON digest per line), smtp://HOST:PORT
+(e.g. a local `python -m aiosmtpd -n` stand-in) and webhook:URL (JSON POST).
+
+    PROJECT_TRACKER_REMINDER_SINK=log        sink for the in-app scheduler
+    PROJECT_TRACKER_DUE_SOON_DAYS=2          "due soon" lead time
+    PROJECT_TRACKER_REMINDER_LOOKAHEAD_DAYS=7  window loaded beyond the lead time
+    PROJECT_TRACKER_DIGEST_INTERVAL_S=900    batching period per digest
+    PROJECT_TRACKER_REMINDER_POLL_S=30       change_log polling period
+    PROJECT_TRACKER_REMINDER_DOMAIN          mail domain for assignees without an address (smtp)
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import smtplib
+import sqlite3
+import sys
+import threading
+import urllib.request
+from datetime import date, datetime, time, timedelta
+from email.message import EmailMessage
+
+import database
+import write_queue
+
+REMINDERS_ENABLED = os.environ.get('PROJECT_TRACKER_REMINDERS') == '1'
+SINK_SPEC = os.environ.get('PROJECT_TRACKER_REMINDER_SINK', 'log')
+DUE_SOON_DAYS = int(os.environ.get('PROJECT_TRACKER_DUE_SOON_DAYS', '2'))
+LOOKAHEAD_DAYS = int(os.environ.get('PROJECT_TRACKER_REMINDER_LOOKAHEAD_DAYS', '7'))
+DIGEST_INTERVAL_S = float(os.environ.get('PROJECT_TRACKER_DIGEST_INTERVAL_S', '900'))
+POLL_S = float(os.environ.get('PROJECT_TRACKER_REMINDER_POLL_S', '30'))
+MAIL_DOMAIN = os.environ.get('PROJECT_TRACKER_REMINDER_DOMAIN')
+OVERDUE_LOOKBACK_DAYS = 7 # On startup, tasks that fell overdue this recently still get an overdue reminder
+PAGE_ROWS = 5000
+OPEN_STATUS_FILTER = "status NOT IN ('Completed', 'Cancelled')"
+
+logger = logging.getLogger('project_tracker.reminders')
+
+REMINDER_LOG_SQL = '''
+    CREATE TABLE IF NOT EXISTS reminder_log (
+        task_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        due_date DATE NOT NULL,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (task_id, kind, due_date)
+    )
+'''
+
+
+# --- Sinks ---
+def format_digest(digest):
+    lines = [f"Task reminders for {digest['assignee']} ({digest['generated_at']})"]
+    for kind, title in (('overdue', 'Overdue'), ('due_soon', 'Due soon')):
+        if digest[kind]:
+            lines.append(f"\n{title}:")
+            lines += [f"  - {item['task_name']} [{item['project_name']}] due {item['due_date']}" for item in digest[kind]]
+    return '\n'.join(lines)
+
+
+class LogSink:
+    def send(self, digest):
+        logger.info("%s", format_digest(digest))
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, digest):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(digest) + '\n')
+
+
+class SMTPSink:
+    def __init__(self, host, port, sender='project-tracker@localhost', domain=MAIL_DOMAIN):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.domain = domain
+
+    def address(self, assignee):
+        if '@' in assignee:
+            return assignee
+        if self.domain:
+            return f"{re.sub(r'[^a-z0-9]+', '.', assignee.lower()).strip('.')}@{self.domain}"
+        return None
+
+    def send(self, digest):
+        recipient = self.address(digest['assignee'])
+        if recipient is None:
+            logger.warning("No mail address for %r; set PROJECT_TRACKER_REMINDER_DOMAIN", digest['assignee'])
+            return
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = recipient
+        message['Subject'] = f"{len(digest['overdue'])} overdue, {len(digest['due_soon'])} due soon"
+        message.set_content(format_digest(digest))
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(message)
+
+
+class WebhookSink:
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, digest):
+        request = urllib.request.Request(self.url, data=json.dumps(digest).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+
+def make_sink(spec):
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    if spec.startswith('smtp://'):
+        host, _, port = spec[len('smtp://'):].partition(':')
+        return SMTPSink(host or 'localhost', int(port or 25))
+    if spec.startswith('webhook:'):
+        return WebhookSink(spec[len('webhook:'):])
+    if spec == 'log':
+        return LogSink()
+    raise ValueError(f"Unknown reminder sink {spec!r} (use log, file:PATH, smtp://HOST:PORT or webhook:URL)")
+
+
+# --- Scheduler ---
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class ReminderScheduler:
+    def __init__(self, sink, db_paths=None, clock=datetime.now):
+        self.sink = sink
+        self.fixed_db_paths = db_paths # None: every database, re-read on each poll so new shards are picked up
+        self.db_paths = []
+        self.clock = clock
+        self._heap = [] # (fire_at, tie-breaker, db_path, task_id, kind, due_date)
+        self._tie = itertools.count()
+        self._scheduled = {} # (db_path, task_id) -> due date already in the heap
+        self._loaded_until = {} # db_path -> last due date loaded into the heap
+        self._change_seq = {} # db_path -> last change_log seq handled
+        self._pending = {} # assignee -> {'due_soon': [...], 'overdue': [...]}
+        self._next_flush = None
+        self._next_poll = None
+        self._stop = threading.Event()
+
+    # Loading
+    def start(self):
+        now = self.clock()
+        self._add_new_databases(now.date())
+        self._next_poll = now + timedelta(seconds=POLL_S)
+
+    def _add_new_databases(self, today):
+        for db_path in self.fixed_db_paths or database.data_db_paths():
+            if db_path in self.db_paths:
+                continue
+            if self.fixed_db_paths is None and not os.path.exists(db_path):
+                continue # A shard assigned but not created yet; picked up by a later poll
+            try:
+                write_queue.execute(db_path, lambda conn: conn.execute(REMINDER_LOG_SQL))
+                conn = database.connect_readonly(db_path)
+                try:
+                    # Watermark first, so edits made while the window loads are not missed
+                    self._change_seq[db_path] = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                if self.fixed_db_paths is not None:
+                    raise
+                logger.warning("Skipping %s until the next poll: %s", db_path, e) # e.g. a new shard whose schema is still being created
+                continue
+            self.db_paths.append(db_path)
+            self._extend_window(db_path, today)
+
+    def _window_end(self, today):
+        return today + timedelta(days=DUE_SOON_DAYS + LOOKAHEAD_DAYS)
+
+    def _extend_window(self, db_path, today):
+        start = self._loaded_until.get(db_path, today - timedelta(days=OVERDUE_LOOKBACK_DAYS + 1))
+        end = self._window_end(today)
+        if start >= end:
+            return
+        conn = database.connect(db_path)
+        try:
+            last = (start.isoformat(), sys.maxsize) # Keyset pagination over the due_date index
+            while True:
+                rows = conn.execute(f"SELECT id, due_date FROM tasks WHERE (due_date, id) > (?, ?) AND due_date <= ? AND {OPEN_STATUS_FILTER} "
+                                    "ORDER BY due_date, id LIMIT ?", (*last, end.isoformat(), PAGE_ROWS)).fetchall()
+                for task_id, due_date in rows:
+                    self._schedule(db_path, task_id, due_date, today)
+                if len(rows) < PAGE_ROWS:
+                    break
+                last = (rows[-1][1], rows[-1][0])
+        finally:
+            conn.close()
+        self._loaded_until[db_path] = end
+
+    def _schedule(self, db_path, task_id, due_date, today):
+        due = _parse_date(due_date)
+        if due is None or self._scheduled.get((db_path, task_id)) == due:
+            return
+        self._scheduled[(db_path, task_id)] = due
+        if due >= today:
+            self._push(datetime.combine(due - timedelta(days=DUE_SOON_DAYS), time.min), db_path, task_id, 'due_soon', due)
+        self._push(datetime.combine(due + timedelta(days=1), time.min), db_path, task_id, 'overdue', due)
+
+    def _push(self, fire_at, db_path, task_id, kind, due):
+        heapq.heappush(self._heap, (fire_at, next(self._tie), db_path, task_id, kind, due))
+
+    def _poll_changes(self, db_path, today):
+        # Only projects whose tasks changed since the last poll are re-read
+        conn = database.connect(db_path)
+        try:
+            rows = conn.execute("SELECT seq, owner_id FROM change_log WHERE seq > ? AND kind = 'tasks' ORDER BY seq",
+                                (self._change_seq[db_path],)).fetchall()
+            if not rows:
+                return
+            self._change_seq[db_path] = rows[-1][0]
+            project_ids = sorted({owner_id for _, owner_id in rows})
+            since = (today - timedelta(days=OVERDUE_LOOKBACK_DAYS + 1)).isoformat()
+            for i in range(0, len(project_ids), 500):
+                chunk = project_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for task_id, due_date in conn.execute(
+                        f"SELECT id, due_date FROM tasks WHERE project_id IN ({placeholders}) AND due_date > ? AND due_date <= ? AND {OPEN_STATUS_FILTER}",
+                        (*chunk, since, self._loaded_until[db_path].isoformat())):
+                    self._schedule(db_path, task_id, due_date, today)
+        finally:
+            conn.close()
+
+    # Firing and delivery
+    def tick(self):
+        now = self.clock()
+        if now >= self._next_poll:
+            if self.fixed_db_paths is None:
+                self._add_new_databases(now.date()) # Shards created since the last poll
+            for db_path in self.db_paths:
+                self._poll_changes(db_path, now.date())
+                self._extend_window(db_path, now.date())
+            self._next_poll = now + timedelta(seconds=POLL_S)
+        self._fire_due(now)
+        if self._next_flush is not None and now >= self._next_flush:
+            self.flush()
+
+    def _fire_due(self, now):
+        fired = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, db_path, task_id, kind, due = heapq.heappop(self._heap)
+            fired.setdefault(db_path, []).append((task_id, kind, due))
+        for db_path, events in fired.items():
+            self._collect(db_path, events)
+        if self._pending and self._next_flush is None:
+            self._next_flush = now + timedelta(seconds=DIGEST_INTERVAL_S)
+
+    def _collect(self, db_path, events):
+        # Check the fired events against the current rows in one query per batch
+        task_ids = sorted({task_id for task_id, _, _ in events})
+        current, sent = {}, set()
+        conn = database.connect(db_path)
+        try:
+            for i in range(0, len(task_ids), 500):
+                chunk = task_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for row in conn.execute(f"SELECT t.id, t.task_name, t.status, t.due_date, t.assigned_to, p.project_name "
+                                        f"FROM tasks t JOIN projects p ON p.id = t.project_id "
+                                        f"WHERE t.id IN ({placeholders}) AND p.deleted_at IS NULL", chunk):
+                    current[row[0]] = row
+                sent.update(conn.execute(f"SELECT task_id, kind, due_date FROM reminder_log WHERE task_id IN ({placeholders})", chunk).fetchall())
+        finally:
+            conn.close()
+        for task_id, kind, due in events:
+            if kind == 'overdue' and self._scheduled.get((db_path, task_id)) == due:
+                del self._scheduled[(db_path, task_id)] # Last event for this due date
+            row = current.get(task_id)
+            if row is None or row[2] in ('Completed', 'Cancelled') or _parse_date(row[3]) != due:
+                continue # Deleted, archived, closed or rescheduled since it was queued
+            if (task_id, kind, due.isoformat()) in sent:
+                continue
+            assignee = row[4] or 'Unassigned'
+            self._pending.setdefault(assignee, {'due_soon': [], 'overdue': []})[kind].append({
+                'db_path': db_path, 'task_id': task_id, 'task_name': row[1],
+                'project_name': row[5], 'due_date': due.isoformat(),
+            })
+
+    def flush(self):
+        """Send one digest per assignee; failed digests stay queued for the next flush."""
+        pending, self._pending, self._next_flush = self._pending, {}, None
+        for assignee, items in pending.items():
+            digest = {'assignee': assignee, 'generated_at': self.clock().isoformat(timespec='seconds'),
+                      'due_soon': items['due_soon'], 'overdue': items['overdue']}
+            try:
+                self.sink.send(digest)
+            except Exception:
+                logger.exception("Could not deliver reminder digest for %s", assignee)
+                self._pending[assignee] = items
+                continue
+            self._record_sent(digest)
+        if self._pending:
+            self._next_flush = self.clock() + timedelta(seconds=DIGEST_INTERVAL_S)
+
+    def _record_sent(self, digest):
+        by_path = {}
+        for kind in ('due_soon', 'overdue'):
+            for item in digest[kind]:
+                by_path.setdefault(item['db_path'], []).append((item['task_id'], kind, item['due_date']))
+        for db_path, rows in by_path.items():
+            write_queue.execute(db_path, lambda conn, rows=rows: conn.executemany(
+                "INSERT OR IGNORE INTO reminder_log (task_id, kind, due_date) VALUES (?, ?, ?)", rows))
+
+    # Running
+    def _seconds_until_next(self):
+        now = self.clock()
+        wake = [self._next_poll] + ([self._heap[0][0]] if self._heap else []) + ([self._next_flush] if self._next_flush else [])
+        return max(0.05, (min(wake) - now).total_seconds())
+
+    def run(self):
+        self.start()
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Reminder scheduler tick failed")
+            self._stop.wait(self._seconds_until_next())
+        self.flush()
+
+    def run_once(self):
+        # Fire everything due now and deliver immediately (for cron)
+        self.start()
+        self.tick()
+        self.flush()
+
+    def stop(self):
+        self._stop.set()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+def start_background():
+    """Start the in-app scheduler thread once per process when PROJECT_TRACKER_REMINDERS=1."""
+    global _background
+    if not REMINDERS_ENABLED:
+        return None
+    with _background_lock:
+        if _background is None:
+            _background = ReminderScheduler(make_sink(SINK_SPEC))
+            threading.Thread(target=_background.run, name='due-date-reminders', daemon=True).start()
+    return _background
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send due-soon and overdue task reminders.")
+    parser.add_argument('--db', help="Main database (default: PROJECT_TRACKER_DB or project_tracker.db)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help="Run the scheduler")
+    run_parser.add_argument('--sink', default=SINK_SPEC, help="log, file:PATH, smtp://HOST:PORT or webhook:URL")
+    run_parser.add_argument('--once', action='store_true', help="Send what is due now and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if args.db:
+        database.DB_NAME = args.db
+    database.init_db()
+    scheduler = ReminderScheduler(make_sink(args.sink))
+    if args.once:
+        scheduler.run_once()
+    else:
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
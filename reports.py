@@ -0,0 +1,290 @@
+import streamlit as st
+import pandas as pd
+import base64
+import io
+from datetime import date, datetime
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import plotly.express as px # For visualizations
+import plotly.graph_objects as go
+
+from database import get_db_connection, get_archive_connection, get_tasks_by_project
+import analytics
+import critical_path
+import evm
+import snapshots
+
+def generate_project_report_html(project_id, user_id, archived=False): # user_id currently unused, consider if needed
+    conn = None
+    try:
+        conn = get_archive_connection() if archived else get_db_connection()
+        # Fetch project data into a DataFrame first
+        project_df = pd.read_sql_query("SELECT * FROM projects WHERE id = ?", conn, params=(project_id,))
+
+        if project_df.empty:
+            st.error(f"Error: Project with ID {project_id} not found.")
+            return None # Or return an empty HTML string
+
+        project_data = project_df.iloc[0] # Now it's safe to access iloc[0]
+    except Exception as e:
+        st.error(f"Database error while fetching project: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+    tasks_df = get_tasks_by_project(project_id, archived=archived) # This function now includes 'Is Overdue'
+
+    # Project Summary
+    html_content = f"<h1>Project Report: {project_data['project_name']}</h1>"
+    html_content += f"<p><strong>Description:</strong> {project_data['description']}</p>"
+    html_content += f"<p><strong>Start Date:</strong> {project_data['start_date']}</p>"
+    html_content += f"<p><strong>End Date:</strong> {project_data['end_date']}</p>"
+    html_content += f"<p><strong>Budget:</strong> ${project_data['budget']:,.2f}</p>" # Corrected formatting
+    if archived:
+        html_content += f"<p><strong>Archived:</strong> {project_data['archived_at']}</p>"
+
+    html_content += "<h2>Task Overview</h2>"
+    if not tasks_df.empty:
+        summary = analytics.task_summary(project_id, archived) # Aggregated in SQL, see analytics.py
+        html_content += f"<p><strong>Overall Project Progress:</strong> {summary['progress_percentage'] or 0:.1f}%</p>"
+        html_content += f"<p><strong>Total Tasks:</strong> {summary['total_tasks']}</p>"
+        html_content += f"<p><strong>Completed Tasks:</strong> {summary['completed_tasks']}</p>"
+        html_content += f"<p><strong>Overdue Tasks:</strong> <span style='color:red;'>{summary['overdue_tasks']}</span></p>"
+
+        display_tasks_df = tasks_df[['Task No.', 'task_name', 'status', 'task_priority', 'progress_percentage', 'assigned_to', 'due_date', 'Is Overdue']].copy()
+        display_tasks_df['due_date'] = display_tasks_df['due_date'].dt.strftime('%Y-%m-%d')
+
+        # Convert 'Is Overdue' boolean to 'Yes'/'No' for display BEFORE to_html
+        # This makes the string replacement more targeted and robust.
+        display_tasks_df['Is Overdue'] = display_tasks_df['Is Overdue'].map({True: 'Yes', False: 'No'})
+
+        styled_html_table = display_tasks_df.to_html(index=False, classes='tasks-table', escape=False)
+        
+        # Apply styling:
+        # Style header
+        styled_html_table = styled_html_table.replace('<th>Is Overdue</th>', '<th style="color:red;">Is Overdue</th>')
+        # Style 'Yes' cells in 'Is Overdue' column
+        # Now we replace based on the content 'Yes' which is more specific than 'True'
+        styled_html_table = styled_html_table.replace('<td>Yes</td>', '<td style="color:red; font-weight:bold;">Yes</td>')
+        # 'No' cells don't need specific styling beyond the default, but this ensures consistency if you wanted to style them too.
+        # styled_html_table = styled_html_table.replace('<td>No</td>', '<td>No</td>') # This line is effectively a no-op if 'No' is already the string
+
+        html_content += styled_html_table
+
+        # Critical path (see critical_path.py)
+        schedule_df, schedule = critical_path.schedule_frame(project_id, project_data['start_date'], archived)
+        html_content += "<h2>Critical Path</h2>"
+        html_content += f"<p><strong>Critical Path ({schedule.finish} days):</strong> {critical_path.critical_path_label(schedule_df)}</p>"
+        schedule_html_df = schedule_df[['Task No.', 'task_name', 'duration_days', 'predecessors', 'early_start', 'early_finish', 'late_start', 'total_float']].copy()
+        for column in ('early_start', 'early_finish', 'late_start'):
+            schedule_html_df[column] = schedule_html_df[column].dt.strftime('%Y-%m-%d')
+        html_content += schedule_html_df.to_html(index=False, classes='tasks-table')
+
+        # Earned value (see evm.py)
+        evm_result = evm.project_evm(project_id, archived)
+        project_evm = evm_result['portfolio'].iloc[0]
+        html_content += "<h2>Earned Value</h2>"
+        html_content += (f"<p><strong>BAC:</strong> ${project_evm['BAC']:,.2f} &nbsp; <strong>PV:</strong> ${project_evm['PV']:,.2f} &nbsp; "
+                         f"<strong>EV:</strong> ${project_evm['EV']:,.2f} &nbsp; <strong>AC:</strong> ${project_evm['AC']:,.2f}</p>")
+        cpi, spi = ('—' if pd.isna(project_evm[index]) else f"{project_evm[index]:.2f}" for index in ('CPI', 'SPI'))
+        html_content += (f"<p><strong>CPI:</strong> {cpi} &nbsp; <strong>SPI:</strong> {spi} &nbsp; "
+                         f"<strong>EAC:</strong> ${project_evm['EAC']:,.2f} &nbsp; <strong>VAC:</strong> ${project_evm['VAC']:,.2f}</p>")
+        evm_html_df = evm_result['tasks'][['task_name', 'BAC', 'PV', 'EV', 'AC', 'CPI', 'SPI', 'EAC']]
+        html_content += evm_html_df.to_html(index=False, classes='tasks-table', float_format='{:,.2f}'.format, na_rep='—')
+
+        html_content += """
+        <style>
+            .tasks-table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+            .tasks-table th, .tasks-table td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+            .tasks-table th { background-color: #f2f2f2; }
+            /* .overdue-task { background-color: #ffdddd; } */ /* Class defined but not used yet */
+        </style>
+        """
+
+        # Add Visualizations
+        html_content += "<h2>Visualizations</h2>"
+        try:
+            # Task Status Distribution
+            status_counts = analytics.status_counts(project_id, archived).to_pandas()
+            fig_status = px.pie(status_counts, values='Count', names='Status',
+                                title='Tasks by Status',
+                                color_discrete_sequence=px.colors.sequential.RdBu)
+            img_bytes_status = fig_status.to_image(format="png") # Requires kaleido
+            encoded_img_status = base64.b64encode(img_bytes_status).decode('utf-8')
+            html_content += f"<img src='data:image/png;base64,{encoded_img_status}' style='width: 100%; max-width: 600px; display: block; margin: 10px auto;'><br>"
+
+            # Task Priority Distribution
+            priority_counts = analytics.priority_counts(project_id, archived).to_pandas()
+            fig_priority = px.bar(priority_counts, x='Priority', y='Count',
+                                title='Tasks by Priority',
+                                labels={'Priority': 'Task Priority', 'Count': 'Number of Tasks'},
+                                color='Priority',
+                                category_orders={"Priority": ["High", "Medium", "Low"]},
+                                color_discrete_map={"High": "red", "Medium": "orange", "Low": "green"})
+            img_bytes_priority = fig_priority.to_image(format="png") # Requires kaleido
+            encoded_img_priority = base64.b64encode(img_bytes_priority).decode('utf-8')
+            html_content += f"<img src='data:image/png;base64,{encoded_img_priority}' style='width: 100%; max-width: 600px; display: block; margin: 10px auto;'><br>"
+
+            # Burndown and S-curve from the daily progress snapshots (see snapshots.py)
+            curve_start = pd.to_datetime(project_data['start_date'], errors='coerce')
+            curve_end = pd.Timestamp.today().normalize() if not archived else pd.to_datetime(project_data['archived_at'])
+            if pd.notna(curve_start) and curve_start <= curve_end:
+                curve = snapshots.progress_curve(project_id, curve_start, curve_end, archived)
+                for fig in progress_charts(curve, project_data['start_date'], project_data['end_date']):
+                    encoded_img = base64.b64encode(fig.to_image(format="png")).decode('utf-8')
+                    html_content += f"<img src='data:image/png;base64,{encoded_img}' style='width: 100%; max-width: 600px; display: block; margin: 10px auto;'><br>"
+        except Exception as e:
+            st.warning(f"Could not generate visualizations. Ensure 'kaleido' is installed (pip install kaleido). Error: {e}")
+            html_content += "<p><em>Visualizations could not be generated.</em></p>"
+    else:
+        html_content += "<p>No tasks found for this project.</p>"
+
+    return html_content
+
+
+def progress_charts(curve, project_start=None, project_end=None):
+    """Burndown (remaining %, with the ideal line from project start to end) and S-curve (progress %) figures."""
+    burndown = go.Figure(go.Scatter(x=curve.index, y=curve['remaining'], mode='lines', name='Remaining'))
+    ideal_start, ideal_end = pd.to_datetime(project_start, errors='coerce'), pd.to_datetime(project_end, errors='coerce')
+    if pd.notna(ideal_start) and pd.notna(ideal_end) and ideal_start < ideal_end:
+        burndown.add_trace(go.Scatter(x=[ideal_start, ideal_end], y=[100, 0], mode='lines', name='Ideal', line={'dash': 'dash'}))
+    burndown.update_layout(title='Burndown', xaxis_title='Date', yaxis_title='Remaining work (%)', yaxis_range=[0, 100])
+
+    s_curve = px.area(curve.reset_index(), x='date', y='progress', title='S-Curve (Cumulative Progress)',
+                      labels={'date': 'Date', 'progress': 'Average progress (%)'})
+    s_curve.update_layout(yaxis_range=[0, 100])
+    return burndown, s_curve
+
+
+def generate_pdf_from_html(html_content, filename="report.pdf"): # filename not used by weasyprint here
+    try:
+        from weasyprint import HTML
+        # You can also pass a CSS stylesheet to WeasyPrint if you have external CSS
+        # from weasyprint import CSS
+        # css = CSS(string=''' @page { size: A4; margin: 1in; } ''')
+        # pdf_bytes = HTML(string=html_content).write_pdf(stylesheets=[css])
+        pdf_bytes = HTML(string=html_content).write_pdf()
+        return pdf_bytes
+    except ImportError:
+        st.error("WeasyPrint library not found. Please install it (`pip install weasyprint`) to generate PDFs.")
+        st.info("You can still view the HTML preview below.")
+        return None
+    except Exception as e:
+        st.error(f"Error generating PDF with WeasyPrint: {e}")
+        return None
+
+
+# --- Table exports (pyarrow Tables from database.get_tasks_table) ---
+def export_csv_bytes(table):
+    buffer = io.BytesIO()
+    pa_csv.write_csv(table, buffer)
+    return buffer.getvalue()
+
+def export_parquet_bytes(table):
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
+
+
+# --- Excel export (streamed from the database, one sheet per project) ---
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_COLUMNS = [ # (header, width)
+    ('Task No.', 9), ('Task Name', 40), ('Status', 14), ('Priority', 10), ('Progress (%)', 12),
+    ('Assigned To', 22), ('Due Date', 12), ('Duration (days)', 15), ('Actual Cost', 14), ('Is Overdue', 11),
+]
+
+def _sheet_name(number, project_name, used):
+    # Excel: at most 31 characters, no []:*?/\ and unique per workbook (case-insensitive)
+    name = ''.join('_' if ch in '[]:*?/\\' else ch for ch in f"{number}. {project_name}")[:31]
+    while name.lower() in used:
+        name = f"{name[:27]}~{len(used)}"
+    used.add(name.lower())
+    return name
+
+def write_tasks_xlsx(output, project_ids, archived=False):
+    """Write the projects' tasks to an .xlsx (path or file object), one sheet each; returns the number of task rows.
+
+    xlsxwriter's constant_memory mode flushes every row to a temporary file as
+    soon as the next one starts, and rows come straight from one cursor over all
+    the projects, so memory use doesn't grow with the number of tasks.
+    """
+    import xlsxwriter # Optional dependency
+
+    conn = get_archive_connection() if archived else get_db_connection()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    try:
+        header = workbook.add_format({'bold': True, 'bg_color': '#f2f2f2', 'border': 1})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        money_format = workbook.add_format({'num_format': '#,##0.00'})
+        # Same light red as the Tasks page table
+        overdue = workbook.add_format({'bg_color': '#ffcccc'})
+        overdue_date = workbook.add_format({'bg_color': '#ffcccc', 'num_format': 'yyyy-mm-dd'})
+        overdue_money = workbook.add_format({'bg_color': '#ffcccc', 'num_format': '#,##0.00'})
+
+        placeholders = ','.join('?' * len(project_ids))
+        names = dict(conn.execute(f"SELECT id, project_name FROM projects WHERE id IN ({placeholders})", list(project_ids)).fetchall())
+        sheets, used = {}, set()
+        for number, project_id in enumerate(project_ids, start=1): # Sheets in the order given
+            if project_id not in names:
+                continue
+            sheet = workbook.add_worksheet(_sheet_name(number, names[project_id], used))
+            for col, (title, width) in enumerate(XLSX_COLUMNS):
+                sheet.set_column(col, col, width)
+                sheet.write(0, col, title, header)
+            sheet.freeze_panes(1, 0)
+            sheets[project_id] = [sheet, 0] # worksheet, last row written
+
+        today = datetime.now().date()
+        cursor = conn.execute(
+            "SELECT project_id, task_name, status, task_priority, progress_percentage, assigned_to, due_date, duration_days, actual_cost "
+            f"FROM tasks WHERE project_id IN ({placeholders}) ORDER BY project_id, id", list(project_ids))
+        rows_written = 0
+        for project_id, name, status, priority, progress, assigned_to, due, duration, actual_cost in cursor:
+            entry = sheets[project_id]
+            sheet, row = entry[0], entry[1] + 1
+            entry[1] = row
+            try:
+                due_date = date.fromisoformat(str(due)[:10]) if due else None
+            except ValueError:
+                due_date = None # Unparseable dates are written as text
+            is_overdue = due_date is not None and due_date < today and status not in ('Completed', 'Cancelled')
+            row_format = overdue if is_overdue else None
+            sheet.write_number(row, 0, row) # Task No.: position within the project, as in the app
+            sheet.write(row, 1, name, row_format)
+            sheet.write(row, 2, status, row_format)
+            sheet.write(row, 3, priority, row_format)
+            sheet.write(row, 4, progress, row_format)
+            sheet.write(row, 5, assigned_to, row_format)
+            if due_date is not None:
+                sheet.write_datetime(row, 6, due_date, overdue_date if is_overdue else date_format)
+            else:
+                sheet.write(row, 6, due, row_format)
+            sheet.write(row, 7, duration, row_format)
+            sheet.write(row, 8, actual_cost, overdue_money if is_overdue else money_format)
+            sheet.write_string(row, 9, 'Yes' if is_overdue else 'No', row_format)
+            rows_written += 1
+        for sheet, last_row in sheets.values():
+            sheet.autofilter(0, 0, max(last_row, 1), len(XLSX_COLUMNS) - 1)
+    finally:
+        workbook.close()
+        conn.close()
+    return rows_written
+
+def export_xlsx_file(path, project_ids, archived=False):
+    # Streams the workbook to disk, so nothing the size of the workbook stays in memory
+    try:
+        write_tasks_xlsx(path, project_ids, archived)
+    except ImportError:
+        st.error("XlsxWriter library not found. Please install it (`pip install XlsxWriter`) to export Excel workbooks.")
+        return False
+    return True
+
+def export_xlsx_bytes(project_ids, archived=False):
+    buffer = io.BytesIO()
+    try:
+        write_tasks_xlsx(buffer, project_ids, archived)
+    except ImportError:
+        st.error("XlsxWriter library not found. Please install it (`pip install XlsxWriter`) to export Excel workbooks.")
+        return None
+    return buffer.getvalue()
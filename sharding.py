@@ -0,0 +1,137 @@
+"""Per-tenant shard management for PROJECT_TRACKER_STORAGE=sharded.
+
+In sharded mode the main database (PROJECT_TRACKER_DB) keeps the users table and
+the `shards` catalogue, and each tenant's projects and tasks live in
+PROJECT_TRACKER_SHARD_DIR/<shard_name>.db. By default every user gets their own
+shard; users of one organisation can share a shard via --org-map.
+
+    python sharding.py migrate [--org-map orgs.csv] [--purge-source]
+    python sharding.py assign USER_ID SHARD_NAME
+    python sharding.py status
+
+`migrate` splits an existing monolithic database: rows are copied with their ids,
+each shard is verified by row count, and the original rows are only deleted from
+the main database with --purge-source. Run it while the app is stopped.
+"""
+import argparse
+import csv
+import os
+import sys
+
+import database
+import write_queue
+
+
+def load_org_map(path):
+    # CSV with user_id,shard_name rows (header optional)
+    mapping = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0].strip().isdigit():
+                mapping[int(row[0])] = row[1].strip()
+    return mapping
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def migrate(org_map=None, purge_source=False, out=sys.stdout):
+    """Copy every user's projects and tasks from the main database into their shard."""
+    org_map = org_map or {}
+    database.init_db()
+    catalog = database.get_catalog_connection()
+    users = catalog.execute("SELECT id, username FROM users ORDER BY id").fetchall()
+    catalog.close()
+
+    shards = {} # shard_name -> [user ids]
+    for user_id, _ in users:
+        shards.setdefault(org_map.get(user_id, f"user_{user_id}"), []).append(user_id)
+
+    source = os.path.abspath(database.DB_NAME)
+    for shard_name, user_ids in shards.items():
+        path = database.shard_path(shard_name)
+        database.ensure_shard(path)
+        placeholders = ','.join('?' * len(user_ids))
+
+        def copy(conn): # One writer-queue operation (one transaction) per shard, with the source attached
+            conn.execute(f"INSERT OR IGNORE INTO users (id, username, password) SELECT id, username, '' FROM src.users WHERE id IN ({placeholders})", user_ids)
+            # Only columns present on both sides, so databases created by older versions still migrate
+            project_cols = ', '.join(c for c in _columns(conn, 'main', 'projects') if c in _columns(conn, 'src', 'projects'))
+            task_cols = [c for c in _columns(conn, 'main', 'tasks') if c in _columns(conn, 'src', 'tasks')]
+            conn.execute(f"INSERT OR REPLACE INTO projects ({project_cols}) SELECT {project_cols} FROM src.projects WHERE user_id IN ({placeholders})", user_ids)
+            conn.execute(f"INSERT OR REPLACE INTO tasks ({', '.join(task_cols)}) SELECT {', '.join('t.' + c for c in task_cols)} "
+                         f"FROM src.tasks t JOIN src.projects p ON p.id = t.project_id WHERE p.user_id IN ({placeholders})", user_ids)
+            conn.execute(f"INSERT OR IGNORE INTO task_dependencies (predecessor_id, successor_id) SELECT d.predecessor_id, d.successor_id "
+                         f"FROM src.task_dependencies d JOIN src.tasks t ON t.id = d.successor_id JOIN src.projects p ON p.id = t.project_id "
+                         f"WHERE p.user_id IN ({placeholders})", user_ids)
+            conn.execute(f"INSERT OR IGNORE INTO progress_snapshots (task_id, day, progress) SELECT s.task_id, s.day, s.progress "
+                         f"FROM src.progress_snapshots s JOIN src.tasks t ON t.id = s.task_id JOIN src.projects p ON p.id = t.project_id "
+                         f"WHERE p.user_id IN ({placeholders})", user_ids)
+            source_counts = conn.execute(f"SELECT (SELECT COUNT(*) FROM src.projects WHERE user_id IN ({placeholders})), "
+                                         f"(SELECT COUNT(*) FROM src.tasks t JOIN src.projects p ON p.id = t.project_id WHERE p.user_id IN ({placeholders}))",
+                                         user_ids + user_ids).fetchone()
+            shard_counts = conn.execute(f"SELECT (SELECT COUNT(*) FROM projects WHERE user_id IN ({placeholders})), "
+                                        f"(SELECT COUNT(*) FROM tasks t JOIN projects p ON p.id = t.project_id WHERE p.user_id IN ({placeholders}))",
+                                        user_ids + user_ids).fetchone()
+            return source_counts, shard_counts
+        source_counts, shard_counts = write_queue.execute(path, copy, attach={'src': source})
+        if source_counts != shard_counts:
+            raise RuntimeError(f"Shard {shard_name} verification failed: source {source_counts} != shard {shard_counts}")
+
+        for user_id in user_ids:
+            database.assign_shard(user_id, shard_name)
+        print(f"{shard_name}: users {user_ids}, {shard_counts[0]} projects, {shard_counts[1]} tasks -> {path}", file=out)
+
+        if purge_source:
+            def purge(catalog):
+                catalog.execute(f"DELETE FROM tasks WHERE project_id IN (SELECT id FROM projects WHERE user_id IN ({placeholders}))", user_ids)
+                catalog.execute(f"DELETE FROM projects WHERE user_id IN ({placeholders})", user_ids)
+            write_queue.execute(database.DB_NAME, purge)
+    return shards
+
+
+def status(out=sys.stdout):
+    database.init_db()
+    conn = database.get_catalog_connection()
+    rows = conn.execute("SELECT s.shard_name, COUNT(*), GROUP_CONCAT(u.username, ', ') FROM shards s JOIN users u ON u.id = s.user_id GROUP BY s.shard_name ORDER BY s.shard_name").fetchall()
+    unassigned = conn.execute("SELECT COUNT(*) FROM users WHERE id NOT IN (SELECT user_id FROM shards)").fetchone()[0]
+    conn.close()
+    for shard_name, user_count, usernames in rows:
+        path = database.shard_path(shard_name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        print(f"{shard_name:<24} {user_count:>4} users  {size / 1024:10.1f} KiB  {usernames}", file=out)
+    print(f"{unassigned} users without a shard (assigned on first use)", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage per-tenant database shards.")
+    parser.add_argument('--db', help="Main database (default: PROJECT_TRACKER_DB or project_tracker.db)")
+    parser.add_argument('--shard-dir', help="Shard directory (default: PROJECT_TRACKER_SHARD_DIR or shards)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = sub.add_parser('migrate', help="Split the main database into shards")
+    migrate_parser.add_argument('--org-map', help="CSV of user_id,shard_name to group users into organisation shards")
+    migrate_parser.add_argument('--purge-source', action='store_true', help="Delete migrated rows from the main database")
+    assign_parser = sub.add_parser('assign', help="Map a user to a shard (existing rows are not moved; run migrate for that)")
+    assign_parser.add_argument('user_id', type=int)
+    assign_parser.add_argument('shard_name')
+    sub.add_parser('status', help="List shards")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.DB_NAME = args.db
+    if args.shard_dir:
+        database.SHARD_DIR = args.shard_dir
+
+    if args.command == 'migrate':
+        migrate(load_org_map(args.org_map) if args.org_map else None, args.purge_source)
+    elif args.command == 'assign':
+        database.init_db()
+        print(database.assign_shard(args.user_id, args.shard_name))
+    else:
+        status()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
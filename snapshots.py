@@ -0,0 +1,157 @@
+"""Daily task progress snapshots for burndown charts and S-curves.
+
+Once a day each task's progress_percentage is compared with its latest snapshot
+and a row is written to progress_snapshots only when it changed (delta
+encoding), keyed by integers: (task_id, day), day being days since 1970-01-01.
+A task's progress on any day is its latest snapshot on or before that day.
+
+progress_curve() rebuilds a project's daily progress for a date range from the
+state at the start of the range plus the deltas inside it, with today's point
+taken from the live tasks table.
+
+The app queues the day's snapshot on the database's writer thread (see
+write_queue.py) the first time the database is used each day, so no rerun waits
+for it; a failed snapshot is logged and retried by a later rerun. A cron job
+can take it for every database (main and shards) instead:
+
+    python snapshots.py run [--day YYYY-MM-DD]
+"""
+import argparse
+import logging
+import sys
+import threading
+from datetime import date
+
+import pandas as pd
+
+import database
+import write_queue
+
+EPOCH = date(1970, 1, 1)
+
+logger = logging.getLogger('project_tracker.snapshots')
+
+
+def to_day(value):
+    return (pd.Timestamp(value).date() - EPOCH).days
+
+
+def _snapshot(conn, day):
+    # Write-queue operation; the latest snapshot on or before day comes from the (task_id, day) primary key, one seek per task
+    cursor = conn.execute('''
+        INSERT OR REPLACE INTO progress_snapshots (task_id, day, progress)
+        SELECT id, ?, progress FROM (
+            SELECT t.id, COALESCE(t.progress_percentage, 0) AS progress,
+                   (SELECT s.progress FROM progress_snapshots s
+                    WHERE s.task_id = t.id AND s.day <= ? ORDER BY s.day DESC LIMIT 1) AS last_progress
+            FROM tasks t
+        ) WHERE last_progress IS NULL OR last_progress != progress''', (day, day))
+    return cursor.rowcount
+
+
+def take_snapshot(db_path=None, day=None):
+    """Record progress for tasks that changed since their latest snapshot; returns the number of rows written."""
+    day = to_day(day or date.today())
+    return write_queue.execute(db_path or database.resolve_db_path(), lambda conn: _snapshot(conn, day))
+
+
+_snapshot_days = {} # db path -> last day this process snapshotted successfully
+_snapshot_running = set() # db paths with a snapshot queued or running
+_snapshot_lock = threading.Lock()
+
+def snapshot_if_due(db_path=None):
+    """Queue today's snapshot unless this process already took it; returns the Future, or None if not due.
+
+    Cheap enough to call on every rerun. The snapshot runs on the database's writer
+    thread, never in the calling rerun, and a failure only gets logged.
+    """
+    db_path = db_path or database.resolve_db_path()
+    today = date.today()
+    with _snapshot_lock:
+        if _snapshot_days.get(db_path) == today or db_path in _snapshot_running:
+            return None
+        _snapshot_running.add(db_path)
+    day = to_day(today)
+    future = write_queue.submit(db_path, lambda conn: _snapshot(conn, day))
+    future.add_done_callback(lambda done: _snapshot_finished(db_path, today, done))
+    return future
+
+
+def _snapshot_finished(db_path, today, future):
+    error = future.exception()
+    with _snapshot_lock:
+        _snapshot_running.discard(db_path)
+        if error is None: # Only a committed snapshot counts; after a failure the next rerun retries
+            _snapshot_days[db_path] = today
+    if error is None:
+        logger.info("%s: %d task(s) changed on %s", db_path, future.result(), today)
+    else:
+        logger.error("Snapshot of %s for %s failed: %s", db_path, today, error)
+
+
+def progress_curve(project_id, start, end, archived=False):
+    """Daily project progress over [start, end]: columns tasks, progress (average %) and remaining (100 - progress)."""
+    start_day, end_day = to_day(start), to_day(end)
+    today = to_day(date.today())
+    db_path = database.archive_path() if archived else database.resolve_db_path()
+    conn = database.connect(db_path)
+    try:
+        # State at start_day (latest snapshot per task) plus the deltas inside the range
+        rows = pd.read_sql_query('''
+            SELECT task_id, ? AS day, progress FROM (
+                SELECT t.id AS task_id,
+                       (SELECT s.progress FROM progress_snapshots s
+                        WHERE s.task_id = t.id AND s.day <= ? ORDER BY s.day DESC LIMIT 1) AS progress
+                FROM tasks t WHERE t.project_id = ?
+            ) WHERE progress IS NOT NULL
+            UNION ALL
+            SELECT s.task_id, s.day, s.progress
+            FROM progress_snapshots s JOIN tasks t ON t.id = s.task_id
+            WHERE t.project_id = ? AND s.day > ? AND s.day <= ?''', conn,
+            params=(start_day, start_day, project_id, project_id, start_day, end_day))
+        if start_day <= today <= end_day: # Today's point reflects edits made since the snapshot
+            live = pd.read_sql_query("SELECT id AS task_id, ? AS day, COALESCE(progress_percentage, 0) AS progress "
+                                     "FROM tasks WHERE project_id = ?", conn, params=(today, project_id))
+            rows = pd.concat([rows, live], ignore_index=True)
+    finally:
+        conn.close()
+    return _curve(rows, start_day, end_day)
+
+
+def _curve(rows, start_day, end_day):
+    days = pd.RangeIndex(start_day, end_day + 1)
+    if rows.empty:
+        totals = pd.DataFrame({'tasks': 0, 'progress_sum': 0.0}, index=days)
+    else:
+        rows = rows.sort_values(['task_id', 'day'], kind='stable').drop_duplicates(['task_id', 'day'], keep='last')
+        previous = rows.groupby('task_id')['progress'].shift()
+        # Each row changes the project's running sum by its delta; a task's first row also adds it to the count
+        rows = rows.assign(delta=rows['progress'] - previous.fillna(0), added=previous.isna().astype('int64'))
+        per_day = rows.groupby('day')[['added', 'delta']].sum()
+        totals = per_day.reindex(days, fill_value=0).cumsum().rename(columns={'added': 'tasks', 'delta': 'progress_sum'})
+    curve = pd.DataFrame(index=pd.DatetimeIndex(pd.to_datetime(days.to_numpy(), unit='D'), name='date'))
+    curve['tasks'] = totals['tasks'].to_numpy()
+    curve['progress'] = (totals['progress_sum'] / totals['tasks'].where(totals['tasks'] > 0)).to_numpy()
+    curve['remaining'] = 100 - curve['progress']
+    return curve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record daily task progress snapshots.")
+    parser.add_argument('--db', help="Main database (default: PROJECT_TRACKER_DB or project_tracker.db)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help="Snapshot every database (main and shards)")
+    run_parser.add_argument('--day', type=date.fromisoformat, help="Day to record (default: today)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if args.db:
+        database.DB_NAME = args.db
+    database.init_db()
+    for db_path in database.data_db_paths():
+        logger.info("%s: %d task(s) changed", db_path, take_snapshot(db_path, args.day))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""Project snapshots for moving a project between tracker instances.
+
+A snapshot is line-delimited JSON (NDJSON), one record per line, in this order:
+
+    {"type": "header", "format": "project-tracker-snapshot", "schema_version": 1, ...}
+    {"type": "project", "id": 7, "project_name": ..., ...}
+    {"type": "task", "id": 120, ...}                          one per task, by id
+    {"type": "dependency", "predecessor_id": 120, "successor_id": 121}
+    {"type": "progress", "task_id": 120, "day": 20300, "progress": 40}
+    {"type": "footer", "tasks": 2, "dependencies": 1, "progress": 1}
+
+Ids are the source instance's. Export streams rows from a cursor straight to
+the output. Import runs as one operation on the database's writer thread (see
+write_queue.py), so it commits or rolls back as a whole: tasks are bulk-inserted
+under new ids reserved up front, and the old -> new mapping is kept in a temporary table
+so dependencies and progress history can be remapped without holding the
+project in memory. Columns missing on either side are skipped, so instances on
+slightly different schema versions can still exchange projects.
+
+    python transfer.py export PROJECT_ID OUT.ndjson [--archived] [--user USERNAME]
+    python transfer.py import IN.ndjson --user USERNAME
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+import database
+import write_queue
+
+FORMAT = 'project-tracker-snapshot'
+SCHEMA_VERSION = 1
+BATCH_ROWS = 1000
+# Instance-local state that doesn't travel with a project
+SKIPPED_PROJECT_COLUMNS = {'id', 'user_id', 'deleted_at', 'archived_at'}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _dump(output, record):
+    output.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def export_project(project_id, output, archived=False, user_id=None):
+    """Write a project's snapshot to a text file object; returns the footer counts.
+
+    user_id picks the owner's shard in sharded storage mode (default: the current tenant).
+    """
+    conn = database.get_archive_connection() if archived else database.get_db_connection(user_id)
+    try:
+        project_columns = [c for c in _columns(conn, 'projects') if c not in SKIPPED_PROJECT_COLUMNS - {'id'}]
+        project = conn.execute(f"SELECT {', '.join(project_columns)} FROM projects WHERE id = ?", (project_id,)).fetchone()
+        if project is None:
+            raise SnapshotError(f"Project {project_id} not found")
+        _dump(output, {'type': 'header', 'format': FORMAT, 'schema_version': SCHEMA_VERSION,
+                       'exported_at': datetime.now(timezone.utc).isoformat()})
+        _dump(output, dict(zip(project_columns, project), type='project'))
+
+        counts = {'tasks': 0, 'dependencies': 0, 'progress': 0}
+        task_columns = [c for c in _columns(conn, 'tasks') if c != 'project_id']
+        for row in conn.execute(f"SELECT {', '.join(task_columns)} FROM tasks WHERE project_id = ? ORDER BY id", (project_id,)):
+            _dump(output, dict(zip(task_columns, row), type='task'))
+            counts['tasks'] += 1
+        for predecessor_id, successor_id in conn.execute(
+                "SELECT d.predecessor_id, d.successor_id FROM task_dependencies d JOIN tasks t ON t.id = d.successor_id "
+                "WHERE t.project_id = ? ORDER BY d.predecessor_id, d.successor_id", (project_id,)):
+            _dump(output, {'type': 'dependency', 'predecessor_id': predecessor_id, 'successor_id': successor_id})
+            counts['dependencies'] += 1
+        for task_id, day, progress in conn.execute(
+                "SELECT s.task_id, s.day, s.progress FROM progress_snapshots s JOIN tasks t ON t.id = s.task_id "
+                "WHERE t.project_id = ? ORDER BY s.task_id, s.day", (project_id,)):
+            _dump(output, {'type': 'progress', 'task_id': task_id, 'day': day, 'progress': progress})
+            counts['progress'] += 1
+        _dump(output, dict(counts, type='footer'))
+        return counts
+    finally:
+        conn.close()
+
+
+REQUIRED_KEYS = {
+    'task': ('id',),
+    'dependency': ('predecessor_id', 'successor_id'),
+    'progress': ('task_id', 'day', 'progress'),
+}
+
+
+def _records(lines):
+    # (line number, record) pairs
+    lines, number = iter(lines), 0
+    while True:
+        try:
+            line = next(lines, None)
+        except UnicodeDecodeError as e: # A text stream decodes a chunk ahead of the line it returns
+            raise SnapshotError(f"Line {number + 1} or a later one is not valid UTF-8: {e}")
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError as e:
+                raise SnapshotError(f"Line {number + 1} is not valid UTF-8: {e}")
+        if line is None:
+            return
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise SnapshotError(f"Line {number} is not valid JSON: {e}")
+        if not isinstance(record, dict):
+            raise SnapshotError(f"Line {number} is not a JSON object")
+        missing = [key for key in REQUIRED_KEYS.get(record.get('type'), ()) if key not in record]
+        if missing:
+            raise SnapshotError(f"Line {number}: {record['type']} record has no {', '.join(missing)}")
+        yield number, record
+
+
+class _Reader:
+    """Snapshot records with one record of look-ahead, read in batches of one type."""
+
+    def __init__(self, records):
+        self.records = records
+        self.ahead = next(records, None) # (line number, record)
+
+    def next(self):
+        item, self.ahead = self.ahead, next(self.records, None)
+        return item[1] if item else None
+
+    def batch(self, record_type):
+        # Up to BATCH_ROWS consecutive (line number, record) pairs of record_type; empty once the section ends
+        batch = []
+        while self.ahead is not None and self.ahead[1].get('type') == record_type and len(batch) < BATCH_ROWS:
+            batch.append(self.ahead)
+            self.next()
+        return batch
+
+
+def _check_mapped(conn, batch, keys):
+    # Every task a dependency or progress record refers to must have been in the snapshot
+    old_ids = {record[key] for _, record in batch for key in keys}
+    placeholders = ', '.join('?' * len(old_ids))
+    mapped = {row[0] for row in conn.execute(f"SELECT old_id FROM temp.task_id_map WHERE old_id IN ({placeholders})", list(old_ids))}
+    for number, record in batch:
+        for key in keys:
+            if record[key] not in mapped:
+                raise SnapshotError(f"Line {number}: {record['type']} record refers to task {record[key]!r}, which is not in the snapshot")
+
+
+def import_project(lines, user_id):
+    """Create a project for user_id from snapshot lines (text or bytes); returns the new project id.
+
+    Everything happens in one write-queue operation: a truncated or invalid snapshot leaves the database unchanged.
+    """
+    reader = _Reader(_records(lines))
+    header = reader.next()
+    if not header or header.get('type') != 'header' or header.get('format') != FORMAT:
+        raise SnapshotError("Not a project tracker snapshot")
+    if header.get('schema_version', 0) > SCHEMA_VERSION:
+        raise SnapshotError(f"Snapshot schema version {header['schema_version']} is newer than this instance supports ({SCHEMA_VERSION})")
+    project = reader.next()
+    if not project or project.get('type') != 'project':
+        raise SnapshotError("Snapshot has no project record")
+
+    def import_records(conn):
+        # Write-queue operation: the writer holds the write lock, so the reserved task ids stay free
+        project_columns = [c for c in _columns(conn, 'projects') if c not in SKIPPED_PROJECT_COLUMNS and c in project]
+        cursor = conn.execute(f"INSERT INTO projects (user_id, {', '.join(project_columns)}) VALUES (?{', ?' * len(project_columns)})",
+                              [user_id] + [project[c] for c in project_columns])
+        project_id = cursor.lastrowid
+
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS task_id_map (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)")
+        conn.execute("DELETE FROM temp.task_id_map")
+        next_id = conn.execute("SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0), "
+                               "COALESCE((SELECT MAX(id) FROM tasks), 0)) + 1").fetchone()[0]
+        target_columns = [c for c in _columns(conn, 'tasks') if c not in ('id', 'project_id')]
+        counts = {'tasks': 0, 'dependencies': 0, 'progress': 0}
+        while batch := reader.batch('task'):
+            if not counts['tasks']: # Columns the snapshot doesn't have keep their defaults
+                task_columns = [c for c in target_columns if c in batch[0][1]]
+                insert_task = f"INSERT INTO tasks (id, project_id, {', '.join(task_columns)}) VALUES (?, ?{', ?' * len(task_columns)})"
+            ids = range(next_id, next_id + len(batch))
+            conn.executemany(insert_task, ([new_id, project_id] + [task.get(c) for c in task_columns] for new_id, (_, task) in zip(ids, batch)))
+            for new_id, (number, task) in zip(ids, batch):
+                try:
+                    conn.execute("INSERT INTO temp.task_id_map (old_id, new_id) VALUES (?, ?)", (task['id'], new_id))
+                except sqlite3.IntegrityError:
+                    raise SnapshotError(f"Line {number}: task id {task['id']!r} appears more than once")
+            next_id += len(batch)
+            counts['tasks'] += len(batch)
+
+        remap = "(SELECT new_id FROM temp.task_id_map WHERE old_id = ?)"
+        while batch := reader.batch('dependency'):
+            _check_mapped(conn, batch, ('predecessor_id', 'successor_id'))
+            conn.executemany(f"INSERT OR IGNORE INTO task_dependencies (predecessor_id, successor_id) SELECT {remap}, {remap}",
+                             ((r['predecessor_id'], r['successor_id']) for _, r in batch))
+            counts['dependencies'] += len(batch)
+        while batch := reader.batch('progress'):
+            _check_mapped(conn, batch, ('task_id',))
+            conn.executemany(f"INSERT OR REPLACE INTO progress_snapshots (task_id, day, progress) SELECT {remap}, ?, ?",
+                             ((r['task_id'], r['day'], r['progress']) for _, r in batch))
+            counts['progress'] += len(batch)
+
+        footer = reader.next()
+        if footer is None or footer.get('type') != 'footer':
+            raise SnapshotError("Snapshot is truncated or has records out of order (no footer after the progress records)")
+        expected = {key: footer.get(key) for key in counts}
+        if expected != counts:
+            raise SnapshotError(f"Snapshot counts don't match its footer: read {counts}, footer says {expected}")
+        conn.execute("DELETE FROM temp.task_id_map")
+        return project_id
+
+    db_path = database.resolve_db_path(user_id)
+    project_id = write_queue.execute(db_path, import_records) # An exception rolls the whole import back
+    database.invalidate_cache(db_path, user_ids=[user_id], project_ids=[project_id])
+    return project_id
+
+
+def _user_id(username):
+    conn = database.get_catalog_connection()
+    try:
+        user = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    finally:
+        conn.close()
+    if user is None:
+        raise SnapshotError(f"Unknown user {username!r}")
+    return user[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import a project snapshot (NDJSON).")
+    parser.add_argument('--db', help="Main database (default: PROJECT_TRACKER_DB or project_tracker.db)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help="Write a project's snapshot")
+    export_parser.add_argument('project_id', type=int)
+    export_parser.add_argument('out', help="Output file ('-' for stdout)")
+    export_parser.add_argument('--archived', action='store_true', help="Read the project from the archive database")
+    export_parser.add_argument('--user', help="Owner's username (needed in sharded storage mode)")
+    import_parser = sub.add_parser('import', help="Create a project from a snapshot")
+    import_parser.add_argument('file', help="Snapshot file ('-' for stdin)")
+    import_parser.add_argument('--user', required=True, help="Username that will own the imported project")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.DB_NAME = args.db
+    database.init_db()
+    try:
+        user_id = _user_id(args.user) if args.user else None
+        if args.command == 'export':
+            with (sys.stdout if args.out == '-' else open(args.out, 'w', encoding='utf-8')) as output:
+                counts = export_project(args.project_id, output, args.archived, user_id)
+            print(f"Exported project {args.project_id}: {counts}", file=sys.stderr)
+        else:
+            with (sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')) as lines:
+                project_id = import_project(lines, user_id)
+            print(f"Imported as project {project_id}", file=sys.stderr)
+    except SnapshotError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""One writer thread per database file, with group commit.
+
+Concurrent Streamlit sessions used to open a connection per write and commit on
+their own, so under load they raced for SQLite's write lock and lost with
+"database is locked". Now every data write is an operation (a function taking a
+sqlite3 connection) handed to submit(): session writes in database.py, archive
+and restore moves, the soft-delete purge, progress snapshots, snapshot imports
+(transfer.py), reminder_log (reminders.py) and shard assignment (sharding.py).
+The database's writer thread runs them in arrival order on its connection.
+An operation that spans two files (archive moves, sharding.py migrate) names
+the other one in attach=; the writer ATTACHes it before the transaction begins.
+
+Writes that still open their own connection, on purpose:
+    - schema setup and upgrades (database.init_db, create_schema, ensure_shard,
+      ensure_archive), run before a database's first operation, and no-ops once
+      the schema is current;
+    - benchmark.generate_dataset, which builds a fresh database for tooling;
+    - backup.py restore, which overwrites the files while the app is stopped.
+
+Each operation runs under the submitting rerun's SQL trace (query_trace.attached),
+so its statements still show up in that rerun's query count and debug panel.
+
+Group commit: the writer takes the first queued operation, waits up to
+PROJECT_TRACKER_WRITE_BATCH_MS for more, and runs the whole batch in one
+transaction, each operation inside its own savepoint, so a failing operation is
+rolled back alone and only its caller sees the exception. The batch is then
+committed once. Callers get a concurrent.futures.Future that resolves after the
+commit; execute() submits and waits.
+
+The write connection puts the file in WAL mode, so sessions reading through
+database.connect_readonly() are not blocked by commits. Other processes (a
+second server, the CLI jobs) still take the file lock themselves; the writer
+waits up to PROJECT_TRACKER_WRITE_TIMEOUT_S for it.
+
+    PROJECT_TRACKER_WRITE_BATCH_MS=2      how long the writer waits to group operations
+    PROJECT_TRACKER_WRITE_BATCH_MAX=200   operations per transaction
+    PROJECT_TRACKER_WRITE_TIMEOUT_S=30    busy timeout against other processes' writes
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import query_trace
+
+BATCH_WAIT_S = float(os.environ.get('PROJECT_TRACKER_WRITE_BATCH_MS', '2')) / 1000
+BATCH_MAX = int(os.environ.get('PROJECT_TRACKER_WRITE_BATCH_MAX', '200'))
+BUSY_TIMEOUT_S = float(os.environ.get('PROJECT_TRACKER_WRITE_TIMEOUT_S', '30'))
+
+logger = logging.getLogger('project_tracker.write_queue')
+
+
+class _Writer:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.queue = queue.Queue()
+        self.stats = {'operations': 0, 'transactions': 0, 'failed': 0}
+        self.attached = {} # schema name -> path ATTACHed to the write connection
+        self.thread = threading.Thread(target=self._run, name=f"db-writer:{os.path.basename(db_path)}", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        # isolation_level=None: transactions and savepoints are managed explicitly below
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_S, isolation_level=None, check_same_thread=False,
+                               factory=query_trace.connection_factory())
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL") # Persistent: readers stop blocking behind commits
+        self.attached = {}
+        return conn
+
+    def _attach(self, conn, attach):
+        # ATTACH is refused inside a transaction, so it happens before BEGIN; attachments stay for later batches
+        for name, path in sorted(attach.items()):
+            if self.attached.get(name) == path:
+                continue
+            if name in self.attached:
+                conn.execute(f"DETACH DATABASE {name}")
+                del self.attached[name]
+            conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+            self.attached[name] = path
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._next_batch()
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._commit_batch(conn, batch)
+            except Exception as e: # Couldn't begin or commit: every operation of the batch failed
+                logger.exception("Write batch on %s failed: %s", self.db_path, e)
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + BATCH_WAIT_S
+        while len(batch) < BATCH_MAX:
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return [item for item in batch if item[1].set_running_or_notify_cancel()]
+
+    def _commit_batch(self, conn, batch):
+        if not batch:
+            return
+        outcomes = []
+        attach = {}
+        for _, _, needed, _ in batch:
+            attach.update(needed)
+        self._attach(conn, attach)
+        conn.execute("BEGIN IMMEDIATE")
+        for operation, future, _, trace in batch:
+            conn.execute("SAVEPOINT operation")
+            try:
+                with query_trace.attached(trace):
+                    outcomes.append((future, operation(conn), None))
+            except Exception as e:
+                conn.execute("ROLLBACK TO operation")
+                outcomes.append((future, None, e))
+            conn.execute("RELEASE operation")
+        conn.execute("COMMIT")
+        self.stats['transactions'] += 1
+        self.stats['operations'] += len(batch)
+        # Resolved only now, so a caller never acts on a write that could still roll back
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                self.stats['failed'] += 1
+                future.set_exception(error)
+
+
+_writers = {} # absolute db path -> _Writer
+_writers_lock = threading.Lock()
+
+def _writer(db_path):
+    db_path = os.path.abspath(db_path)
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            writer = _writers[db_path] = _Writer(db_path)
+        return writer
+
+
+def submit(db_path, operation, attach=None):
+    """Queue operation(conn) for db_path's writer; returns a Future with its result (or exception) after the commit.
+
+    operation must not commit, roll back or open transactions itself. attach maps
+    schema names to other database files the operation reads or writes.
+    """
+    future = Future()
+    _writer(db_path).queue.put((operation, future, dict(attach or {}), query_trace.current_trace()))
+    return future
+
+
+def execute(db_path, operation, attach=None):
+    """submit() and wait: returns operation's result or raises its exception."""
+    return submit(db_path, operation, attach).result()
+
+
+def stats():
+    # {db path: {'operations', 'transactions', 'failed', 'queued'}} for the writers started by this process
+    with _writers_lock:
+        writers = list(_writers.values())
+    return {writer.db_path: dict(writer.stats, queued=writer.queue.qsize()) for writer in writers}